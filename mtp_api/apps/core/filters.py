@@ -1,8 +1,9 @@
 from functools import reduce
-from operator import or_
+from operator import and_, or_
 import re
 
 from django import forms
+from django.conf import settings
 from django.db.models import Q
 from django.utils.dateparse import parse_datetime
 from django.utils.formats import get_format
@@ -36,7 +37,51 @@ class BaseFilterSet(django_filters.FilterSet):
         self._meta.form = ParamsOnlyFilterSetForm
 
 
-class MultipleFieldCharFilter(django_filters.CharFilter):
+def search_document_filter(search_document_field, value):
+    """
+    Matches rows whose lower-cased search document contains every word of value;
+    the search document must include the text of every field that the value is otherwise searched for in
+    """
+    return reduce(and_, (
+        Q(**{f'{search_document_field}__contains': word.lower()})
+        for word in value.split()
+    ), Q())
+
+
+class SearchDocumentFilterMixin:
+    """
+    Narrows a text filter using a trigram-indexed search document before applying the filter's own lookups
+    which would otherwise need to scan every row; enabled by the USE_SEARCH_DOCUMENTS setting
+    """
+    search_document_lookups = {'exact', 'iexact', 'contains', 'icontains', 'startswith', 'istartswith'}
+
+    def __init__(self, *args, search_document_field=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.search_document_field = search_document_field
+
+    def narrow_by_search_document(self, qs, value, lookup_expr=None):
+        """
+        Filters by the search document if it is enabled and can hold every match of value using lookup_expr;
+        filters that override `filter` completely must call this themselves
+        """
+        lookup_expr = lookup_expr or self.lookup_expr
+        if (
+            self.search_document_field and settings.USE_SEARCH_DOCUMENTS and
+            isinstance(value, str) and value.strip() and
+            not self.exclude and lookup_expr in self.search_document_lookups
+        ):
+            qs = qs.filter(search_document_filter(self.search_document_field, value))
+        return qs
+
+    def filter(self, qs, value):
+        return super().filter(self.narrow_by_search_document(qs, value), value)
+
+
+class SearchDocumentCharFilter(SearchDocumentFilterMixin, django_filters.CharFilter):
+    pass
+
+
+class MultipleFieldCharFilter(SearchDocumentFilterMixin, django_filters.CharFilter):
     def __init__(self, *args, **kwargs):
         distinct = kwargs.get('distinct', True)
         kwargs['distinct'] = distinct
@@ -54,6 +99,7 @@ class MultipleFieldCharFilter(django_filters.CharFilter):
             lookup = self.lookup_expr
         if value in ([], (), {}, None, ''):
             return qs
+        qs = self.narrow_by_search_document(qs, value, lookup)
 
         q = Q()
         for n in set(self.field_name):
@@ -83,7 +129,7 @@ class MultipleFieldCharFilter(django_filters.CharFilter):
         self._label = value
 
 
-class SplitTextInMultipleFieldsFilter(django_filters.CharFilter):
+class SplitTextInMultipleFieldsFilter(SearchDocumentFilterMixin, django_filters.CharFilter):
     """
     Filters using a text search.
     Works by splitting the input into words and matches any object
@@ -100,6 +146,7 @@ class SplitTextInMultipleFieldsFilter(django_filters.CharFilter):
     def filter(self, qs, value):
         if value in EMPTY_VALUES:
             return qs
+        qs = self.narrow_by_search_document(qs, value)
 
         if self.distinct:
             qs = qs.distinct()
@@ -182,21 +229,22 @@ def annotate_filter(filter_, annotations):
 
 class PostcodeFilter(django_filters.CharFilter):
     """
-    Filters by postcode. It supports whitespaces, lower/uppercases etc.
+    Filters by postcode or the beginning of one. It supports whitespaces, lower/uppercases etc.
+    The field must hold normalised postcodes (see `core.utils.normalise_postcode`)
+    and should have a `varchar_pattern_ops` index so that prefix matches can use it.
     """
     def __init__(self, **kwargs):
         if 'lookup_expr' in kwargs:
             raise ValueError('You cannot override the default lookup_expr.')
 
-        kwargs['lookup_expr'] = 'iregex'
+        kwargs['lookup_expr'] = 'startswith'
         super().__init__(**kwargs)
 
     def filter(self, qs, value):
         if value in EMPTY_VALUES:
             return qs
 
-        value = re.sub(r'[^0-9A-Za-z]+', '', value)
-        value = r'\s*'.join(value)
+        value = re.sub(r'[^0-9A-Za-z]+', '', value).upper()
         return super().filter(qs, value)
 
 
@@ -110,6 +110,62 @@ models.DateTimeField.register_lookup(TruncUtcDate)
 models.DateTimeField.register_lookup(TruncLocalDate)
 
 
+class SavedValuesMixin:
+    """
+    Remembers the field values last loaded from or saved to the database
+    so that post_save receivers can skip work when the fields they depend on did not change
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_values = {
+            field_name: value
+            for field_name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        super().save(*args, update_fields=update_fields, **kwargs)
+        self.remember_saved_values(update_fields)
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.remember_saved_values(fields)
+
+    def remember_saved_values(self, fields=None):
+        if fields is None or not hasattr(self, '_saved_values'):
+            self._saved_values = {}
+        self._saved_values.update(
+            (field.attname, self.__dict__[field.attname])
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__ and (fields is None or {field.name, field.attname} & set(fields))
+        )
+
+    def has_changed(self, *field_names):
+        """
+        Whether any of the given fields (by attname) differs from its last saved value;
+        assumed to be the case when that is not known
+        """
+        saved_values = getattr(self, '_saved_values', None)
+        if saved_values is None:
+            return True
+        return any(
+            field_name not in saved_values or saved_values[field_name] != getattr(self, field_name)
+            for field_name in field_names
+        )
+
+    def get_saved_instance(self, *field_names):
+        """
+        Returns an unsaved copy holding the last saved values if those of the given fields are known
+        """
+        saved_values = getattr(self, '_saved_values', None)
+        if saved_values is None or any(field_name not in saved_values for field_name in field_names):
+            return None
+        return self.__class__(**saved_values)
+
+
 class FileDownload(TimeStampedModel):
     label = models.CharField(max_length=255, db_index=True)
     date = models.DateField(db_index=True)
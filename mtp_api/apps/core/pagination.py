@@ -0,0 +1,184 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination which switches to keyset (cursor) pagination when the `cursor` parameter is provided,
+    an empty cursor requesting the first page. Instead of an offset, each page seeks past the ordering values
+    of the last row of the previous page so that deep pages are as cheap as the first one; the ordering is
+    whatever the ordering filter or model applies, with the primary key appended if necessary to make it unique.
+    In keyset mode, the total is only counted if `include_count` is provided.
+    """
+    cursor_query_param = 'cursor'
+    include_count_query_param = 'include_count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    keyset = False
+    include_count = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.include_count = self.include_count_query_param in request.query_params
+        if self.include_count:
+            self.count = self.get_count(queryset)
+
+        self.ordering = self.get_keyset_ordering(queryset)
+        # the cursor is taken from the values ordered by rather than from model attributes which may differ
+        queryset = queryset.order_by(*self.ordering).annotate(**{
+            self.get_cursor_alias(index): F(field.lstrip('-'))
+            for index, field in enumerate(self.ordering)
+        })
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(queryset, cursor))
+
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        self.page = results[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        response_data = [
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]
+        if self.include_count:
+            response_data.insert(0, ('count', self.count))
+        return Response(OrderedDict(response_data))
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque position returned in `next`; provide empty to request the first page by key',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.include_count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Include the total count in keyset mode',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+        return url
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or (queryset.query.get_meta().ordering if queryset.ordered else ()))
+        if any(not isinstance(field, str) or field == '?' for field in ordering):
+            raise NotFound('Keyset pagination requires ordering by fields')
+        pk_name = queryset.model._meta.pk.name
+        ordering = [
+            field[:-len(pk_name)] + 'pk' if field.lstrip('-') == pk_name else field
+            for field in ordering
+        ]
+        if not ordering or ordering[-1].lstrip('-') != 'pk':
+            ordering.append('pk')
+        return ordering
+
+    def get_seek_filter(self, queryset, cursor):
+        """
+        Rows strictly after the cursor in lexicographic ordering,
+        i.e. (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) etc.
+        NULLs sort last in ascending and first in descending order in PostgreSQL.
+        The redundant bound on the leading field lets PostgreSQL use it as an index range condition.
+        """
+        if len(cursor) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        seek_filter = Q()
+        equal_filter = Q()
+        leading_bound = Q()
+        for index, (field, value) in enumerate(zip(self.ordering, cursor)):
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            nullable = self.field_is_nullable(queryset.model, field)
+            if value is None:
+                after = Q(**{f'{field}__isnull': False}) if descending else None
+                equal = Q(**{f'{field}__isnull': True})
+            else:
+                after = Q(**{f'{field}__{"lt" if descending else "gt"}': value})
+                equal = Q(**{field: value})
+                if nullable and not descending:
+                    after |= Q(**{f'{field}__isnull': True})
+                if index == 0:
+                    leading_bound = Q(**{f'{field}__{"lte" if descending else "gte"}': value})
+                    if nullable and not descending:
+                        leading_bound |= Q(**{f'{field}__isnull': True})
+            if after is not None:
+                seek_filter |= equal_filter & after
+            equal_filter &= equal
+        return leading_bound & seek_filter
+
+    @classmethod
+    def field_is_nullable(cls, model, field):
+        if field == 'pk':
+            return False
+        for name in field.split('__'):
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # e.g. an annotation
+                return True
+            if model_field.null:
+                return True
+            model = model_field.related_model
+            if model is None:
+                break
+        return False
+
+    @classmethod
+    def get_cursor_alias(cls, index):
+        return f'keyset_cursor_{index}'
+
+    def encode_cursor(self, instance):
+        values = []
+        for index in range(len(self.ordering)):
+            value = getattr(instance, self.get_cursor_alias(index))
+            if isinstance(value, (datetime.date, datetime.time, decimal.Decimal)):
+                value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            values.append(value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, list):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
@@ -1,6 +1,11 @@
+import collections
+import contextlib
 import datetime
+import hashlib
+import re
 
 from django.core.management import CommandError
+from django.db import connection
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 
@@ -29,3 +34,95 @@ def date_argument(argument) -> datetime.datetime:
 
 def beginning_of_day(date) -> datetime.datetime:
     return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+def normalise_postcode(postcode):
+    """
+    Returns the postcode in upper case without whitespace or hyphens, as stored in normalised postcode columns
+    """
+    return re.sub(r'[\s-]+', '', postcode).upper() if postcode else postcode
+
+
+def advisory_lock_key(*parts) -> int:
+    """
+    Returns a stable signed 64-bit PostgreSQL advisory lock key identifying the given parts
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def advisory_xact_lock(keys):
+    """
+    Takes transaction-level PostgreSQL advisory locks in ascending key order
+    so that transactions locking overlapping sets of keys wait for each other rather than deadlocking
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(key) FROM unnest(%s::bigint[]) AS key ORDER BY key', [keys])
+
+
+@contextlib.contextmanager
+def try_advisory_lock(key):
+    """
+    Holds a session-level PostgreSQL advisory lock if it is available, yielding whether it was acquired
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
+
+
+class KeywordMatcher:
+    """
+    Aho–Corasick automaton which finds whether any of a set of keywords occurs in a text
+    in time proportional to the length of the text, regardless of the number of keywords
+    """
+
+    def __init__(self, keywords):
+        self.transitions = [{}]
+        self.failures = [0]
+        self.terminal = [False]
+        for keyword in keywords:
+            state = 0
+            for char in keyword:
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][char] = next_state
+                    self.transitions.append({})
+                    self.failures.append(0)
+                    self.terminal.append(False)
+                state = next_state
+            self.terminal[state] = True
+
+        # breadth-first so that failure states, which are always shallower, are complete before being followed
+        queue = collections.deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                failure = self.failures[state]
+                while failure and char not in self.transitions[failure]:
+                    failure = self.failures[failure]
+                failure = self.transitions[failure].get(char, 0)
+                self.failures[next_state] = failure
+                self.terminal[next_state] = self.terminal[next_state] or self.terminal[failure]
+
+    def matches(self, text: str) -> bool:
+        if self.terminal[0]:
+            return True
+        state = 0
+        for char in text:
+            while state and char not in self.transitions[state]:
+                state = self.failures[state]
+            state = self.transitions[state].get(char, 0)
+            if self.terminal[state]:
+                return True
+        return False
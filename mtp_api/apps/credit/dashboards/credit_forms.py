@@ -11,7 +11,7 @@ from django.utils.translation import gettext_lazy as _
 
 from core.utils import monday_of_same_week
 from core.dashboards import DashboardChangeForm
-from credit.models import Credit
+from credit.models import Credit, DailyCreditAggregate
 from prison.models import Prison
 from transaction.models import Transaction
 
@@ -209,13 +209,13 @@ class CreditForm(DashboardChangeForm):
     def get_report_parameters(self):
         credit_queryset = Credit.objects.all()
         transaction_queryset = Transaction.objects.all()
+        chart_aggregate_queryset = DailyCreditAggregate.objects.all()
 
         prison = self.get_prison()
         if prison:
             credit_queryset = credit_queryset.filter(prison=prison)
             transaction_queryset = transaction_queryset.filter(credit__prison=prison)
-
-        chart_credit_queryset = credit_queryset.filter()
+            chart_aggregate_queryset = chart_aggregate_queryset.filter(prison=prison)
 
         date_range = self.get_date_range()
         if len(date_range['range']) == 2:
@@ -262,9 +262,9 @@ class CreditForm(DashboardChangeForm):
         credit_queryset = credit_queryset.filter(**date_filters)
         transaction_queryset = transaction_queryset.filter(**date_filters)
         if chart_start_date:
-            chart_credit_queryset = chart_credit_queryset.filter(received_at__date__gte=chart_start_date)
+            chart_aggregate_queryset = chart_aggregate_queryset.filter(date__gte=chart_start_date)
         if chart_end_date:
-            chart_credit_queryset = chart_credit_queryset.filter(received_at__date__lte=chart_end_date)
+            chart_aggregate_queryset = chart_aggregate_queryset.filter(date__lte=chart_end_date)
 
         return {
             'title': title,
@@ -272,7 +272,7 @@ class CreditForm(DashboardChangeForm):
             'transaction_queryset': transaction_queryset,
             'admin_filter_string': admin_filter_string,
             'chart_title': chart_title,
-            'chart_credit_queryset': chart_credit_queryset,
+            'chart_aggregate_queryset': chart_aggregate_queryset,
             'chart_start_date': chart_start_date,
             'chart_end_date': chart_end_date,
         }
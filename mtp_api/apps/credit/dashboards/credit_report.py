@@ -39,13 +39,16 @@ ANOMALOUS_FILTERS = Transaction.STATUS_LOOKUP[TransactionStatus.anomalous]
 
 
 class CreditReportChart:
-    def __init__(self, title, credit_queryset, start_date, end_date):
+    def __init__(self, title, aggregate_queryset, start_date, end_date):
         self.title = title
-        self.start_date = start_date or \
-            timezone.localtime(credit_queryset.earliest().received_at).date()
-        self.end_date = end_date or \
-            timezone.localtime(credit_queryset.latest().received_at).date()
-        self.credit_queryset = credit_queryset
+        if not (start_date and end_date):
+            date_range = aggregate_queryset.aggregate(earliest=models.Min('date'), latest=models.Max('date'))
+            today = timezone.localdate()
+            start_date = start_date or date_range['earliest'] or today
+            end_date = end_date or date_range['latest'] or today
+        self.start_date = start_date
+        self.end_date = end_date
+        self.aggregate_queryset = aggregate_queryset
         self.max_sum = 0
         self.max_creditable = 0
         self.max_creditable_date = None
@@ -93,14 +96,25 @@ class CreditReportChart:
             date_stride = 1
         date_stride = datetime.timedelta(days=date_stride)
 
+        counts = {
+            aggregate['date']: aggregate
+            for aggregate in self.aggregate_queryset
+            .filter(date__range=(self.start_date, self.end_date))
+            .order_by()
+            .values('date')
+            .annotate(
+                creditable=models.Sum('count', filter=CREDITABLE_FILTERS),
+                refundable=models.Sum('count', filter=REFUNDABLE_FILTERS),
+            )
+        }
+
         data = []
         date = self.start_date
         while date <= self.end_date:
             if date.weekday() > 4:
                 self.weekends.append(date)
-            credit_queryset = self.credit_queryset.filter(received_at__date=date)
-            creditable = credit_queryset.filter(CREDITABLE_FILTERS).count() or 0
-            refundable = credit_queryset.filter(REFUNDABLE_FILTERS).count() or 0
+            creditable = counts.get(date, {}).get('creditable') or 0
+            refundable = counts.get(date, {}).get('refundable') or 0
             data.append([date, creditable, refundable])
             max_sum = creditable + refundable
             if max_sum >= self.max_sum:
@@ -157,7 +171,7 @@ class CreditReport(DashboardModule):
         self.credit_queryset = report_parameters['credit_queryset']
         self.transaction_queryset = report_parameters['transaction_queryset']
         self.chart = CreditReportChart(title=report_parameters['chart_title'],
-                                       credit_queryset=report_parameters['chart_credit_queryset'],
+                                       aggregate_queryset=report_parameters['chart_aggregate_queryset'],
                                        start_date=report_parameters['chart_start_date'],
                                        end_date=report_parameters['chart_end_date'])
         if self.view and self.view.request.user.has_perm('credit.change_credit'):
@@ -27,6 +27,7 @@ class CreditSerialiser(Serialiser):
 
     def get_queryset(self):
         queryset = Credit.objects_all \
+            .with_action_dates(LogAction.credited) \
             .exclude(resolution=CreditResolution.initial) \
             .exclude(payment__status=PaymentStatus.expired)
         if self.only_with_triggered_rules:
@@ -81,7 +82,7 @@ class CreditSerialiser(Serialiser):
         row.update({
             'URL': f'{settings.NOMS_OPS_URL}/security/credits/{record.id}/',
             'Date received': record.received_at,
-            'Date credited': record.log_set.get_action_date(LogAction.credited),
+            'Date credited': record.get_action_date(LogAction.credited),
             'Amount': self.format_amount(record.amount),
             'Prisoner number': record.prisoner_number or 'Unknown',
             'Prisoner name': record.prisoner_name or 'Unknown',
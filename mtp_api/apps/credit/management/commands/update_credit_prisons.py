@@ -0,0 +1,51 @@
+import textwrap
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from credit.models import Credit
+from prison.models import PrisonerLocationChange
+
+
+class Command(BaseCommand):
+    """
+    Update the prison of pending credits to prisoners whose location changed in recent uploads.
+    Scheduled to run every minute; it does nothing if no changes are waiting.
+    Changes are processed in batches, each in its own database transaction
+    unless the command is run in one, as the scheduler does.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of changed prisoners to process at a time')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive')
+
+        prisoner_count = 0
+        credit_count = 0
+        while True:
+            with transaction.atomic():
+                change_ids = list(
+                    PrisonerLocationChange.objects
+                    .filter(credits_updated=False)
+                    .select_for_update(skip_locked=True)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not change_ids:
+                    break
+                credit_count += Credit.objects.update_prisons(prisoner_location_change_ids=change_ids)
+                PrisonerLocationChange.objects.filter(pk__in=change_ids).update(credits_updated=True)
+                prisoner_count += len(change_ids)
+        PrisonerLocationChange.objects.delete_applied()
+
+        if verbosity:
+            self.stdout.write(
+                'Updated prisons of %d credits to %d prisoners with changed locations' % (credit_count, prisoner_count)
+            )
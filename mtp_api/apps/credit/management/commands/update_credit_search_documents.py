@@ -0,0 +1,38 @@
+import textwrap
+
+from django.core.management import BaseCommand, CommandError
+
+from credit.models import Credit
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the search documents of credits from their prisoner, sender and payment details.
+    Only needed if these details were changed without going through the application.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of credits to update at a time')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive')
+
+        credits = Credit.objects_all.all()
+        changed = 0
+        last_pk = 0
+        while True:
+            batch_pks = list(
+                credits.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch_pks:
+                break
+            last_pk = batch_pks[-1]
+            changed += credits.filter(pk__gte=batch_pks[0], pk__lte=last_pk).update_search_documents()
+        if verbosity:
+            self.stdout.write('Updated search documents of %d credits' % changed)
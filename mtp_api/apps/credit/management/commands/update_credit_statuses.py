@@ -0,0 +1,50 @@
+import textwrap
+
+from django.core.management import BaseCommand, CommandError
+
+from credit.models import Credit
+
+
+class Command(BaseCommand):
+    """
+    Recalculate the stored status of credits from their resolution, prison, blocked flag and transaction.
+    With --check, only reports credits whose stored status is out of date and fails if any are found.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--check', action='store_true',
+                            help='Report inconsistent credits without changing them')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of credits to update at a time')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        credits = Credit.objects_all.all()
+
+        if options['check']:
+            mismatched_ids = list(credits.status_mismatches().order_by('pk').values_list('pk', flat=True))
+            if mismatched_ids:
+                if verbosity > 1:
+                    self.stdout.write('Inconsistent credits: %s' % ', '.join(map(str, mismatched_ids)))
+                raise CommandError('%d credits have an inconsistent status' % len(mismatched_ids))
+            if verbosity:
+                self.stdout.write('All credit statuses are consistent')
+            return
+
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive')
+        changed = 0
+        last_pk = 0
+        while True:
+            batch_pks = list(
+                credits.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch_pks:
+                break
+            last_pk = batch_pks[-1]
+            changed += credits.filter(pk__gte=batch_pks[0], pk__lte=last_pk).update_status()
+        if verbosity:
+            self.stdout.write('Updated status of %d credits' % changed)
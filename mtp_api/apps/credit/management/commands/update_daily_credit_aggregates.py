@@ -0,0 +1,78 @@
+import datetime
+import textwrap
+
+from django.core.management import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from credit.models import Credit, DailyCreditAggregate, DailyCreditAggregateUpdate
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the daily credit aggregates used by dashboards for dates whose credits have changed.
+    With --all, every date is rebuilt; this is expected to be scheduled nightly to correct any drift,
+    e.g. from credits changed without going through the application.
+    Dates are processed in batches, each in its own database transaction.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild aggregates for all dates')
+        parser.add_argument('--batch-size', type=int, default=31,
+                            help='Number of dates to rebuild at a time')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive')
+
+        if options['all']:
+            date_count = self.update_all(batch_size)
+        else:
+            date_count = self.update_changed(batch_size)
+        if options['verbosity']:
+            self.stdout.write('Rebuilt daily credit aggregates for %d dates' % date_count)
+
+    def update_changed(self, batch_size):
+        date_count = 0
+        while True:
+            with transaction.atomic():
+                updates = list(
+                    DailyCreditAggregateUpdate.objects
+                    .select_for_update(skip_locked=True)
+                    .order_by('pk')
+                    .values_list('pk', 'date')[:batch_size]
+                )
+                if not updates:
+                    break
+                update_ids, dates = zip(*updates)
+                DailyCreditAggregate.objects.refresh(dates)
+                DailyCreditAggregateUpdate.objects.filter(pk__in=update_ids).delete()
+                date_count += len(set(dates))
+        return date_count
+
+    def update_all(self, batch_size):
+        received_at_range = Credit.objects_all.aggregate(
+            earliest=models.Min('received_at'),
+            latest=models.Max('received_at'),
+        )
+        if received_at_range['earliest'] is None:
+            DailyCreditAggregate.objects.all().delete()
+            return 0
+
+        start_date = timezone.localdate(received_at_range['earliest'])
+        end_date = timezone.localdate(received_at_range['latest'])
+        DailyCreditAggregate.objects.exclude(date__range=(start_date, end_date)).delete()
+
+        one_day = datetime.timedelta(days=1)
+        date_count = 0
+        while start_date <= end_date:
+            dates = [start_date + one_day * offset for offset in range(batch_size)]
+            dates = [date for date in dates if date <= end_date]
+            DailyCreditAggregate.objects.refresh(dates)
+            date_count += len(dates)
+            start_date = dates[-1] + one_day
+        return date_count
@@ -1,9 +1,19 @@
+import datetime
+import itertools
+import logging
+
 from django.db import connection, models
-from django.db.models import Q
+from django.db.models import Case, F, Func, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Lower
 from django.db.transaction import atomic
+from django.utils import timezone
 
+from core.models import TruncLocalDate
+from core.utils import advisory_xact_lock, beginning_of_day
 from credit import InvalidCreditStateException
-from credit.constants import CreditResolution, CreditStatus, LogAction
+from credit.constants import CreditResolution, CreditSource, CreditStatus, LogAction
+
+logger = logging.getLogger('mtp')
 
 
 class CreditQuerySet(models.QuerySet):
@@ -36,6 +46,194 @@ class CreditQuerySet(models.QuerySet):
             .order_by('received_at_date') \
             .annotate(amount_per_day=models.Sum('amount'))
 
+    def update_status(self):
+        """
+        Recalculates the denormalised status column from the model's STATUS_CONDITIONS,
+        only writing rows whose stored status differs; returns the number of rows changed
+        """
+        changed = 0
+        no_status = Q()
+        for status, condition in self.model.STATUS_CONDITIONS.items():
+            changed += self.filter(condition).exclude(status=status).update(status=status)
+            no_status &= ~condition
+        changed += self.filter(no_status).exclude(status__isnull=True).update(status=None)
+        return changed
+
+    def update_search_documents(self):
+        """
+        Rebuilds the search document used to narrow text searches,
+        only writing rows whose document changes; returns the number of rows changed
+        """
+        search_document = self.search_document_expression()
+        return self.exclude(search_document=search_document).update(search_document=search_document)
+
+    @classmethod
+    def search_document_expression(cls):
+        """
+        Lower-cased, newline-separated text of all fields that credit text filters search in;
+        words never contain whitespace so a word found in the document is found in one of the fields
+        """
+        from payment.models import Payment
+        from transaction.models import Transaction
+
+        transaction = Transaction.objects.filter(credit=OuterRef('pk'))
+        payment = Payment.objects.filter(credit=OuterRef('pk'))
+        return Lower(Func(
+            Value('\n'),
+            Value(''),
+            F('prisoner_name'),
+            F('prisoner_number'),
+            Subquery(transaction.values('sender_name')[:1]),
+            Subquery(payment.values('cardholder_name')[:1]),
+            Subquery(payment.values('email')[:1]),
+            Value(''),
+            function='CONCAT_WS',
+            output_field=models.TextField(),
+        ))
+
+    def with_action_dates(self, *actions):
+        """
+        Annotates the date each action (or all of those with a model property if none are given) was last logged
+        so that properties like `credited_at` do not need a query per credit
+        """
+        from credit.models import Log
+
+        actions = actions or (LogAction.credited, LogAction.refunded, LogAction.manual, LogAction.reconciled)
+        return self.annotate(**{
+            self.action_date_field(action): Subquery(
+                Log.objects.filter(credit=OuterRef('pk'), action=action).order_by('-created').values('created')[:1]
+            )
+            for action in actions
+        })
+
+    @classmethod
+    def action_date_field(cls, action):
+        return '%s_logged_at' % LogAction(action).value
+
+    def record_daily_aggregate_updates(self):
+        """
+        Records the local dates received of these credits so that their daily aggregates are rebuilt
+        by the `update_daily_credit_aggregates` job
+        """
+        from credit.models import DailyCreditAggregateUpdate
+
+        dates = self.filter(received_at__isnull=False) \
+            .annotate(received_at_date=TruncLocalDate('received_at')) \
+            .order_by() \
+            .values_list('received_at_date', flat=True) \
+            .distinct()
+        DailyCreditAggregateUpdate.objects.bulk_create(
+            DailyCreditAggregateUpdate(date=date)
+            for date in dates
+        )
+
+    @atomic
+    def attach_profiles(self, sender_profile_key_cache=None):
+        """
+        Bulk equivalent of Credit.attach_profiles for these credits, ignoring failed ones:
+        resolves or creates all profiles and their details with a fixed number of queries
+        and assigns them with one update
+        :param sender_profile_key_cache: optional SenderProfileKeyCache to resolve repeat senders across batches
+        :return: number of credits given profiles
+        """
+        from security.models import DailyCreditProfileCount, PrisonerProfile, SenderProfile
+
+        credits = list(
+            self.filter(Q(prisoner_profile__isnull=True) | Q(sender_profile__isnull=True))
+            .exclude(resolution=CreditResolution.failed.value)
+            .select_related('transaction', 'payment__billing_address')
+            .order_by('pk')
+        )
+        prisoner_profile_credits = [
+            credit for credit in credits
+            if not credit.prisoner_profile_id and credit.prison_id and credit.prisoner_name
+        ]
+        sender_profile_credits = [
+            credit for credit in credits
+            if not credit.sender_profile_id and credit.has_enough_detail_for_sender_profile()
+        ]
+        advisory_xact_lock(
+            [PrisonerProfile.objects.lock_key_for_credit(credit) for credit in prisoner_profile_credits] +
+            [SenderProfile.objects.lock_key_for_credit(credit) for credit in sender_profile_credits]
+        )
+
+        prisoner_profile_ids = PrisonerProfile.objects.create_or_update_for_credits(prisoner_profile_credits)
+        sender_profile_ids = SenderProfile.objects.create_or_update_for_credits(
+            sender_profile_credits, key_cache=sender_profile_key_cache,
+        )
+        if not prisoner_profile_ids and not sender_profile_ids:
+            return 0
+
+        prisoner_senders = {
+            (
+                prisoner_profile_ids.get(credit.pk, credit.prisoner_profile_id),
+                sender_profile_ids.get(credit.pk, credit.sender_profile_id),
+            )
+            for credit in credits
+            if credit.pk in prisoner_profile_ids or credit.pk in sender_profile_ids
+        }
+        prisoner_senders = sorted(
+            (prisoner_profile_id, sender_profile_id)
+            for prisoner_profile_id, sender_profile_id in prisoner_senders
+            if prisoner_profile_id and sender_profile_id
+        )
+        PrisonerProfile.senders.through.objects.bulk_create(
+            (
+                PrisonerProfile.senders.through(
+                    prisonerprofile_id=prisoner_profile_id, senderprofile_id=sender_profile_id,
+                )
+                for prisoner_profile_id, sender_profile_id in prisoner_senders
+            ),
+            ignore_conflicts=True,
+        )
+        PrisonerProfile.objects.filter(
+            pk__in={prisoner_profile_id for prisoner_profile_id, _ in prisoner_senders},
+        ).recalculate_relation_counts()
+        SenderProfile.objects.filter(
+            pk__in={sender_profile_id for _, sender_profile_id in prisoner_senders},
+        ).recalculate_relation_counts()
+
+        profile_updates = [
+            (credit.pk, prisoner_profile_ids.get(credit.pk), sender_profile_ids.get(credit.pk))
+            for credit in credits
+            if credit.pk in prisoner_profile_ids or credit.pk in sender_profile_ids
+        ]
+        values = ', '.join(['(%s, %s::integer, %s::integer)'] * len(profile_updates))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE credit_credit
+                SET modified = %s,
+                prisoner_profile_id = COALESCE(updates.prisoner_profile_id, credit_credit.prisoner_profile_id),
+                sender_profile_id = COALESCE(updates.sender_profile_id, credit_credit.sender_profile_id)
+                FROM (VALUES """ + values + """) AS updates (id, prisoner_profile_id, sender_profile_id)
+                WHERE credit_credit.id = updates.id
+                """,
+                [timezone.now(), *itertools.chain.from_iterable(profile_updates)]
+            )
+
+        daily_profile_count_keys = []
+        for credit in credits:
+            if credit.pk in prisoner_profile_ids or credit.pk in sender_profile_ids:
+                credit.prisoner_profile_id = prisoner_profile_ids.get(credit.pk, credit.prisoner_profile_id)
+                credit.sender_profile_id = sender_profile_ids.get(credit.pk, credit.sender_profile_id)
+                daily_profile_count_keys.append(DailyCreditProfileCount.objects.record_key(credit))
+        DailyCreditProfileCount.objects.refresh(key for key in daily_profile_count_keys if key)
+        logger.info('Attached profiles to %(count)d credits', {'count': len(profile_updates)})
+        return len(profile_updates)
+
+    def status_mismatches(self):
+        """
+        Credits whose denormalised status column does not match STATUS_CONDITIONS
+        """
+        mismatched = Q()
+        no_status = Q()
+        for status, condition in self.model.STATUS_CONDITIONS.items():
+            mismatched |= condition & ~Q(status=status)
+            no_status &= ~condition
+        mismatched |= no_status & Q(status__isnull=False)
+        return self.filter(mismatched)
+
     def monitored_by(self, user):
         return self.filter(
             Q(sender_profile__bank_transfer_details__sender_bank_account__monitoring_users=user) |
@@ -45,7 +243,21 @@ class CreditQuerySet(models.QuerySet):
 
 
 class CreditManager(models.Manager):
-    def update_prisons(self):
+    def update_prisons(self, prisoner_location_change_ids=None):
+        """
+        Matches pending credits to the active location of their prisoner. If PrisonerLocationChange ids are
+        provided, only credits to those prisoners are considered; returns the number of credits changed
+        """
+        if prisoner_location_change_ids is None:
+            changed_prisoners_clause = ''
+            params = (CreditResolution.pending.value,)
+        else:
+            changed_prisoners_clause = """
+                AND (c.prisoner_number, c.prisoner_dob) IN (
+                    SELECT prisoner_number, prisoner_dob FROM prison_prisonerlocationchange WHERE id = ANY(%s)
+                )
+            """
+            params = (CreditResolution.pending.value, list(prisoner_location_change_ids))
         with connection.cursor() as cursor:
             cursor.execute(
                 """
@@ -60,9 +272,23 @@ class CreditManager(models.Manager):
                 AND c.reconciled is False AND credit_credit.id = c.id
                 -- don't remove a match from a debit card payment
                 AND NOT (pl.prison_id IS NULL AND p.uuid IS NOT NULL)
+                -- skip credits that already match
+                AND (
+                    c.prison_id IS DISTINCT FROM pl.prison_id
+                    OR c.prisoner_name IS DISTINCT FROM pl.prisoner_name
+                )
+                """ + changed_prisoners_clause + """
+                RETURNING credit_credit.id
                 """,
-                (CreditResolution.pending.value,)
+                params
             )
+            changed_ids = [row[0] for row in cursor.fetchall()]
+        # prison changes move pending credits between credit_pending and refund_pending
+        changed_credits = self.model.objects_all.filter(pk__in=changed_ids)
+        changed_credits.update_status()
+        changed_credits.update_search_documents()
+        changed_credits.record_daily_aggregate_updates()
+        return len(changed_ids)
 
     @atomic
     def reconcile(self, start_date, end_date, user, **kwargs):
@@ -77,6 +303,72 @@ class CreditManager(models.Manager):
         Log.objects.credits_reconciled(update_set, user)
         update_set.update(reconciled=True)
 
+    @atomic
+    def credit(self, credit_updates, user):
+        """
+        Credits pending credits in bulk with one locking query, one update and one log insert
+        :param credit_updates: sequence of (credit id, NOMIS transaction id or None)
+        :return: ids that were not credit pending (or were repeated), in the order provided
+        """
+        from credit.models import Credit, Log
+
+        credit_updates = list(credit_updates)
+        to_update = self.get_queryset().filter(
+            Credit.STATUS_LOOKUP[CreditStatus.credit_pending.value],
+            pk__in=[credit_id for credit_id, _ in credit_updates],
+        ).order_by('pk').select_for_update().only('pk')
+        lockable_ids = {c.pk for c in to_update}
+
+        nomis_transaction_ids = {}
+        conflict_ids = []
+        for credit_id, nomis_transaction_id in credit_updates:
+            if credit_id in lockable_ids and credit_id not in nomis_transaction_ids:
+                nomis_transaction_ids[credit_id] = nomis_transaction_id or None
+            else:
+                conflict_ids.append(credit_id)
+        if not nomis_transaction_ids:
+            return conflict_ids
+
+        values = ', '.join(['(%s, %s)'] * len(nomis_transaction_ids))
+        params = [
+            CreditResolution.credited.value, CreditStatus.credited.value, user.pk, timezone.now(),
+            *itertools.chain.from_iterable(nomis_transaction_ids.items()),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE credit_credit
+                SET resolution = %s, status = %s, owner_id = %s, modified = %s,
+                nomis_transaction_id = COALESCE(updates.nomis_transaction_id, credit_credit.nomis_transaction_id)
+                FROM (VALUES """ + values + """) AS updates (id, nomis_transaction_id)
+                WHERE credit_credit.id = updates.id
+                """,
+                params
+            )
+        Credit.objects_all.filter(pk__in=nomis_transaction_ids).record_daily_aggregate_updates()
+
+        Log.objects.credits_credited(to_update, user)
+        return conflict_ids
+
+    @atomic
+    def credit_all(self, queryset, user):
+        """
+        Credits all credit pending credits in queryset with one update and one log insert,
+        for credits that are not posted to NOMIS individually
+        :return: number of credits updated
+        """
+        from credit.models import Log
+
+        to_update = queryset.credit_pending().order_by('pk').select_for_update()
+        Log.objects.credits_credited(to_update, user)
+        self.model.objects_all.filter(pk__in=[c.pk for c in to_update]).record_daily_aggregate_updates()
+        return to_update.update(
+            resolution=CreditResolution.credited,
+            status=CreditStatus.credited,
+            owner=user,
+            modified=timezone.now(),
+        )
+
     @atomic
     def set_manual(self, queryset, credit_ids, user):
         from credit.models import Log
@@ -90,6 +382,9 @@ class CreditManager(models.Manager):
 
         Log.objects.credits_set_manual(to_update, user)
         to_update.update(resolution=CreditResolution.manual, owner=user)
+        updated_credits = self.model.objects_all.filter(pk__in=ids_to_update)
+        updated_credits.update_status()
+        updated_credits.record_daily_aggregate_updates()
         return sorted(conflict_ids)
 
     @atomic
@@ -104,7 +399,8 @@ class CreditManager(models.Manager):
             raise InvalidCreditStateException(sorted(conflict_ids))
 
         Log.objects.credits_refunded(update_set, user)
-        update_set.update(resolution=CreditResolution.refunded)
+        Credit.objects_all.filter(pk__in=[c.pk for c in update_set]).record_daily_aggregate_updates()
+        update_set.update(resolution=CreditResolution.refunded, status=CreditStatus.refunded)
 
     @atomic
     def review(self, credit_ids, user):
@@ -129,6 +425,83 @@ class CompletedCreditManager(CreditManager):
         )
 
 
+class DailyCreditAggregateQuerySet(models.QuerySet):
+    def received_between(self, since, until=None):
+        """
+        Aggregates of credits received on or after `since` and before `until`;
+        datetimes are converted to local dates
+        """
+        queryset = self.filter(date__gte=_local_date(since))
+        if until:
+            queryset = queryset.filter(date__lt=_local_date(until))
+        return queryset
+
+    def totals(self):
+        totals = self.aggregate(count=models.Sum('count'), amount=models.Sum('amount'))
+        return {
+            'count': totals['count'] or 0,
+            'amount': totals['amount'] or 0,
+        }
+
+
+class DailyCreditAggregateManager(models.Manager):
+    @atomic
+    def refresh(self, dates):
+        """
+        Rebuilds the aggregates of the given local dates from credits; returns the number of aggregates created
+        """
+        from credit.models import Credit
+
+        dates = sorted(set(dates))
+        if not dates:
+            return 0
+
+        with connection.cursor() as cursor:
+            # rebuilding is delete-then-insert so concurrent rebuilds must not overlap, but reading can continue
+            cursor.execute('LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE' % self.model._meta.db_table)
+        self.filter(date__in=dates).delete()
+
+        one_day = datetime.timedelta(days=1)
+        aggregates = Credit.objects_all.filter(
+            # bounds the scan using the received_at index
+            received_at__gte=beginning_of_day(dates[0]),
+            received_at__lt=beginning_of_day(dates[-1] + one_day),
+        ).annotate(
+            received_at_date=TruncLocalDate('received_at'),
+            credit_source=Case(
+                When(transaction__isnull=False, then=Value(CreditSource.bank_transfer.value)),
+                When(payment__isnull=False, then=Value(CreditSource.online.value)),
+                default=Value(CreditSource.unknown.value),
+                output_field=models.CharField(),
+            ),
+        ).filter(
+            received_at_date__in=dates,
+        ).order_by().values(
+            'received_at_date', 'prison_id', 'credit_source', 'resolution', 'status',
+        ).annotate(
+            credit_count=models.Count('pk'),
+            credit_amount=models.Sum('amount'),
+        )
+        return len(self.bulk_create(
+            self.model(
+                date=aggregate['received_at_date'],
+                prison_id=aggregate['prison_id'],
+                source=aggregate['credit_source'],
+                resolution=aggregate['resolution'],
+                status=aggregate['status'],
+                count=aggregate['credit_count'],
+                amount=aggregate['credit_amount'],
+            )
+            for aggregate in aggregates
+        ))
+
+
+def _local_date(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value)
+    return value
+
+
 class LogManager(models.Manager):
     def _log_action(self, action, credits, by_user=None):
         logs = []
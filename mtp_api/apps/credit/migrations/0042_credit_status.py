@@ -0,0 +1,61 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('credit', '0041_credit_credit_cred_created_18d594_idx'),
+        ('transaction', '0043_auto_20201007_1448'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='credit',
+            name='status',
+            field=models.CharField(
+                blank=True, null=True, max_length=50,
+                choices=[
+                    ('credit_pending', 'Credit pending'),
+                    ('credited', 'Credited'),
+                    ('refunded', 'Refunded'),
+                    ('refund_pending', 'Refund pending'),
+                    ('failed', 'Failed'),
+                ],
+            ),
+        ),
+        # mirrors Credit.STATUS_CONDITIONS; subsequent changes are kept in step by the application
+        migrations.RunSQL(
+            sql="""
+                UPDATE credit_credit SET status = CASE
+                    WHEN prison_id IS NOT NULL AND NOT blocked AND resolution IN ('pending', 'manual')
+                        THEN 'credit_pending'
+                    WHEN resolution = 'credited'
+                        THEN 'credited'
+                    WHEN (prison_id IS NULL OR blocked) AND resolution = 'pending' AND NOT EXISTS (
+                        SELECT 1 FROM transaction_transaction
+                        WHERE transaction_transaction.credit_id = credit_credit.id
+                        AND transaction_transaction.incomplete_sender_info
+                    )
+                        THEN 'refund_pending'
+                    WHEN resolution = 'refunded'
+                        THEN 'refunded'
+                    WHEN resolution = 'failed'
+                        THEN 'failed'
+                END
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='credit',
+            name='status',
+            field=models.CharField(
+                blank=True, null=True, max_length=50, db_index=True,
+                choices=[
+                    ('credit_pending', 'Credit pending'),
+                    ('credited', 'Credited'),
+                    ('refunded', 'Refunded'),
+                    ('refund_pending', 'Refund pending'),
+                    ('failed', 'Failed'),
+                ],
+            ),
+        ),
+    ]
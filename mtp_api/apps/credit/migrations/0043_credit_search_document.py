@@ -0,0 +1,35 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('credit', '0042_credit_status'),
+        ('payment', '0020_auto_20201007_1448'),
+        ('transaction', '0044_transaction_received_at_id_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='credit',
+            name='search_document',
+            field=models.TextField(blank=True, default=''),
+        ),
+        # mirrors CreditQuerySet.search_document_expression; subsequent changes are kept in step by the application
+        migrations.RunSQL(
+            sql="""
+                UPDATE credit_credit SET search_document = LOWER(CONCAT_WS(
+                    E'\\n',
+                    '',
+                    prisoner_name,
+                    prisoner_number,
+                    (SELECT sender_name FROM transaction_transaction WHERE credit_id = credit_credit.id LIMIT 1),
+                    (SELECT cardholder_name FROM payment_payment WHERE credit_id = credit_credit.id LIMIT 1),
+                    (SELECT email FROM payment_payment WHERE credit_id = credit_credit.id LIMIT 1),
+                    ''
+                ))
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres import operations
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('credit', '0043_credit_search_document'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='credit',
+            index=GinIndex(fields=['search_document'], name='credit_search_document_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
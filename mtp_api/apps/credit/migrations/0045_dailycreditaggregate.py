@@ -0,0 +1,74 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def schedule_daily_credit_aggregate_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    # build all aggregates once in the background rather than during deployment
+    cls.objects.create(
+        name='update_daily_credit_aggregates',
+        arg_string='--all',
+        cron_entry='* * * * *',
+        next_execution=timezone.now(),
+        delete_after_next=True,
+    )
+    cls.objects.create(
+        name='update_daily_credit_aggregates',
+        arg_string='',
+        cron_entry='*/5 * * * *',
+        next_execution=timezone.now(),
+    )
+    cls.objects.create(
+        name='update_daily_credit_aggregates',
+        arg_string='--all',
+        cron_entry='30 2 * * *',
+        next_execution=timezone.now(),
+    )
+
+
+def unschedule_daily_credit_aggregate_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.filter(name='update_daily_credit_aggregates').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_delete_token'),
+        ('credit', '0044_credit_search_document_trgm'),
+        ('prison', '0025_prisonerlocationchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCreditAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('source', models.CharField(choices=[('bank_transfer', 'Bank transfer'), ('online', 'Online'), ('unknown', 'Unknown')], max_length=50)),
+                ('resolution', models.CharField(choices=[('initial', 'Initial'), ('pending', 'Pending'), ('manual', 'Requires manual processing'), ('credited', 'Credited'), ('refunded', 'Refunded'), ('failed', 'Failed')], max_length=50)),
+                ('status', models.CharField(blank=True, choices=[('credit_pending', 'Credit pending'), ('credited', 'Credited'), ('refunded', 'Refunded'), ('refund_pending', 'Refund pending'), ('failed', 'Failed')], max_length=50, null=True)),
+                ('count', models.IntegerField()),
+                ('amount', models.BigIntegerField()),
+                ('prison', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='prison.prison')),
+            ],
+            options={
+                'ordering': ('date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCreditAggregateUpdate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+        migrations.RunPython(
+            schedule_daily_credit_aggregate_updates,
+            reverse_code=unschedule_daily_credit_aggregate_updates,
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def schedule_credit_prison_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    # a permanent job cannot miss changes recorded while a one-off job is finishing
+    cls.objects.filter(name='update_credit_prisons').delete()
+    cls.objects.create(
+        name='update_credit_prisons',
+        arg_string='',
+        cron_entry='* * * * *',
+        next_execution=timezone.now(),
+    )
+
+
+def unschedule_credit_prison_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.filter(name='update_credit_prisons').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_delete_token'),
+        ('credit', '0045_dailycreditaggregate'),
+    ]
+    operations = [
+        migrations.RunPython(schedule_credit_prison_updates, reverse_code=unschedule_credit_prison_updates),
+    ]
@@ -2,20 +2,24 @@ from datetime import timedelta
 import logging
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.db.models import Q, Max
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from model_utils.models import TimeStampedModel
 from mtp_common.utils import format_currency
 
+from core.models import SavedValuesMixin
 from credit.constants import CreditResolution, CreditStatus, CreditSource, LogAction
 from credit.managers import (
     CompletedCreditManager,
     CreditingTimeManager,
     CreditManager,
     CreditQuerySet,
+    DailyCreditAggregateManager,
+    DailyCreditAggregateQuerySet,
     LogManager,
     PrivateEstateBatchManager,
 )
@@ -35,7 +39,7 @@ from prison.models import Prison, PrisonerLocation
 logger = logging.getLogger('mtp')
 
 
-class Credit(TimeStampedModel):
+class Credit(SavedValuesMixin, TimeStampedModel):
     amount = models.BigIntegerField(db_index=True)
     received_at = models.DateTimeField(auto_now=False, blank=True, null=True, db_index=True)
 
@@ -47,6 +51,8 @@ class Credit(TimeStampedModel):
     resolution = models.CharField(max_length=50,
                                   choices=CreditResolution.choices, default=CreditResolution.pending.value,
                                   db_index=True)
+    # denormalised from STATUS_CONDITIONS so that status filters can use an index; null if no status applies
+    status = models.CharField(max_length=50, choices=CreditStatus.choices, blank=True, null=True, db_index=True)
     reconciled = models.BooleanField(default=False)
     reviewed = models.BooleanField(default=False)
     blocked = models.BooleanField(default=False)
@@ -64,11 +70,14 @@ class Credit(TimeStampedModel):
     private_estate_batch = models.ForeignKey('credit.PrivateEstateBatch', null=True, blank=True,
                                              on_delete=models.SET_NULL)
 
+    # lower-cased prisoner, sender and email text used to narrow text searches with a trigram index
+    search_document = models.TextField(blank=True, default='')
+
     objects = CompletedCreditManager.from_queryset(CreditQuerySet)()
     objects_all = CreditManager.from_queryset(CreditQuerySet)()
 
     # NB: there are matching boolean fields or properties on the model instance for each
-    STATUS_LOOKUP = {
+    STATUS_CONDITIONS = {
         CreditStatus.credit_pending.value: (
             Q(blocked=False) &
             Q(prison__isnull=False) &
@@ -92,6 +101,10 @@ class Credit(TimeStampedModel):
             Q(resolution=CreditResolution.failed)
         ),
     }
+    STATUS_LOOKUP = {
+        status: Q(status=status)
+        for status in STATUS_CONDITIONS
+    }
 
     class Meta:
         ordering = ('received_at', 'id',)
@@ -111,6 +124,7 @@ class Credit(TimeStampedModel):
             models.Index(fields=['prisoner_number', 'id']),
             models.Index(fields=['-prisoner_number', 'id']),
             models.Index(fields=['owner', 'reconciled', 'resolution']),
+            GinIndex(fields=['search_document'], name='credit_search_document_trgm', opclasses=['gin_trgm_ops']),
         ]
 
     def __str__(self):
@@ -245,7 +259,7 @@ class Credit(TimeStampedModel):
     @property
     def credit_pending(self):
         return (
-            self.prison is not None and
+            self.prison_id is not None and
             (self.resolution == CreditResolution.pending.value or
              self.resolution == CreditResolution.manual.value) and
             not self.blocked
@@ -266,7 +280,7 @@ class Credit(TimeStampedModel):
     @property
     def refund_pending(self):
         return (
-            (self.prison is None or self.blocked) and
+            (self.prison_id is None or self.blocked) and
             self.resolution == CreditResolution.pending.value and
             (
                 not hasattr(self, 'transaction') or
@@ -275,7 +289,7 @@ class Credit(TimeStampedModel):
         )
 
     @property
-    def status(self):
+    def calculated_status(self):
         if self.credit_pending:
             return CreditStatus.credit_pending.value
         elif self.credited:
@@ -344,27 +358,34 @@ class Credit(TimeStampedModel):
         elif hasattr(self, 'payment'):
             return self.payment.ref_code
 
+    def get_action_date(self, action):
+        # use the annotation from CreditQuerySet.with_action_dates if present
+        action_date_field = CreditQuerySet.action_date_field(action)
+        if hasattr(self, action_date_field):
+            return getattr(self, action_date_field)
+        return self.log_set.get_action_date(action)
+
     @property
     def credited_at(self):
         if not self.resolution == CreditResolution.credited.value:
             return None
-        return self.log_set.get_action_date(LogAction.credited)
+        return self.get_action_date(LogAction.credited)
 
     @property
     def refunded_at(self):
         if not self.resolution == CreditResolution.refunded.value:
             return None
-        return self.log_set.get_action_date(LogAction.refunded)
+        return self.get_action_date(LogAction.refunded)
 
     @property
     def set_manual_at(self):
-        return self.log_set.get_action_date(LogAction.manual)
+        return self.get_action_date(LogAction.manual)
 
     @property
     def reconciled_at(self):
         if not self.reconciled:
             return None
-        return self.log_set.get_action_date(LogAction.reconciled)
+        return self.get_action_date(LogAction.reconciled)
 
     @property
     def crediting_time(self):
@@ -469,6 +490,89 @@ class PrivateEstateBatch(TimeStampedModel):
         return self.credit_set.aggregate(total=models.Sum('amount'))['total']
 
 
+class DailyCreditAggregate(models.Model):
+    """
+    Number and amount of credits by local date received, prison, source, resolution and status
+    so that dashboards need not scan credits; rebuilt a day at a time
+    """
+    date = models.DateField(db_index=True)
+    prison = models.ForeignKey(Prison, blank=True, null=True, on_delete=models.SET_NULL)
+    source = models.CharField(max_length=50, choices=CreditSource.choices)
+    resolution = models.CharField(max_length=50, choices=CreditResolution.choices)
+    status = models.CharField(max_length=50, choices=CreditStatus.choices, blank=True, null=True)
+    count = models.IntegerField()
+    amount = models.BigIntegerField()
+
+    objects = DailyCreditAggregateManager.from_queryset(DailyCreditAggregateQuerySet)()
+
+    class Meta:
+        ordering = ('date',)
+
+    def __str__(self):
+        return '%s %s %s %s: %d credits' % (self.date, self.prison_id, self.source, self.status, self.count)
+
+
+class DailyCreditAggregateUpdate(models.Model):
+    """
+    Local dates whose credits changed, waiting for their daily aggregates to be rebuilt
+    """
+    date = models.DateField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+
+    def __str__(self):
+        return str(self.date)
+
+
+@receiver(pre_save, sender=Credit, dispatch_uid='update_status_for_credit')
+def update_status_for_credit(instance, **kwargs):
+    instance.status = instance.calculated_status
+
+
+@receiver(post_save, sender=Credit, dispatch_uid='update_search_document_for_credit')
+def update_search_document_for_credit(instance, created, **kwargs):
+    # other searched text is updated when the credit's transaction or payment is saved
+    if created or instance.has_changed('prisoner_name', 'prisoner_number'):
+        Credit.objects_all.filter(pk=instance.pk).update_search_documents()
+
+
+@receiver(post_save, sender=Credit, dispatch_uid='record_daily_aggregate_update_for_credit')
+def record_daily_aggregate_update_for_credit(instance, created, **kwargs):
+    # source changes are recorded when the credit's transaction or payment is saved
+    if not created and not instance.has_changed('received_at', 'prison_id', 'resolution', 'status', 'amount'):
+        return
+    received_at_values = {instance.received_at}
+    previous = None if created else instance.get_saved_instance('received_at')
+    if previous:
+        # the credit moves out of the aggregates of the date it was previously received on
+        received_at_values.add(previous.received_at)
+    dates = {timezone.localdate(received_at) for received_at in received_at_values if received_at}
+    DailyCreditAggregateUpdate.objects.bulk_create(
+        DailyCreditAggregateUpdate(date=date)
+        for date in sorted(dates)
+    )
+
+
+@receiver(post_save, sender='transaction.Transaction', dispatch_uid='update_credit_for_transaction')
+def update_credit_for_transaction(instance, **kwargs):
+    # credits are saved before their transaction so refund_pending depends on the latter's incomplete_sender_info
+    if instance.credit_id:
+        credits = Credit.objects_all.filter(pk=instance.credit_id)
+        credits.update_status()
+        credits.update_search_documents()
+        credits.record_daily_aggregate_updates()
+
+
+@receiver(post_save, sender='payment.Payment', dispatch_uid='update_credit_for_payment')
+def update_credit_for_payment(instance, **kwargs):
+    if instance.credit_id:
+        credits = Credit.objects_all.filter(pk=instance.credit_id)
+        credits.update_search_documents()
+        credits.record_daily_aggregate_updates()
+
+
 @receiver(post_save, sender=Credit, dispatch_uid='update_prison_for_credit')
 def update_prison_for_credit(instance, created, **kwargs):
     if (created and
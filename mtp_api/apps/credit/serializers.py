@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.manager import BaseManager
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
@@ -46,6 +48,18 @@ class CommentSerializer(serializers.ModelSerializer):
         return obj.user.get_full_name() if obj.user else None
 
 
+class CreditListSerializer(serializers.ListSerializer):
+    """
+    Loads related objects declared by the child credit serializer in bulk once per page
+    rather than lazily for each credit
+    """
+
+    def to_representation(self, data):
+        credits = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.prefetch_related_data(credits)
+        return super().to_representation(credits)
+
+
 class CreditSerializer(serializers.ModelSerializer):
     sender_name = serializers.CharField(read_only=True)
     sender_email = serializers.CharField(read_only=True)
@@ -61,8 +75,17 @@ class CreditSerializer(serializers.ModelSerializer):
     comments = CommentSerializer(many=True, read_only=True)
     short_payment_ref = serializers.SerializerMethodField()
 
+    # related objects used by fields of this serializer, loaded together for all credits on a page
+    prefetch_lookups = (
+        'transaction',
+        'payment__batch',
+        'owner',
+        Prefetch('comments', queryset=Comment.objects.select_related('user').order_by('pk')),
+    )
+
     class Meta:
         model = Credit
+        list_serializer_class = CreditListSerializer
         fields = (
             'id',
             'prisoner_name',
@@ -89,6 +112,9 @@ class CreditSerializer(serializers.ModelSerializer):
             'nomis_transaction_id',
         )
 
+    def prefetch_related_data(self, credits):
+        prefetch_related_objects(credits, *self.prefetch_lookups)
+
     def get_anonymous(self, obj):
         try:
             return obj.transaction.incomplete_sender_info and obj.blocked
@@ -105,8 +131,13 @@ class CreditSerializer(serializers.ModelSerializer):
 class PrivateEstateBatchCreditSerializer(CreditSerializer):
     billing_address = BillingAddressSerializer()
 
+    prefetch_lookups = CreditSerializer.prefetch_lookups + (
+        'payment__billing_address',
+    )
+
     class Meta:
         model = Credit
+        list_serializer_class = CreditListSerializer
         fields = CreditSerializer.Meta.fields + (
             'billing_address',
         )
@@ -125,8 +156,13 @@ class SecurityCreditSerializer(CreditSerializer):
     ip_address = serializers.CharField(read_only=True)
     billing_address = BillingAddressSerializer()
 
+    prefetch_lookups = CreditSerializer.prefetch_lookups + (
+        'payment__billing_address',
+    )
+
     class Meta:
         model = Credit
+        list_serializer_class = CreditListSerializer
         fields = CreditSerializer.Meta.fields + (
             'prison_name',
             'sender_sort_code',
@@ -141,8 +177,17 @@ class SecurityCreditSerializer(CreditSerializer):
             'billing_address',
         )
 
-    @classmethod
-    def get_prison_name(cls, obj):
+    def prefetch_related_data(self, credits):
+        super().prefetch_related_data(credits)
+        prison_ids = {credit.prison_id for credit in credits if credit.prison_id}
+        self.prison_names = dict(Prison.objects.filter(pk__in=prison_ids).values_list('pk', 'name'))
+
+    def get_prison_name(self, obj):
+        if not obj.prison_id:
+            return None
+        prison_names = getattr(self, 'prison_names', None)
+        if prison_names is not None and obj.prison_id in prison_names:
+            return prison_names[obj.prison_id]
         try:
             return Prison.objects.get(pk=obj.prison_id).name
         except Prison.DoesNotExist:
@@ -154,8 +199,15 @@ class CreditCheckSerializer(CreditSerializer):
 
     security_check = CheckSerializer()
 
+    prefetch_lookups = CreditSerializer.prefetch_lookups + (
+        'security_check__actioned_by',
+        'security_check__assigned_to',
+        'security_check__auto_accept_rule_state__added_by',
+    )
+
     class Meta:
         model = Credit
+        list_serializer_class = CreditListSerializer
         fields = CreditSerializer.Meta.fields + (
             'security_check',
         )
@@ -166,8 +218,15 @@ class SecurityCreditCheckSerializer(SecurityCreditSerializer):
 
     security_check = CheckSerializer()
 
+    prefetch_lookups = SecurityCreditSerializer.prefetch_lookups + (
+        'security_check__actioned_by',
+        'security_check__assigned_to',
+        'security_check__auto_accept_rule_state__added_by',
+    )
+
     class Meta:
         model = Credit
+        list_serializer_class = CreditListSerializer
         fields = SecurityCreditSerializer.Meta.fields + (
             'security_check',
         )
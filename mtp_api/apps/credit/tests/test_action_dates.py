@@ -0,0 +1,60 @@
+from django.test import TestCase
+
+from core.tests.utils import make_test_users
+from credit.models import Credit
+from disbursement.models import Disbursement
+from disbursement.constants import LogAction as DisbursementLogAction
+from disbursement.tests.utils import generate_disbursements
+from payment.tests.utils import generate_payments
+from prison.tests.utils import load_random_prisoner_locations
+from transaction.tests.utils import generate_transactions
+
+
+class ActionDatesTestCase(TestCase):
+    fixtures = [
+        'initial_groups.json',
+        'initial_types.json',
+        'test_prisons.json',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        make_test_users()
+        load_random_prisoner_locations()
+
+    def test_annotated_credit_action_dates_match_logs(self):
+        generate_transactions(transaction_batch=30)
+        generate_payments(payment_batch=30)
+        properties = ('credited_at', 'refunded_at', 'set_manual_at', 'reconciled_at')
+
+        expected = {
+            credit.pk: [getattr(credit, name) for name in properties]
+            for credit in Credit.objects.all()
+        }
+        self.assertTrue(any(dates[0] for dates in expected.values()))
+
+        with self.assertNumQueries(1):
+            credits = list(Credit.objects.with_action_dates())
+            actual = {
+                credit.pk: [getattr(credit, name) for name in properties]
+                for credit in credits
+            }
+        self.assertDictEqual(actual, expected)
+
+    def test_annotated_disbursement_action_dates_match_logs(self):
+        generate_disbursements(disbursement_batch=30)
+        actions = (DisbursementLogAction.confirmed, DisbursementLogAction.sent)
+
+        expected = {
+            disbursement.pk: [disbursement.log_set.get_action_date(action) for action in actions]
+            for disbursement in Disbursement.objects.all()
+        }
+        self.assertTrue(any(dates[0] for dates in expected.values()))
+
+        with self.assertNumQueries(1):
+            disbursements = list(Disbursement.objects.with_action_dates(*actions))
+            actual = {
+                disbursement.pk: [disbursement.get_action_date(action) for action in actions]
+                for disbursement in disbursements
+            }
+        self.assertDictEqual(actual, expected)
@@ -0,0 +1,143 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import models
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import TruncLocalDate
+from core.tests.utils import make_test_users
+from credit.constants import CreditResolution, CreditSource, CreditStatus
+from credit.models import Credit, DailyCreditAggregate, DailyCreditAggregateUpdate
+from prison.models import Prison
+from prison.tests.utils import random_prisoner_number, random_prisoner_dob
+from transaction.models import Transaction
+from transaction.tests.utils import generate_transactions
+
+User = get_user_model()
+
+
+class DailyCreditAggregateTestCase(TestCase):
+    fixtures = [
+        'initial_groups.json',
+        'initial_types.json',
+        'test_prisons.json',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        make_test_users()
+
+    def create_credit(self, received_at, **kwargs):
+        credit = Credit.objects.create(
+            amount=1000,
+            prisoner_number=random_prisoner_number(),
+            prisoner_dob=random_prisoner_dob(),
+            prisoner_name='JAMES HALLS',
+            prison=Prison.objects.first(),
+            received_at=received_at,
+            resolution=CreditResolution.pending,
+            **kwargs
+        )
+        Transaction.objects.create(
+            amount=credit.amount,
+            received_at=credit.received_at,
+            credit=credit,
+            sender_name='Mary Halls',
+        )
+        return credit
+
+    def assertAggregatesMatchCredits(self):  # noqa: N802
+        expected = Credit.objects_all.filter(received_at__isnull=False) \
+            .annotate(date=TruncLocalDate('received_at')) \
+            .order_by() \
+            .values('date', 'prison_id', 'resolution', 'status') \
+            .annotate(count=models.Count('pk'), amount=models.Sum('amount'))
+        expected = {
+            (row['date'], row['prison_id'], row['resolution'], row['status']): (row['count'], row['amount'])
+            for row in expected
+        }
+        aggregates = DailyCreditAggregate.objects.order_by() \
+            .values('date', 'prison_id', 'resolution', 'status') \
+            .annotate(count=models.Sum('count'), amount=models.Sum('amount'))
+        aggregates = {
+            (row['date'], row['prison_id'], row['resolution'], row['status']): (row['count'], row['amount'])
+            for row in aggregates
+        }
+        self.assertDictEqual(aggregates, expected)
+
+    def test_rebuilding_all_dates(self):
+        generate_transactions(transaction_batch=50, days_of_history=10)
+        call_command('update_daily_credit_aggregates', '--all', verbosity=0)
+        self.assertAggregatesMatchCredits()
+
+        # stale aggregates are replaced
+        DailyCreditAggregate.objects.update(count=0)
+        DailyCreditAggregate.objects.create(
+            date=datetime.date(2000, 1, 1), source=CreditSource.unknown, resolution=CreditResolution.pending,
+            count=1, amount=1,
+        )
+        call_command('update_daily_credit_aggregates', '--all', verbosity=0)
+        self.assertAggregatesMatchCredits()
+
+    def test_changed_dates_are_rebuilt(self):
+        now = timezone.now()
+        credit = self.create_credit(now)
+        self.create_credit(now - datetime.timedelta(days=3))
+        self.assertTrue(DailyCreditAggregateUpdate.objects.exists())
+
+        call_command('update_daily_credit_aggregates', verbosity=0)
+        self.assertFalse(DailyCreditAggregateUpdate.objects.exists())
+        self.assertAggregatesMatchCredits()
+        aggregate = DailyCreditAggregate.objects.get(date=timezone.localdate(now))
+        self.assertEqual(aggregate.source, CreditSource.bank_transfer)
+        self.assertEqual(aggregate.status, CreditStatus.credit_pending)
+        self.assertEqual((aggregate.count, aggregate.amount), (1, 1000))
+
+        # bulk crediting does not send save signals
+        Credit.objects.credit_all(Credit.objects.filter(pk=credit.pk), User.objects.first())
+        call_command('update_daily_credit_aggregates', verbosity=0)
+        self.assertAggregatesMatchCredits()
+        aggregate = DailyCreditAggregate.objects.get(date=timezone.localdate(now))
+        self.assertEqual(aggregate.status, CreditStatus.credited)
+
+    def test_only_aggregated_changes_are_recorded(self):
+        now = timezone.now()
+        credit = self.create_credit(now)
+        call_command('update_daily_credit_aggregates', verbosity=0)
+
+        credit = Credit.objects.get(pk=credit.pk)
+        credit.reviewed = True
+        credit.save()
+        self.assertFalse(DailyCreditAggregateUpdate.objects.exists())
+
+        credit.received_at = now - datetime.timedelta(days=3)
+        credit.save()
+        self.assertSetEqual(
+            set(DailyCreditAggregateUpdate.objects.values_list('date', flat=True)),
+            {timezone.localdate(now), timezone.localdate(credit.received_at)},
+        )
+        call_command('update_daily_credit_aggregates', verbosity=0)
+        self.assertAggregatesMatchCredits()
+        self.assertFalse(DailyCreditAggregate.objects.filter(date=timezone.localdate(now)).exists())
+
+        credit.amount = 2000
+        credit.save()
+        self.assertListEqual(
+            list(DailyCreditAggregateUpdate.objects.values_list('date', flat=True)),
+            [timezone.localdate(credit.received_at)],
+        )
+
+    def test_totals_for_received_dates(self):
+        now = timezone.now()
+        self.create_credit(now)
+        self.create_credit(now - datetime.timedelta(days=7))
+        call_command('update_daily_credit_aggregates', verbosity=0)
+
+        totals = DailyCreditAggregate.objects.received_between(now - datetime.timedelta(days=1)).totals()
+        self.assertDictEqual(totals, {'count': 1, 'amount': 1000})
+        totals = DailyCreditAggregate.objects.received_between(now - datetime.timedelta(days=10), now).totals()
+        self.assertDictEqual(totals, {'count': 1, 'amount': 1000})
+        totals = DailyCreditAggregate.objects.received_between(now + datetime.timedelta(days=1)).totals()
+        self.assertDictEqual(totals, {'count': 0, 'amount': 0})
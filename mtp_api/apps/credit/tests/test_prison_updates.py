@@ -1,13 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from django.utils import timezone
 
+from core.models import ScheduledCommand
 from core.tests.utils import make_test_users
 
-from prison.models import Prison, PrisonerLocation
+from prison.models import Prison, PrisonerLocation, PrisonerLocationChange
 from prison.tests.utils import random_prisoner_number, random_prisoner_dob, random_prisoner_name
 
-from credit.constants import CreditResolution
+from credit.constants import CreditResolution, CreditStatus
 from credit.signals import credit_prisons_need_updating
 from credit.models import Credit
 from transaction.models import Transaction
@@ -364,3 +366,84 @@ class UpdatePrisonsOnReconciledCreditsTestcase(BaseUpdatePrisonsForTransactionsT
         self.credit.refresh_from_db()
         self.assertNotEqual(self.credit.prisoner_name, new_prisoner_name)
         self.assertEqual(self.credit.prison.pk, existing_prison.pk)
+
+
+class IncrementalUpdatePrisonsTestCase(BaseUpdatePrisonsForTransactionsTestCase):
+    def _get_credit_data(self):
+        data = super()._get_credit_data()
+        data.update({
+            'prison': Prison.objects.first(),
+            'prisoner_name': random_prisoner_name(),
+            'owner': None,
+            'resolution': CreditResolution.pending.value,
+        })
+        return data
+
+    def _upload_locations(self, locations):
+        for location in locations:
+            PrisonerLocation.objects.create(created_by=User.objects.first(), active=False, **location)
+        PrisonerLocationChange.objects.record_upload()
+        PrisonerLocation.objects.filter(active=True).delete()
+        PrisonerLocation.objects.filter(active=False).update(active=True)
+
+    def test_only_changed_prisoners_are_updated(self):
+        existing_prison = self.credit.prison
+        new_prison = Prison.objects.exclude(pk=existing_prison.pk).first()
+        unchanged_credit = Credit.objects.create(**self._get_credit_data())
+        for credit in (self.credit, unchanged_credit):
+            PrisonerLocation.objects.create(
+                created_by=User.objects.first(),
+                prisoner_name=credit.prisoner_name,
+                prisoner_number=credit.prisoner_number,
+                prisoner_dob=credit.prisoner_dob,
+                prison=existing_prison,
+                active=True,
+            )
+        # change credit's prison without the location changing, to prove the prisoner is not re-matched
+        Credit.objects.filter(pk=unchanged_credit.pk).update(prison=new_prison)
+
+        self._upload_locations([
+            {
+                'prisoner_name': self.credit.prisoner_name,
+                'prisoner_number': self.credit.prisoner_number,
+                'prisoner_dob': self.credit.prisoner_dob,
+                'prison': new_prison,
+            },
+            {
+                'prisoner_name': unchanged_credit.prisoner_name,
+                'prisoner_number': unchanged_credit.prisoner_number,
+                'prisoner_dob': unchanged_credit.prisoner_dob,
+                'prison': existing_prison,
+            },
+        ])
+        self.assertEqual(PrisonerLocationChange.objects.count(), 1)
+
+        call_command('update_credit_prisons', verbosity=0)
+
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.prison.pk, new_prison.pk)
+        unchanged_credit.refresh_from_db()
+        self.assertEqual(unchanged_credit.prison.pk, new_prison.pk)
+        self.assertFalse(PrisonerLocationChange.objects.filter(credits_updated=False).exists())
+
+    def test_released_prisoner_becomes_refund_pending(self):
+        PrisonerLocation.objects.create(
+            created_by=User.objects.first(),
+            prisoner_name=self.credit.prisoner_name,
+            prisoner_number=self.credit.prisoner_number,
+            prisoner_dob=self.credit.prisoner_dob,
+            prison=self.credit.prison,
+            active=True,
+        )
+
+        self._upload_locations([])
+        call_command('update_credit_prisons', batch_size=1, verbosity=0)
+
+        self.credit.refresh_from_db()
+        self.assertIsNone(self.credit.prison)
+        self.assertEqual(self.credit.status, CreditStatus.refund_pending)
+
+    def test_recorded_changes_are_applied_by_permanent_job(self):
+        job = ScheduledCommand.objects.get(name='update_credit_prisons')
+        self.assertEqual(job.cron_entry, '* * * * *')
+        self.assertFalse(job.delete_after_next)
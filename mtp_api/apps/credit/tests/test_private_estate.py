@@ -9,8 +9,8 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 
 from core.tests.utils import make_test_users, FLAKY_TEST_WARNING
-from credit.constants import CreditResolution, CreditStatus
-from credit.models import Credit, PrivateEstateBatch
+from credit.constants import CreditResolution, CreditStatus, LogAction
+from credit.models import Credit, Log, PrivateEstateBatch
 from mtp_auth.tests.utils import AuthTestCaseMixin
 from payment.tests.utils import generate_payments
 from prison.models import Prison, PrisonBankAccount
@@ -203,6 +203,9 @@ class PrivateEstateBatchTestCase(AuthTestCaseMixin, APITestCase):
         some_credit.resolution = CreditResolution.pending.value
         some_credit.save()
 
+        credit_pending_count = expected_batch.credit_set.credit_pending().count()
+        self.assertGreater(credit_pending_count, 0)
+
         user = self.bank_admins[0]
         user.user_permissions.add(Permission.objects.get(codename='change_privateestatebatch'))
         url = reverse('privateestatebatch-detail', kwargs={
@@ -215,11 +218,16 @@ class PrivateEstateBatchTestCase(AuthTestCaseMixin, APITestCase):
             url, {'credited': True}, format='json',
             HTTP_AUTHORIZATION=self.get_http_authorization_for_user(user)
         )
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertDictEqual(response.json(), {'credited': credit_pending_count})
         self.assertTrue(all(
             credit.credited
             for credit in expected_batch.credit_set.all()
         ))
+        some_credit.refresh_from_db()
+        self.assertEqual(some_credit.owner, user)
+        self.assertEqual(some_credit.status, CreditStatus.credited)
+        self.assertTrue(Log.objects.filter(credit=some_credit, action=LogAction.credited, user=user).exists())
 
     def test_normal_bank_admin_cannot_credit_batch(self):
         expected_batch = PrivateEstateBatch.objects.filter(date=self.date_with_batch).first()
@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.tests.utils import make_test_users
+from credit.models import Credit
+from credit.signals import credit_prisons_need_updating
+from credit.views import CreditListFilter
+from payment.models import Payment
+from prison.models import Prison, PrisonerLocation
+from prison.tests.utils import random_prisoner_number, random_prisoner_dob
+from transaction.models import Transaction
+
+User = get_user_model()
+
+
+class CreditSearchDocumentTestCase(TestCase):
+    fixtures = [
+        'initial_groups.json',
+        'initial_types.json',
+        'test_prisons.json',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        make_test_users()
+        self.credit = Credit.objects.create(
+            amount=1000,
+            prisoner_number=random_prisoner_number(),
+            prisoner_dob=random_prisoner_dob(),
+            prisoner_name='JAMES HALLS',
+            prison=Prison.objects.first(),
+            received_at=timezone.now(),
+        )
+
+    def assertSearchDocument(self, *parts):  # noqa: N802
+        self.credit.refresh_from_db()
+        self.assertEqual(self.credit.search_document, '\n%s\n' % '\n'.join(parts))
+
+    def test_document_follows_credit_and_transaction(self):
+        prisoner_number = self.credit.prisoner_number.lower()
+        self.assertSearchDocument('james halls', prisoner_number)
+
+        transaction = Transaction.objects.create(
+            amount=self.credit.amount,
+            received_at=self.credit.received_at,
+            credit=self.credit,
+            sender_name='Mary Halls',
+        )
+        self.assertSearchDocument('james halls', prisoner_number, 'mary halls')
+
+        transaction.sender_name = 'Mary Smith'
+        transaction.save()
+        self.assertSearchDocument('james halls', prisoner_number, 'mary smith')
+
+    def test_document_is_only_updated_when_searched_fields_change(self):
+        self.credit.refresh_from_db()
+        self.credit.reviewed = True
+        with CaptureQueriesContext(connection) as queries:
+            self.credit.save()
+        self.assertFalse(any('CONCAT_WS' in query['sql'] for query in queries))
+
+        self.credit.prisoner_name = 'JAMES HALL'
+        self.credit.save()
+        self.assertSearchDocument('james hall', self.credit.prisoner_number.lower())
+
+    def test_document_follows_payment(self):
+        payment = Payment.objects.create(
+            amount=self.credit.amount,
+            credit=self.credit,
+            cardholder_name='Mary Halls',
+            email='Mary@mtp.local',
+        )
+        prisoner_number = self.credit.prisoner_number.lower()
+        self.assertSearchDocument('james halls', prisoner_number, 'mary halls', 'mary@mtp.local')
+
+        payment.email = 'halls@mtp.local'
+        payment.save()
+        self.assertSearchDocument('james halls', prisoner_number, 'mary halls', 'halls@mtp.local')
+
+    def test_document_follows_prisoner_location_updates(self):
+        PrisonerLocation.objects.create(
+            created_by=User.objects.first(),
+            prisoner_name='JAMES HALL',
+            prisoner_number=self.credit.prisoner_number,
+            prisoner_dob=self.credit.prisoner_dob,
+            prison=self.credit.prison,
+            active=True,
+        )
+        credit_prisons_need_updating.send(sender=None)
+        self.assertSearchDocument('james hall', self.credit.prisoner_number.lower())
+
+    def test_rebuild_command(self):
+        Credit.objects_all.update(search_document='')
+        call_command('update_credit_search_documents', batch_size=1, verbosity=0)
+        self.assertSearchDocument('james halls', self.credit.prisoner_number.lower())
+
+    def test_filters_match_with_and_without_search_documents(self):
+        filters = [
+            {'search': 'halls'},
+            {'search': 'HALLS £10.00'},
+            {'simple_search': self.credit.prisoner_number[:4]},
+            {'prisoner_name': 'james h'},
+            {'prisoner_name': 'smith'},
+        ]
+        for data in filters:
+            with override_settings(USE_SEARCH_DOCUMENTS=True):
+                with_document = set(CreditListFilter(data, queryset=Credit.objects.all()).qs)
+            with override_settings(USE_SEARCH_DOCUMENTS=False):
+                without_document = set(CreditListFilter(data, queryset=Credit.objects.all()).qs)
+            self.assertSetEqual(with_document, without_document, msg=data)
+
+    def test_text_filters_narrow_by_search_document(self):
+        filters = [
+            {'search': 'halls'},
+            {'simple_search': 'halls'},
+            {'sender_name': 'mary h'},
+            {'prisoner_name': 'james'},
+            {'sender_email': 'mary@'},
+        ]
+        for data in filters:
+            with override_settings(USE_SEARCH_DOCUMENTS=True):
+                where_clause = get_where_clause(CreditListFilter(data, queryset=Credit.objects.all()).qs)
+            self.assertIn('search_document', where_clause, msg=data)
+            with override_settings(USE_SEARCH_DOCUMENTS=False):
+                where_clause = get_where_clause(CreditListFilter(data, queryset=Credit.objects.all()).qs)
+            self.assertNotIn('search_document', where_clause, msg=data)
+
+
+def get_where_clause(queryset):
+    # the search document column is always selected so only conditions are checked
+    return str(queryset.query).split(' WHERE ', 1)[1]
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from core.tests.utils import make_test_users
+from credit.constants import CreditResolution, CreditStatus
+from credit.models import Credit
+from credit.signals import credit_prisons_need_updating
+from prison.models import Prison, PrisonerLocation
+from prison.tests.utils import random_prisoner_number, random_prisoner_dob, random_prisoner_name
+from transaction.models import Transaction
+
+User = get_user_model()
+
+
+class CreditStatusTestCase(TestCase):
+    fixtures = [
+        'initial_groups.json',
+        'initial_types.json',
+        'test_prisons.json',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        make_test_users()
+        self.user = User.objects.first()
+        self.prison = Prison.objects.first()
+
+    def _make_credit(self, **kwargs):
+        data = {
+            'amount': 1000,
+            'prisoner_number': random_prisoner_number(),
+            'prisoner_dob': random_prisoner_dob(),
+            'received_at': timezone.now().replace(microsecond=0),
+        }
+        data.update(kwargs)
+        return Credit.objects_all.create(**data)
+
+    def assertStoredStatus(self, credit, status):  # noqa: N802
+        self.assertEqual(Credit.objects_all.get(pk=credit.pk).status, status)
+
+    def test_status_saved_with_credit(self):
+        credit = self._make_credit(prison=self.prison)
+        self.assertStoredStatus(credit, CreditStatus.credit_pending)
+        credit.credit_prisoner(self.user)
+        self.assertStoredStatus(credit, CreditStatus.credited)
+
+        credit = self._make_credit(prison=self.prison, blocked=True)
+        self.assertStoredStatus(credit, CreditStatus.refund_pending)
+
+        credit = self._make_credit(resolution=CreditResolution.initial)
+        self.assertStoredStatus(credit, None)
+
+    def test_anonymous_transaction_clears_refund_pending_status(self):
+        credit = self._make_credit(prison=None)
+        self.assertStoredStatus(credit, CreditStatus.refund_pending)
+
+        Transaction.objects.create(
+            amount=credit.amount,
+            received_at=credit.received_at,
+            credit=credit,
+            incomplete_sender_info=True,
+        )
+        self.assertStoredStatus(credit, None)
+
+    def test_bulk_state_changes_update_status(self):
+        credit = self._make_credit(prison=self.prison)
+        Credit.objects.set_manual(Credit.objects.all(), [credit.pk], self.user)
+        self.assertStoredStatus(credit, CreditStatus.credit_pending)
+
+        credit = self._make_credit(prison=None)
+        transaction = Transaction.objects.create(
+            amount=credit.amount,
+            received_at=credit.received_at,
+            credit=credit,
+        )
+        Credit.objects.refund([transaction.pk], self.user)
+        self.assertStoredStatus(credit, CreditStatus.refunded)
+
+    def test_update_prisons_updates_status(self):
+        credit = self._make_credit(prison=None)
+        self.assertStoredStatus(credit, CreditStatus.refund_pending)
+
+        PrisonerLocation.objects.create(
+            created_by=self.user,
+            prisoner_name=random_prisoner_name(),
+            prisoner_number=credit.prisoner_number,
+            prisoner_dob=credit.prisoner_dob,
+            prison=self.prison,
+            active=True,
+        )
+        credit_prisons_need_updating.send(sender=PrisonerLocation)
+        self.assertStoredStatus(credit, CreditStatus.credit_pending)
+
+    def test_consistency_check_and_backfill(self):
+        credit = self._make_credit(prison=self.prison)
+        call_command('update_credit_statuses', check=True, verbosity=0)
+
+        Credit.objects_all.filter(pk=credit.pk).update(status=None)
+        self.assertEqual(Credit.objects_all.status_mismatches().count(), 1)
+        with self.assertRaises(CommandError):
+            call_command('update_credit_statuses', check=True, verbosity=0)
+
+        call_command('update_credit_statuses', batch_size=1, verbosity=0)
+        self.assertStoredStatus(credit, CreditStatus.credit_pending)
+        call_command('update_credit_statuses', check=True, verbosity=0)
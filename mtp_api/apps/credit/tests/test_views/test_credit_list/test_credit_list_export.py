@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import urllib.parse
+
+from django.urls import reverse
+from rest_framework import status
+
+from credit.tests.test_views.test_credit_list import CreditListTestCase
+
+
+class CreditListExportTestCase(CreditListTestCase):
+    def setUp(self):
+        super().setUp()
+        self.logged_in_user = self._get_authorised_user()
+
+    def _get_export(self, **params):
+        return self.client.get(
+            '{url}?{params}'.format(url=reverse('credit-export'), params=urllib.parse.urlencode(params)),
+            HTTP_AUTHORIZATION=self.get_http_authorization_for_user(self.logged_in_user)
+        )
+
+    def _get_list_ids(self, **filters):
+        response = self.client.get(
+            self._get_url(**filters), format='json',
+            HTTP_AUTHORIZATION=self.get_http_authorization_for_user(self.logged_in_user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [credit['id'] for credit in response.data['results']]
+
+    def test_ndjson_export_matches_list(self):
+        filters = {'status': 'credit_pending', 'ordering': '-amount'}
+        expected_ids = self._get_list_ids(**filters)
+        self.assertTrue(expected_ids)
+
+        response = self._get_export(**filters)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        content = b''.join(response.streaming_content).decode()
+        credits = [json.loads(line) for line in content.splitlines()]
+        self.assertListEqual([credit['id'] for credit in credits], expected_ids)
+        self.assertIn('prisoner_number', credits[0])
+
+    def test_csv_export_matches_list(self):
+        expected_ids = self._get_list_ids()
+
+        response = self._get_export(export_format='csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertListEqual([int(row['id']) for row in rows], expected_ids)
+        self.assertIn('prisoner_number', rows[0])
+
+    def test_csv_export_has_header_without_credits(self):
+        response = self._get_export(export_format='csv', prisoner_number='A0000ZZ')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b''.join(response.streaming_content).decode()
+        header, *rows = content.splitlines()
+        self.assertIn('id', header.split(','))
+        self.assertListEqual(rows, [])
+
+    def test_invalid_export_format(self):
+        response = self._get_export(export_format='xlsx')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,60 @@
+import urllib.parse
+
+from django.urls import reverse
+from rest_framework import status
+
+from credit.tests.test_views.test_credit_list import CreditListTestCase
+
+
+class CreditListKeysetPaginationTestCase(CreditListTestCase):
+    def setUp(self):
+        super().setUp()
+        self.logged_in_user = self._get_authorised_user()
+
+    def _get(self, url):
+        response = self.client.get(
+            url, format='json',
+            HTTP_AUTHORIZATION=self.get_http_authorization_for_user(self.logged_in_user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def _get_keyset_url(self, **params):
+        return '{url}?{params}'.format(url=reverse('credit-list'), params=urllib.parse.urlencode(params))
+
+    def _test_keyset_pages_match_offset_list(self, ordering):
+        expected_ids = [credit['id'] for credit in self._get(self._get_url(ordering=ordering)).data['results']]
+        self.assertTrue(len(expected_ids) > 5)
+
+        ids = []
+        url = self._get_keyset_url(ordering=ordering, cursor='', limit=5)
+        while url:
+            response = self._get(url)
+            self.assertNotIn('count', response.data)
+            self.assertLessEqual(len(response.data['results']), 5)
+            ids.extend(credit['id'] for credit in response.data['results'])
+            url = response.data['next']
+        self.assertListEqual(ids, expected_ids)
+
+    def test_default_ordering(self):
+        self._test_keyset_pages_match_offset_list('')
+
+    def test_ordering_by_received_at(self):
+        self._test_keyset_pages_match_offset_list('received_at')
+        self._test_keyset_pages_match_offset_list('-received_at')
+
+    def test_ordering_by_non_unique_fields(self):
+        self._test_keyset_pages_match_offset_list('amount')
+        self._test_keyset_pages_match_offset_list('-prisoner_name')
+
+    def test_count_only_when_requested(self):
+        offset_response = self._get(self._get_url())
+        response = self._get(self._get_keyset_url(cursor='', include_count=1))
+        self.assertEqual(response.data['count'], offset_response.data['count'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            self._get_keyset_url(cursor='not-a-cursor'), format='json',
+            HTTP_AUTHORIZATION=self.get_http_authorization_for_user(self.logged_in_user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
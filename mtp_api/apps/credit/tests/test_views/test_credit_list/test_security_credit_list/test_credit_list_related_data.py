@@ -0,0 +1,54 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from credit.models import Comment, Credit
+from credit.tests.test_views.test_credit_list.test_security_credit_list import SecurityCreditListTestCase
+
+
+class RelatedDataCreditListTestCase(SecurityCreditListTestCase):
+    def test_related_data_loaded_for_page(self):
+        logged_in_user = self._get_authorised_user()
+        commented_credit = Credit.objects.filter(prison__isnull=False).first()
+        Comment.objects.create(credit=commented_credit, user=logged_in_user, comment='Checked')
+        Comment.objects.create(credit=commented_credit, user=None, comment='Checked again')
+
+        response = self._test_response({})
+        self.assertTrue(response.data['results'])
+        for response_credit in response.data['results']:
+            db_credit = Credit.objects.get(pk=response_credit['id'])
+            self.assertEqual(response_credit['prison_name'], db_credit.prison.name if db_credit.prison else None)
+            self.assertEqual(response_credit['sender_name'], db_credit.sender_name)
+            self.assertEqual(response_credit['sender_email'], db_credit.sender_email)
+            self.assertEqual(response_credit['owner_name'], db_credit.owner_name)
+            self.assertListEqual(
+                [comment['user_full_name'] for comment in response_credit['comments']],
+                [
+                    comment.user.get_full_name() if comment.user else None
+                    for comment in db_credit.comments.order_by('pk')
+                ],
+            )
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        logged_in_user = self._get_authorised_user()
+        for credit in Credit.objects.filter(prison__isnull=False)[:10]:
+            Comment.objects.create(credit=credit, user=logged_in_user, comment='Checked')
+
+        def get_page(limit):
+            response = self.client.get(
+                reverse('credit-list'), {'limit': limit, 'ordering': '-received_at'}, format='json',
+                HTTP_AUTHORIZATION=self.get_http_authorization_for_user(logged_in_user),
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), limit)
+
+        # warm up caches that are not specific to the page
+        get_page(1)
+
+        query_counts = []
+        for limit in (2, 20):
+            with CaptureQueriesContext(connection) as queries:
+                get_page(limit)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
@@ -1,5 +1,7 @@
 import datetime
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.dateparse import parse_date
 from rest_framework import status
@@ -59,6 +61,61 @@ class CreditCreditsTestCase(
             len(to_credit)
         )
 
+    def test_credit_credits_with_conflicts(self):
+        logged_in_user = self.prison_clerks[0]
+        managing_prisons = list(PrisonUserMapping.objects.get_prison_set_for_user(logged_in_user))
+
+        available_ids = list(
+            self._get_credit_pending_credits_qs(managing_prisons, logged_in_user).values_list('id', flat=True)
+        )
+        credited_ids = list(Credit.objects.credited().values_list('id', flat=True)[:1])
+        self.assertTrue(available_ids)
+        self.assertTrue(credited_ids)
+
+        data = [
+            {'id': c_id, 'credited': True}
+            for c_id in available_ids + credited_ids + available_ids[:1]
+        ]
+        response = self.client.post(
+            self._get_url(), data=data,
+            format='json',
+            HTTP_AUTHORIZATION=self.get_http_authorization_for_user(logged_in_user)
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['errors'][0]['ids'], credited_ids + available_ids[:1])
+        self.assertEqual(
+            Credit.objects.filter(
+                id__in=available_ids, resolution=CreditResolution.credited, owner=logged_in_user,
+            ).count(),
+            len(available_ids)
+        )
+        self.assertEqual(
+            Log.objects.filter(action=LogAction.credited, credit__id__in=available_ids).count(),
+            len(available_ids)
+        )
+
+    def test_query_count_does_not_depend_on_number_of_credits(self):
+        logged_in_user = self.prison_clerks[0]
+        managing_prisons = list(PrisonUserMapping.objects.get_prison_set_for_user(logged_in_user))
+
+        available_ids = list(
+            self._get_credit_pending_credits_qs(managing_prisons, logged_in_user).values_list('id', flat=True)
+        )
+        self.assertTrue(len(available_ids) > 1)
+
+        def count_queries(credit_ids):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(
+                    self._get_url(), data=[{'id': c_id, 'credited': True} for c_id in credit_ids],
+                    format='json',
+                    HTTP_AUTHORIZATION=self.get_http_authorization_for_user(logged_in_user)
+                )
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            return len(captured)
+
+        self.assertEqual(count_queries(available_ids[:1]), count_queries(available_ids[1:]))
+
     def test_missing_ids(self):
         logged_in_user = self.prison_clerks[0]
 
@@ -15,6 +15,11 @@ batch_credits_router.register(r'credits', views.PrivateEstateBatchCreditsView, b
 
 urlpatterns = [
     re_path(r'^credits/$', csrf_exempt(views.GetCredits.as_view({'get': 'list'}, suffix='List')), name='credit-list'),
+    re_path(
+        r'^credits/export/$',
+        csrf_exempt(views.GetCredits.as_view({'get': 'export'}, suffix='Export')),
+        name='credit-export',
+    ),
     re_path(
         r'^credits/actions/review/$',
         views.ReviewCredits.as_view(actions={'post': 'review'}),
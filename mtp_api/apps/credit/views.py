@@ -1,17 +1,25 @@
+import csv
 from functools import reduce
+import itertools
+import json
 import logging
 import re
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models, transaction
+from django.http import StreamingHttpResponse
 import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
 from django_filters.widgets import BooleanWidget
 from django.utils import timezone
 from rest_framework import generics, mixins, status as drf_status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 
 from core.filters import (
@@ -23,10 +31,13 @@ from core.filters import (
     MultipleValueFilter,
     PostcodeFilter,
     SafeOrderingFilter,
+    search_document_filter,
+    SearchDocumentCharFilter,
     SplitTextInMultipleFieldsFilter,
     StatusChoiceFilter,
 )
 from core.models import TruncUtcDate
+from core.pagination import KeysetPagination
 from core.permissions import ActionsBasedPermissions
 from credit.constants import CreditResolution, CreditStatus, CreditSource, LogAction
 from credit.models import Credit, Comment, ProcessingBatch, PrivateEstateBatch
@@ -64,11 +75,13 @@ class CreditTextSearchFilter(django_filters.CharFilter):
     - prisoner_number
     - sender_name
     - amount (input is expected as £nn.nn but is reformatted for search)
+    Text fields are narrowed using the credit's search document if enabled.
     """
     fields = [
         'prisoner_name', 'prisoner_number', 'sender_name', 'amount',
         'payment__uuid'
     ]
+    search_document_fields = {'prisoner_name', 'prisoner_number', 'sender_name'}
 
     def filter(self, qs, value):
         if not value:
@@ -105,10 +118,25 @@ class CreditTextSearchFilter(django_filters.CharFilter):
             return models.Q(**{'%s__icontains' % field: word})
 
         for value_word in value.split():
+            text_filter = reduce(
+                lambda a, b: a | b,
+                [
+                    get_field_filter(field, value_word)
+                    for field in self.fields
+                    if field in self.search_document_fields
+                ]
+            )
+            if settings.USE_SEARCH_DOCUMENTS:
+                text_filter = search_document_filter('search_document', value_word) & text_filter
+            other_filters = [
+                get_field_filter(field, value_word)
+                for field in self.fields
+                if field not in self.search_document_fields
+            ]
             qs = qs.filter(
                 reduce(
                     lambda a, b: a | b,
-                    filter(bool, [get_field_filter(field, value_word) for field in self.fields])
+                    filter(bool, [text_filter] + other_filters)
                 )
             )
         return qs
@@ -157,7 +185,9 @@ class CreditListFilter(BaseFilterSet):
     user = django_filters.ModelChoiceFilter(field_name='owner', queryset=User.objects.all())
     valid = ValidCreditFilter(widget=BooleanWidget)
 
-    prisoner_name = django_filters.CharFilter(field_name='prisoner_name', lookup_expr='icontains')
+    prisoner_name = SearchDocumentCharFilter(
+        field_name='prisoner_name', lookup_expr='icontains', search_document_field='search_document',
+    )
     prison = django_filters.ModelMultipleChoiceFilter(queryset=Prison.objects.all())
     prison__isnull = django_filters.BooleanFilter(field_name='prison', lookup_expr='isnull')
     prison_region = django_filters.CharFilter(field_name='prison__region')
@@ -172,12 +202,14 @@ class CreditListFilter(BaseFilterSet):
             'prisoner_number',
         ),
         lookup_expr='icontains',
+        search_document_field='search_document',
     )
     search = CreditTextSearchFilter()
 
     sender_name = MultipleFieldCharFilter(
         field_name=('transaction__sender_name', 'payment__cardholder_name',),
-        lookup_expr='icontains'
+        lookup_expr='icontains',
+        search_document_field='search_document',
     )
     sender_sort_code = django_filters.CharFilter(field_name='transaction__sender_sort_code')
     sender_account_number = django_filters.CharFilter(field_name='transaction__sender_account_number')
@@ -195,8 +227,10 @@ class CreditListFilter(BaseFilterSet):
     card_expiry_date = django_filters.CharFilter(field_name='payment__card_expiry_date')
     card_number_first_digits = django_filters.CharFilter(field_name='payment__card_number_first_digits')
     card_number_last_digits = django_filters.CharFilter(field_name='payment__card_number_last_digits')
-    sender_email = django_filters.CharFilter(field_name='payment__email', lookup_expr='icontains')
-    sender_postcode = PostcodeFilter(field_name='payment__billing_address__postcode')
+    sender_email = SearchDocumentCharFilter(
+        field_name='payment__email', lookup_expr='icontains', search_document_field='search_document',
+    )
+    sender_postcode = PostcodeFilter(field_name='payment__billing_address__normalised_postcode')
     sender_ip_address = django_filters.CharFilter(field_name='payment__ip_address')
 
     payment_reference = django_filters.CharFilter(field_name='payment__uuid', lookup_expr='startswith')
@@ -271,8 +305,16 @@ class GetCredits(CreditViewMixin, mixins.ListModelMixin, viewsets.GenericViewSet
     filterset_class = CreditListFilter
     ordering_fields = ('created', 'received_at', 'amount',
                        'prisoner_number', 'prisoner_name')
+    pagination_class = KeysetPagination
     action = 'list'
 
+    export_format_query_param = 'export_format'
+    export_content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+    }
+    export_chunk_size = 2000
+
     permission_classes = (
         IsAuthenticated, CreditPermissions, get_client_permissions_class(
             CASHBOOK_OAUTH_CLIENT_ID, NOMS_OPS_OAUTH_CLIENT_ID,
@@ -281,7 +323,8 @@ class GetCredits(CreditViewMixin, mixins.ListModelMixin, viewsets.GenericViewSet
     )
 
     def get_queryset(self, include_checks=False, only_completed=False):
-        q = super().get_queryset().select_related('transaction').select_related('payment__batch')
+        q = super().get_queryset().select_related('transaction').select_related('payment__batch') \
+            .with_action_dates(LogAction.credited, LogAction.refunded, LogAction.manual)
         if include_checks:
             q = q.select_related('security_check')
         if only_completed:
@@ -305,6 +348,69 @@ class GetCredits(CreditViewMixin, mixins.ListModelMixin, viewsets.GenericViewSet
         else:
             return CreditSerializer
 
+    def export(self, request, *args, **kwargs):
+        """
+        Streams all credits matching the list filters in one response, as newline-delimited JSON
+        or as CSV if `export_format=csv`; credits are read through a server-side cursor
+        and serialised a chunk at a time so memory use does not grow with the number of credits
+        """
+        export_format = request.query_params.get(self.export_format_query_param) or 'ndjson'
+        if export_format not in self.export_content_types:
+            raise ValidationError({
+                self.export_format_query_param: ['Choose one of: %s' % ', '.join(self.export_content_types)]
+            })
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.serialize_in_chunks(queryset)
+        if export_format == 'csv':
+            content = self.render_csv(rows)
+        else:
+            renderer = JSONRenderer()
+            content = (renderer.render(row) + b'\n' for row in rows)
+        response = StreamingHttpResponse(content, content_type=self.export_content_types[export_format])
+        response['Content-Disposition'] = 'attachment; filename="credits.%s"' % export_format
+        return response
+
+    def serialize_in_chunks(self, queryset):
+        credits = queryset.iterator(chunk_size=self.export_chunk_size)
+        while True:
+            chunk = list(itertools.islice(credits, self.export_chunk_size))
+            if not chunk:
+                break
+            # the list serializer loads related objects once per chunk
+            yield from self.get_serializer(chunk, many=True).data
+
+    def render_csv(self, rows):
+        writer = csv.writer(EchoBuffer())
+        fields = [
+            field_name
+            for field_name, field in self.get_serializer().fields.items()
+            if not field.write_only
+        ]
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([
+                self.csv_value(row.get(field))
+                for field in fields
+            ])
+
+    @classmethod
+    def csv_value(cls, value):
+        if value is None:
+            return ''
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, cls=JSONEncoder)
+        return value
+
+
+class EchoBuffer:
+    """
+    File-like object for csv.writer which returns each written row rather than storing it
+    """
+
+    def write(self, value):
+        return value
+
 
 class CreditsGroupedByCreditedList(CreditViewMixin, generics.ListAPIView):
     serializer_class = CreditsGroupedByCreditedSerializer
@@ -356,19 +462,14 @@ class CreditCredits(CreditViewMixin, APIView):
         deserialized = self.get_serializer(data=request.data, many=True)
         deserialized.is_valid(raise_exception=True)
 
-        conflict_ids = []
-        with transaction.atomic():
-            for credit_update in deserialized.data:
-                if credit_update['credited']:
-                    credits = Credit.objects.credit_pending().filter(
-                        pk=credit_update['id']
-                    ).select_for_update()
-                    if len(credits):
-                        credits.first().credit_prisoner(
-                            request.user, credit_update.get('nomis_transaction_id')
-                        )
-                    else:
-                        conflict_ids.append(credit_update['id'])
+        conflict_ids = Credit.objects.credit(
+            (
+                (credit_update['id'], credit_update.get('nomis_transaction_id'))
+                for credit_update in deserialized.data
+                if credit_update['credited']
+            ),
+            request.user,
+        )
 
         if conflict_ids:
             return Response(
@@ -530,10 +631,13 @@ class PrivateEstateBatchView(
             return Response(status=drf_status.HTTP_405_METHOD_NOT_ALLOWED)
         batch = self.get_object()
         if (request.data or {}).get('credited'):
-            with transaction.atomic():
-                for credit in batch.credit_set.credit_pending():
-                    credit.credit_prisoner(self.request.user, nomis_transaction_id=None)
-            return Response(status=drf_status.HTTP_204_NO_CONTENT)
+            credited_count = Credit.objects.credit_all(batch.credit_set.all(), self.request.user)
+            logger.info('%(user)s credited %(count)d credits in private estate batch %(batch)s', {
+                'user': self.request.user.username,
+                'count': credited_count,
+                'batch': batch,
+            })
+            return Response({'credited': credited_count})
         return Response(status=drf_status.HTTP_400_BAD_REQUEST)
 
 
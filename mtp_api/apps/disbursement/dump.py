@@ -20,7 +20,7 @@ class DisbursementSerialiser(Serialiser):
             self.format_amount = format_currency
 
     def get_queryset(self):
-        return Disbursement.objects.all()
+        return Disbursement.objects.with_action_dates(LogAction.confirmed, LogAction.sent)
 
     def get_headers(self):
         return super().get_headers() + [
@@ -43,8 +43,8 @@ class DisbursementSerialiser(Serialiser):
         row.update({
             'URL': f'{settings.NOMS_OPS_URL}/security/disbursements/{record.id}/',
             'Date entered': record.created,
-            'Date confirmed': record.log_set.get_action_date(LogAction.confirmed),
-            'Date sent': record.log_set.get_action_date(LogAction.sent),
+            'Date confirmed': record.get_action_date(LogAction.confirmed),
+            'Date sent': record.get_action_date(LogAction.sent),
             'Amount': self.format_amount(record.amount),
             'Prisoner number': record.prisoner_number,
             'Prisoner name': record.prisoner_name,
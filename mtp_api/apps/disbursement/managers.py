@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.db import models
-from django.db.models import Q
+from django.db.models import OuterRef, Q, Subquery
 from django.db.models.functions import Cast, Concat
 from django.db.transaction import atomic
 
@@ -33,6 +33,26 @@ class DisbursementQuerySet(models.QuerySet):
             .order_by('created_date') \
             .annotate(amount_per_day=models.Sum('amount'))
 
+    def with_action_dates(self, *actions):
+        """
+        Annotates the date each action (or all if none are given) was last logged
+        so that `Disbursement.get_action_date` does not need a query per disbursement
+        """
+        from disbursement.models import Log
+
+        actions = actions or LogAction.values
+        return self.annotate(**{
+            self.action_date_field(action): Subquery(
+                Log.objects.filter(disbursement=OuterRef('pk'), action=action)
+                .order_by('-created').values('created')[:1]
+            )
+            for action in actions
+        })
+
+    @classmethod
+    def action_date_field(cls, action):
+        return '%s_logged_at' % LogAction(action).value
+
     def monitored_by(self, user):
         return self.filter(
             Q(recipient_profile__bank_transfer_details__recipient_bank_account__monitoring_users=user) |
@@ -0,0 +1,20 @@
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('disbursement', '0021_disbursement_normalised_postcode'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='disbursement',
+            index=models.Index(
+                fields=['normalised_postcode'], name='disbursement_postcode_pattern',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ),
+    ]
@@ -1,9 +1,12 @@
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from model_utils.models import TimeStampedModel
 from mtp_common.utils import format_currency
 
+from core.models import SavedValuesMixin
+from core.utils import normalise_postcode
 from disbursement import InvalidDisbursementStateException
 from disbursement.constants import DisbursementResolution, DisbursementMethod, LogAction
 from disbursement.managers import DisbursementManager, DisbursementQuerySet, LogManager
@@ -14,7 +17,7 @@ from disbursement.signals import (
 from prison.models import Prison
 
 
-class Disbursement(TimeStampedModel):
+class Disbursement(SavedValuesMixin, TimeStampedModel):
     amount = models.PositiveIntegerField(db_index=True)
     prisoner_number = models.CharField(max_length=250, db_index=True)
     prisoner_name = models.CharField(max_length=250)
@@ -37,6 +40,8 @@ class Disbursement(TimeStampedModel):
     address_line2 = models.CharField(max_length=250, blank=True, null=True)
     city = models.CharField(max_length=250, blank=True, null=True)
     postcode = models.CharField(max_length=250, blank=True, null=True)
+    # kept in step with postcode so that postcode searches can use an index
+    normalised_postcode = models.CharField(max_length=250, blank=True, null=True)
     country = models.CharField(max_length=250, blank=True, null=True)
 
     sort_code = models.CharField(max_length=50, blank=True, null=True)
@@ -68,6 +73,10 @@ class Disbursement(TimeStampedModel):
             models.Index(fields=['-amount', 'id']),
             models.Index(fields=['prisoner_number', 'id']),
             models.Index(fields=['-prisoner_number', 'id']),
+            models.Index(
+                fields=['normalised_postcode'], name='disbursement_postcode_pattern',
+                opclasses=['varchar_pattern_ops'],
+            ),
         ]
 
     @staticmethod
@@ -93,6 +102,13 @@ class Disbursement(TimeStampedModel):
     def resolution_permitted(self, new_resolution):
         return self.resolution == self.get_permitted_state(new_resolution)
 
+    def get_action_date(self, action):
+        # use the annotation from DisbursementQuerySet.with_action_dates if present
+        action_date_field = DisbursementQuerySet.action_date_field(action)
+        if hasattr(self, action_date_field):
+            return getattr(self, action_date_field)
+        return self.log_set.get_action_date(action)
+
     @property
     def recipient_name(self):
         return '{} {}'.format(self.recipient_first_name, self.recipient_last_name).strip()
@@ -205,6 +221,11 @@ class Comment(TimeStampedModel):
         )
 
 
+@receiver(pre_save, sender=Disbursement, dispatch_uid='update_normalised_postcode_for_disbursement')
+def update_normalised_postcode_for_disbursement(instance, **kwargs):
+    instance.normalised_postcode = normalise_postcode(instance.postcode)
+
+
 @receiver(disbursement_created)
 def disbursement_created_receiver(disbursement, by_user, **kwargs):
     Log.objects.disbursements_created([disbursement], by_user)
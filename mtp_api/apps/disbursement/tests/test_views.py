@@ -346,6 +346,49 @@ class ListDisbursementsTestCase(AuthTestCaseMixin, APITestCase):
                     self.assertLess(log.created.date(), minimum_created_date)
 
 
+class ListDisbursementsKeysetPaginationTestCase(AuthTestCaseMixin, APITestCase):
+    fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
+
+    def setUp(self):
+        super().setUp()
+        test_users = make_test_users()
+        self.user = test_users['prison_clerks'][0]
+        fake_disbursement(
+            _quantity=12,
+            prison=Prison.objects.get(pk='IXB'),
+            amount=itertools.cycle([1000, 2000, 3000]),
+            # companies have no first name so the ordered recipient name differs from the model property
+            recipient_first_name=itertools.cycle(['', 'Sam', 'Sam', 'Alex']),
+            recipient_last_name=itertools.cycle(['Smith', 'Jones', 'Brown']),
+        )
+
+    def api_request(self, url, **request_params):
+        response = self.client.get(
+            url, request_params, format='json',
+            HTTP_AUTHORIZATION=self.get_http_authorization_for_user(self.user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_keyset_pages_match_offset_list(self):
+        url = reverse('disbursement-list')
+        for ordering in ('', 'created', '-amount', 'recipient_name', '-recipient_name', 'resolution'):
+            with self.subTest(ordering=ordering):
+                data = self.api_request(url, ordering=ordering, limit=100)
+                expected_ids = [disbursement['id'] for disbursement in data['results']]
+                self.assertEqual(len(expected_ids), 12)
+
+                ids = []
+                data = self.api_request(url, ordering=ordering, cursor='', limit=5)
+                while True:
+                    self.assertNotIn('count', data)
+                    ids.extend(disbursement['id'] for disbursement in data['results'])
+                    if not data['next']:
+                        break
+                    data = self.api_request(data['next'])
+                self.assertListEqual(ids, expected_ids)
+
+
 class MonitoredDisbursementListTestCase(AuthTestCaseMixin, APITestCase):
     fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
 
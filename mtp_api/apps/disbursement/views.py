@@ -16,6 +16,7 @@ from core.filters import (
     SplitTextInMultipleFieldsFilter,
 )
 from core.models import TruncUtcDate
+from core.pagination import KeysetPagination
 from core.permissions import ActionsBasedViewPermissions
 from disbursement import InvalidDisbursementStateException
 from disbursement.constants import DisbursementResolution
@@ -85,7 +86,7 @@ class DisbursementFilter(BaseFilterSet):
     recipient_email = django_filters.CharFilter(field_name='recipient_email', lookup_expr='icontains')
 
     city = django_filters.CharFilter(field_name='city', lookup_expr='iexact')
-    postcode = PostcodeFilter(field_name='postcode')
+    postcode = PostcodeFilter(field_name='normalised_postcode')
 
     sort_code = django_filters.CharFilter(field_name='sort_code')
     account_number = django_filters.CharFilter(field_name='account_number')
@@ -128,6 +129,7 @@ class GetDisbursementsView(
     filter_backends = (DjangoFilterBackend, SafeOrderingFilter)
     ordering_fields = ('created', 'amount', 'resolution', 'method', 'recipient_name',
                        'prisoner_number', 'prisoner_name')
+    pagination_class = KeysetPagination
     permission_classes = (
         IsAuthenticated, ActionsBasedViewPermissions, get_client_permissions_class(
             CASHBOOK_OAUTH_CLIENT_ID, NOMS_OPS_OAUTH_CLIENT_ID,
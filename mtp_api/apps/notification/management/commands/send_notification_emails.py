@@ -1,10 +1,16 @@
+import collections
+import concurrent.futures
+import logging
+import textwrap
+
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 from django.utils import timezone
 from django.utils.dateformat import format as format_date
 from mtp_common.tasks import send_email
 
 from core.notify.templates import ApiNotifyTemplates
+from mtp_auth.models import Flag
 from notification.constants import EmailFrequency
 from notification.models import Event, EmailNotificationPreferences
 from notification.rules import ENABLED_RULE_CODES
@@ -13,12 +19,28 @@ from security.models import PrisonerProfile, BankAccount, DebitCardSenderDetails
 
 EMAILS_STARTED_FLAG = 'notifications-started'
 
+logger = logging.getLogger('mtp')
+
 
 class Command(BaseCommand):
+    """
+    Email a summary of yesterday's notifications to users who chose to receive them daily.
+    Events of all users are loaded and grouped at once; emails are sent a few at a time in parallel.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of emails to send at once')
+
     def handle(self, **options):
+        concurrency = options['concurrency']
+        if concurrency < 1:
+            raise CommandError('Concurrency must be positive')
+
         frequency = EmailFrequency.daily
         period_start, period_end = get_notification_period(frequency)
-        events = get_events(period_start, period_end)
 
         base_email_context = {
             'date': format_date(period_start, 'd/m/Y'),
@@ -31,17 +53,25 @@ class Command(BaseCommand):
         }
 
         today = timezone.localdate()
-        preferences = EmailNotificationPreferences.objects.filter(frequency=frequency).exclude(last_sent_at=today)
+        preferences = list(
+            EmailNotificationPreferences.objects.filter(frequency=frequency).exclude(last_sent_at=today)
+            .select_related('user')
+        )
+        users = [preference.user for preference in preferences]
+        event_groups = group_events_by_user(get_events(period_start, period_end).filter(user__in=users))
+        monitoring_user_ids = get_monitoring_user_ids(users)
+        emails_started_user_ids = set(
+            Flag.objects.filter(name=EMAILS_STARTED_FLAG, user__in=users).values_list('user_id', flat=True)
+        )
+
+        emails = []
         for preference in preferences:
             user = preference.user
-            event_group = summarise_group(group_events(events, user))
+            event_group = summarise_group(event_groups.get(user.pk) or make_event_group())
 
             has_notifications = event_group['transaction_count']
-            is_monitoring = any((
-                model.objects.filter(monitoring_users=user).exists()
-                for model in (PrisonerProfile, DebitCardSenderDetails, BankAccount)
-            ))
-            emails_started = user.flags.filter(name=EMAILS_STARTED_FLAG).exists()
+            is_monitoring = user.pk in monitoring_user_ids
+            emails_started = user.pk in emails_started_user_ids
 
             email_context = dict(
                 base_email_context,
@@ -50,22 +80,58 @@ class Command(BaseCommand):
                 name=user.get_full_name(),
                 count=event_group['transaction_count'],
             )
-            email_sent = False
+            template_name = None
             if emails_started and has_notifications:
-                send_email_with_events('api-intel-notification-daily', email_context)
-                email_sent = True
+                template_name = 'api-intel-notification-daily'
             elif not emails_started:
                 if has_notifications:
-                    send_email_with_events('api-intel-notification-first', email_context)
-                    user.flags.create(name=EMAILS_STARTED_FLAG)
-                    email_sent = True
+                    template_name = 'api-intel-notification-first'
                 elif not is_monitoring:
-                    send_email_with_events('api-intel-notification-not-monitoring', email_context)
-                    user.flags.create(name=EMAILS_STARTED_FLAG)
-                    email_sent = True
-            if email_sent:
-                preference.last_sent_at = today
-                preference.save()
+                    template_name = 'api-intel-notification-not-monitoring'
+            if template_name:
+                emails.append(PendingEmail(
+                    preference, template_name, email_context, starts_emails=not emails_started,
+                ))
+
+        sent_emails = send_emails(emails, concurrency, today)
+        if len(sent_emails) < len(emails):
+            raise CommandError('Could not send %d notification emails' % (len(emails) - len(sent_emails)))
+
+
+PendingEmail = collections.namedtuple('PendingEmail', 'preference template_name email_context starts_emails')
+
+
+def send_emails(emails, concurrency, today):
+    """
+    Sends emails with at most `concurrency` requests to GOV.UK Notify in flight, returning those that were sent;
+    each is recorded as soon as it is sent so that a later failure does not cause it to be sent again
+    """
+    sent_emails = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(send_email_with_events, email.template_name, email.email_context): email
+            for email in emails
+        }
+        for future in concurrent.futures.as_completed(futures):
+            email = futures[future]
+            try:
+                future.result()
+            except Exception:
+                logger.exception('Could not send notification email to %(username)s', {
+                    'username': email.preference.user.username,
+                })
+            else:
+                record_sent_email(email, today)
+                sent_emails.append(email)
+    return sent_emails
+
+
+def record_sent_email(email, today):
+    preference = email.preference
+    if email.starts_emails:
+        preference.user.flags.get_or_create(name=EMAILS_STARTED_FLAG)
+    preference.last_sent_at = today
+    preference.save(update_fields=['last_sent_at'])
 
 
 def get_events(period_start, period_end):
@@ -75,19 +141,45 @@ def get_events(period_start, period_end):
     )
 
 
+def get_monitoring_user_ids(users):
+    monitoring_user_ids = set()
+    for model in (PrisonerProfile, DebitCardSenderDetails, BankAccount):
+        monitoring_user_ids.update(
+            model.monitoring_users.through.objects.filter(user__in=users).values_list('user_id', flat=True)
+        )
+    return monitoring_user_ids
+
+
 def group_events(events, user):
-    senders = {}
-    prisoners = {}
-    for event in events.filter(user=user):
+    return group_events_by_user(events.filter(user=user)).get(user.pk) or make_event_group()
+
+
+def group_events_by_user(events):
+    """
+    Groups events by user and then by sender and prisoner profile,
+    loading all events with their relations and the profiles' sender names in a fixed number of queries
+    """
+    events = events.select_related(
+        'credit_event', 'disbursement_event',
+        'sender_profile_event__sender_profile', 'prisoner_profile_event__prisoner_profile',
+    ).prefetch_related(
+        'sender_profile_event__sender_profile__bank_transfer_details',
+        'sender_profile_event__sender_profile__debit_card_details__cardholder_names',
+    )
+    event_groups = collections.defaultdict(make_event_group)
+    sender_descriptions = {}
+    for event in events:
+        event_group = event_groups[event.user_id]
+        senders = event_group['senders']
+        prisoners = event_group['prisoners']
         if hasattr(event, 'sender_profile_event'):
             profile = event.sender_profile_event.sender_profile
             if profile.id in senders:
                 details = senders[profile.id]
             else:
-                details = make_date_group_profile(
-                    profile.id,
-                    profile.get_sorted_sender_names()[0]
-                )
+                if profile.id not in sender_descriptions:
+                    sender_descriptions[profile.id] = profile.get_sorted_sender_names()[0]
+                details = make_date_group_profile(profile.id, sender_descriptions[profile.id])
                 senders[profile.id] = details
             if hasattr(event, 'credit_event'):
                 details['credit_ids'].add(event.credit_event.credit_id)
@@ -109,9 +201,13 @@ def group_events(events, user):
             if hasattr(event, 'disbursement_event'):
                 details['disbursement_ids'].add(event.disbursement_event.disbursement_id)
 
+    return dict(event_groups)
+
+
+def make_event_group():
     return {
-        'senders': senders,
-        'prisoners': prisoners,
+        'senders': {},
+        'prisoners': {},
     }
 
 
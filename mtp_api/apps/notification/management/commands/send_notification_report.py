@@ -1,7 +1,10 @@
 import datetime
+import itertools
 import logging
 import pathlib
+import resource
 import tempfile
+import time
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -100,60 +103,103 @@ def report_period(period_start, period_end):
     return period_start, period_end
 
 
-def generate_report(workbook, period_start, period_end, rules):
-    candidate_credits = Credit.objects.filter(
+def generate_report(workbook, period_start, period_end, rules, batch_size=1000):
+    """
+    Writes a sheet for each rule and type of record it applies to, streaming the period's records once
+    and evaluating all rules for each batch of them in memory
+    """
+    start_time = time.perf_counter()
+    candidate_credits = Credit.objects.with_action_dates(CreditLogAction.credited).filter(
         prisoner_profile__isnull=False,
         sender_profile__isnull=False,
     ).filter(
         received_at__gte=period_start,
         received_at__lt=period_end,
+    ).select_related(
+        'prison', 'transaction', 'payment__billing_address', 'sender_profile', 'prisoner_profile',
     ).order_by('pk')
-    candidate_disbursements = Disbursement.objects.filter(
+    candidate_disbursements = Disbursement.objects.with_action_dates(
+        DisbursementLogAction.confirmed, DisbursementLogAction.sent,
+    ).filter(
         prisoner_profile__isnull=False,
         recipient_profile__isnull=False,
         resolution=DisbursementResolution.sent,
     ).filter(
         created__gte=period_start,
         created__lt=period_end,
+    ).select_related(
+        'prison', 'recipient_profile', 'prisoner_profile',
     ).order_by('pk')
     records = {
         Credit: candidate_credits,
         Disbursement: candidate_disbursements,
     }
 
+    # sheets are created in rule order but filled in as records are read
+    sheets = []
     for rule in rules:
         for serialised_model, serialiser_cls in Serialiser.serialisers.items():
             if serialised_model not in rule.applies_to_models:
                 continue
-            serialiser = serialiser_cls(rule)
             worksheet = workbook.create_sheet(
                 title=f'{serialised_model._meta.verbose_name[:4]}-{rule.abbr_description}'
             )
-            generate_sheet(worksheet, serialiser, rule, records[serialised_model])
-
+            sheets.append((serialised_model, ReportSheet(worksheet, serialiser_cls(rule))))
 
-def generate_sheet(worksheet, serialiser, rule, record_set):
-    headers = serialiser.get_headers()
-    worksheet.append(headers)
-    count = 0
-    for record in record_set:
-        if not rule.applies_to(record):
-            continue
-        triggered = rule.triggered(record)
-        if not triggered:
+    record_count = 0
+    for serialised_model, record_set in records.items():
+        model_sheets = [sheet for model, sheet in sheets if model is serialised_model]
+        if not model_sheets:
             continue
-        row = serialiser.serialise(worksheet, record, triggered)
-        worksheet.append([
-            row.get(field, None)
-            for field in headers
-        ])
-        count += 1
-    if count:
-        worksheet.auto_filter.ref = f'A1:{get_column_letter(len(headers))}{count + 1}'
-    else:
-        note = WriteOnlyCell(worksheet, 'No notifications')
-        note.style = 'Good'
-        worksheet.append([serialiser.rule_description, note])
+        record_iterator = record_set.iterator(chunk_size=batch_size)
+        while True:
+            batch = list(itertools.islice(record_iterator, batch_size))
+            if not batch:
+                break
+            for sheet in model_sheets:
+                sheet.append_triggered(batch)
+            record_count += len(batch)
+    for _, sheet in sheets:
+        sheet.close()
+
+    logger.info(
+        'Generated notification report from %(record_count)d records in %(seconds).1fs '
+        'using at most %(peak_memory)d KiB',
+        {
+            'record_count': record_count,
+            'seconds': time.perf_counter() - start_time,
+            'peak_memory': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+    )
+
+
+class ReportSheet:
+    def __init__(self, worksheet, serialiser):
+        self.worksheet = worksheet
+        self.serialiser = serialiser
+        self.rule = serialiser.rule
+        self.headers = serialiser.get_headers()
+        self.count = 0
+        worksheet.append(self.headers)
+
+    def append_triggered(self, records):
+        for record, triggered in zip(records, self.rule.triggered_for_records(records)):
+            if not triggered:
+                continue
+            row = self.serialiser.serialise(self.worksheet, record, triggered)
+            self.worksheet.append([
+                row.get(field, None)
+                for field in self.headers
+            ])
+            self.count += 1
+
+    def close(self):
+        if self.count:
+            self.worksheet.auto_filter.ref = f'A1:{get_column_letter(len(self.headers))}{self.count + 1}'
+        else:
+            note = WriteOnlyCell(self.worksheet, 'No notifications')
+            note.style = 'Good'
+            self.worksheet.append([self.serialiser.rule_description, note])
 
 
 def send_report(period_description, report_path, emails):
@@ -243,7 +289,7 @@ class CreditSerialiser(Serialiser, serialised_model=Credit):
             status = 'Anonymous'
         row.update({
             'Date received': local_datetime_for_xlsx(record.received_at),
-            'Date credited': local_datetime_for_xlsx(record.log_set.get_action_date(CreditLogAction.credited)),
+            'Date credited': local_datetime_for_xlsx(record.get_action_date(CreditLogAction.credited)),
             'Amount': format_currency(record.amount),
             'Prisoner number': record.prisoner_number or 'Unknown',
             'Prisoner name': record.prisoner_name or 'Unknown',
@@ -310,8 +356,8 @@ class DisbursementSerialiser(Serialiser, serialised_model=Disbursement):
         row = super().serialise(worksheet, record, triggered)
         row.update({
             'Date entered': local_datetime_for_xlsx(record.created),
-            'Date confirmed': local_datetime_for_xlsx(record.log_set.get_action_date(DisbursementLogAction.confirmed)),
-            'Date sent': local_datetime_for_xlsx(record.log_set.get_action_date(DisbursementLogAction.sent)),
+            'Date confirmed': local_datetime_for_xlsx(record.get_action_date(DisbursementLogAction.confirmed)),
+            'Date sent': local_datetime_for_xlsx(record.get_action_date(DisbursementLogAction.sent)),
             'Amount': format_currency(record.amount),
             'Prisoner number': record.prisoner_number,
             'Prisoner name': record.prisoner_name,
@@ -0,0 +1,17 @@
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('notification', '0002_auto_20201007_1448'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['user', '-triggered_at'], name='notificatio_user_id_fb30f2_idx'),
+        ),
+    ]
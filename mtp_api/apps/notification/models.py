@@ -39,6 +39,8 @@ class Event(models.Model):
         indexes = [
             models.Index(fields=['-triggered_at', 'id']),
             models.Index(fields=['rule']),
+            # for finding the dates of a user's events, newest first
+            models.Index(fields=['user', '-triggered_at']),
         ]
 
 
@@ -1,4 +1,4 @@
-import datetime
+import collections
 import unicodedata
 
 from django.db.transaction import atomic
@@ -13,7 +13,10 @@ from notification.models import (
     Event, CreditEvent, DisbursementEvent,
     SenderProfileEvent, RecipientProfileEvent, PrisonerProfileEvent,
 )
-from security.models import SenderProfile, RecipientProfile, PrisonerProfile, MonitoredPartialEmailAddress
+from security.models import (
+    SenderProfile, RecipientProfile, PrisonerProfile, MonitoredPartialEmailAddress,
+    DailyCreditProfileCount, DailyDisbursementProfileCount,
+)
 
 ENABLED_RULE_CODES = {'MONP', 'MONS'}
 
@@ -32,8 +35,27 @@ class Triggered:
         return self.triggered
 
 
+def save_events(built_events):
+    """
+    Saves events built by rules with their relations using one insert per model
+    """
+    events = Event.objects.bulk_create(event for event, _ in built_events)
+    event_relations = collections.defaultdict(list)
+    for _, relations in built_events:
+        for relation in relations:
+            event_relations[type(relation)].append(relation)
+    for model, relations in event_relations.items():
+        model.objects.bulk_create(relations)
+    return events
+
+
 class BaseRule:
     applies_to_models = (Credit, Disbursement)
+    profile_event_models = {
+        'sender_profile': SenderProfileEvent,
+        'recipient_profile': RecipientProfileEvent,
+        'prisoner_profile': PrisonerProfileEvent,
+    }
 
     def __init__(self, code, description, abbr_description, applies_to_models=None, **kwargs):
         self.code = code
@@ -49,42 +71,63 @@ class BaseRule:
     def triggered(self, record) -> Triggered:
         raise NotImplementedError
 
+    def triggered_for_records(self, records) -> list:
+        """
+        Whether each of the records triggers this rule, records that the rule does not apply to never doing so;
+        rules can override this to look up what they need for all records at once
+        """
+        return [
+            self.triggered(record) if self.applies_to(record) else Triggered(False)
+            for record in records
+        ]
+
     def get_event_trigger(self, record):
         return record
 
-    def _create_event(self, record, user=None):
+    def get_event_user_ids_for_records(self, records) -> list:
+        """
+        Ids of users to create events for for each triggering record, None making an event visible to all users
+        """
+        return [[None] for _ in records]
+
+    def build_events_for_records(self, records) -> list:
+        """
+        Unsaved events with their relations for each of the records, empty for records that do not trigger this rule
+        """
+        triggers = self.triggered_for_records(records)
+        triggering_records = [record for record, triggered in zip(records, triggers) if triggered]
+        user_ids = iter(self.get_event_user_ids_for_records(triggering_records))
+        return [
+            [self._build_event(record, user_id=user_id) for user_id in next(user_ids)] if triggered else []
+            for record, triggered in zip(records, triggers)
+        ]
+
+    def _build_event(self, record, user_id=None):
         event_relations = []
-        event = Event(rule=self.code, description=self.description, user=user)
+        event = Event(rule=self.code, description=self.description, user_id=user_id)
         if isinstance(record, Credit):
             event.triggered_at = record.received_at
-            event.save()
             event_relations.append(CreditEvent(event=event, credit=record))
         elif isinstance(record, Disbursement):
             event.triggered_at = record.created
-            event.save()
             event_relations.append(DisbursementEvent(event=event, disbursement=record))
         else:
-            return
-
-        trigger = self.get_event_trigger(record)
-        if trigger and trigger != record:
-            if isinstance(trigger, SenderProfile):
-                event_relations.append(
-                    SenderProfileEvent(event=event, sender_profile=trigger)
-                )
-            elif isinstance(trigger, RecipientProfile):
-                event_relations.append(
-                    RecipientProfileEvent(event=event, recipient_profile=trigger)
-                )
-            elif isinstance(trigger, PrisonerProfile):
-                event_relations.append(
-                    PrisonerProfileEvent(event=event, prisoner_profile=trigger)
-                )
-
-        for event_relation in event_relations:
-            event_relation.save()
-
-        return event
+            return None
+
+        # rules triggered by a related profile link events to it by id to avoid loading profiles
+        profile_field = self.kwargs.get('profile')
+        profile_id = profile_field and getattr(record, f'{profile_field}_id')
+        if profile_id:
+            event_relations.append(
+                self.profile_event_models[profile_field](event=event, **{f'{profile_field}_id': profile_id})
+            )
+
+        return event, event_relations
+
+    def _create_event(self, record, user=None):
+        built_event = self._build_event(record, user_id=user and user.pk)
+        if built_event:
+            return save_events([built_event])[0]
 
     @atomic
     def create_events(self, record):
@@ -135,6 +178,12 @@ class ContainsSymbols(BaseRule):
 
 
 class MonitoredRule(BaseRule):
+    profile_models = {
+        'sender_profile': SenderProfile,
+        'recipient_profile': RecipientProfile,
+        'prisoner_profile': PrisonerProfile,
+    }
+
     def __init__(self, *args, user_filters=None, **kwargs):
         kwargs['user_filters'] = user_filters or {}
         super().__init__(*args, **kwargs)
@@ -156,6 +205,31 @@ class MonitoredRule(BaseRule):
             return Triggered(monitoring_user_count, monitoring_user_count=monitoring_user_count)
         return Triggered(False, monitoring_user_count=0)
 
+    def triggered_for_records(self, records) -> list:
+        return [
+            Triggered(len(user_ids), monitoring_user_count=len(user_ids))
+            for user_ids in self.get_monitoring_user_ids_for_records(records)
+        ]
+
+    def build_events_for_records(self, records) -> list:
+        # monitoring users both decide whether records trigger the rule and who to create events for
+        return [
+            [self._build_event(record, user_id=user_id) for user_id in user_ids]
+            for record, user_ids in zip(records, self.get_monitoring_user_ids_for_records(records))
+        ]
+
+    def get_monitoring_user_ids_for_records(self, records) -> list:
+        profile_id_field = f'{self.kwargs["profile"]}_id'
+        profile_ids = [
+            getattr(record, profile_id_field) if self.applies_to(record) else None
+            for record in records
+        ]
+        profile_model = self.profile_models[self.kwargs['profile']]
+        monitoring_user_ids = profile_model.objects.get_monitoring_user_ids(
+            set(filter(None, profile_ids)), **self.kwargs['user_filters']
+        )
+        return [monitoring_user_ids.get(profile_id, []) for profile_id in profile_ids]
+
     def get_event_trigger(self, record):
         return getattr(record, self.kwargs['profile'])
 
@@ -201,30 +275,42 @@ class CountingRule(BaseRule):
         if not profile or profile == self.shared_profile:
             return Triggered(False)
 
-        records_of_same_type = self.get_profile_records_of_same_type(profile, record)
-        field_to_count = self.kwargs['count']
-        count = records_of_same_type.values(field_to_count).distinct().count()
+        daily_counts, last_date = self.get_daily_counts_of_same_type(record)
+        count = daily_counts.count_in_window(
+            self.kwargs['profile'], profile.pk, self.kwargs['count'], last_date, self.kwargs['days'],
+        )
         return Triggered(count > self.kwargs['limit'], count=count)
 
+    def triggered_for_records(self, records) -> list:
+        profile_id_field = f'{self.kwargs["profile"]}_id'
+        shared_profile_id = self.shared_profile and self.shared_profile.pk
+        windows_by_daily_counts = collections.defaultdict(list)
+        for index, record in enumerate(records):
+            profile_id = getattr(record, profile_id_field) if self.applies_to(record) else None
+            if profile_id and profile_id != shared_profile_id:
+                daily_counts, last_date = self.get_daily_counts_of_same_type(record)
+                windows_by_daily_counts[daily_counts].append((index, profile_id, last_date))
+
+        triggers = [Triggered(False) for _ in records]
+        for daily_counts, windows in windows_by_daily_counts.items():
+            counts = daily_counts.count_in_windows(
+                self.kwargs['profile'], self.kwargs['count'],
+                [(profile_id, last_date) for _, profile_id, last_date in windows], self.kwargs['days'],
+            )
+            for (index, _, _), count in zip(windows, counts):
+                triggers[index] = Triggered(count > self.kwargs['limit'], count=count)
+        return triggers
+
     def get_event_trigger(self, record):
         return getattr(record, self.kwargs['profile'])
 
-    def get_profile_records_of_same_type(self, profile, record):
-        if isinstance(record, Credit):
-            period_end = record.received_at
-        elif isinstance(record, Disbursement):
-            period_end = record.created
-        else:
-            raise ValueError('unknown record')
-        # make 4 week period include whole days at the boundaries in local time
-        period_end = timezone.localtime(period_end) + datetime.timedelta(days=1)
-        period_end = period_end.replace(hour=0, minute=0, second=0, microsecond=0)
-        period_start = period_end - datetime.timedelta(days=self.kwargs['days'])
-
+    def get_daily_counts_of_same_type(self, record):
+        # records are counted in buckets by local date so the period includes whole days at the boundaries
         if isinstance(record, Credit):
-            return profile.credits.filter(received_at__gte=period_start, received_at__lt=period_end)
+            return DailyCreditProfileCount.objects, timezone.localdate(record.received_at)
         if isinstance(record, Disbursement):
-            return profile.disbursements.filter(created__gte=period_start, created__lt=period_end)
+            return DailyDisbursementProfileCount.objects, timezone.localdate(record.created)
+        raise ValueError('unknown record')
 
 
 RULES = {
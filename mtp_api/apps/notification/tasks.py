@@ -1,12 +1,23 @@
+import itertools
+
+from django.db.transaction import atomic
 from mtp_common.spooling import spoolable
 
-from notification.rules import ENABLED_RULE_CODES, RULES
+from notification.rules import ENABLED_RULE_CODES, RULES, save_events
 
 
 @spoolable(body_params=['records'])
 def create_notification_events(records):
-    for record in records:
-        for code in ENABLED_RULE_CODES:
-            rule = RULES[code]
-            if rule.applies_to(record) and rule.triggered(record):
-                rule.create_events(record)
+    records = list(records)
+    # rules are evaluated for all records at once so that they can look up what they need in bulk
+    # and all events are then saved with one insert per model
+    events_by_rule = [
+        RULES[code].build_events_for_records(records)
+        for code in ENABLED_RULE_CODES
+    ]
+    with atomic():
+        save_events([
+            built_event
+            for record_events in zip(*events_by_rule)
+            for built_event in itertools.chain.from_iterable(record_events)
+        ])
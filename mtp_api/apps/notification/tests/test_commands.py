@@ -1,11 +1,15 @@
 import datetime
 import io
+import threading
 from unittest import mock
 
 from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from model_bakery import baker
+from mtp_common.test_utils import silence_logger
 import openpyxl
 from openpyxl.utils import coordinate_to_tuple
 
@@ -15,10 +19,12 @@ from credit.models import Credit
 from disbursement.models import Disbursement
 from disbursement.tests.utils import generate_disbursements
 from notification.constants import EmailFrequency
+from notification.management.commands import send_notification_emails
 from notification.management.commands.send_notification_emails import (
     EMAILS_STARTED_FLAG,
     get_events, group_events, summarise_group,
 )
+from notification.management.commands.send_notification_report import generate_report
 from notification.models import Event, EmailNotificationPreferences
 from notification.rules import RULES
 from notification.tests.utils import make_sender, make_prisoner, make_csfreq_credits
@@ -128,6 +134,73 @@ class SendNotificationEmailsTestCase(NotificationBaseTestCase):
         self.assertEqual(send_email_kwargs['personalisation']['count'], transaction_count)
         self.assertIsNotNone(EmailNotificationPreferences.objects.get(user=user).last_sent_at)
 
+    def test_loads_events_for_many_users_in_fixed_number_of_queries(self, mock_send_email):
+        users = self.security_staff
+        self.assertGreater(len(users), 1)
+        for user in users:
+            EmailNotificationPreferences(user=user, frequency=EmailFrequency.daily).save()
+        self.create_profiles_but_unlink_objects()
+        for profile in PrisonerProfile.objects.all():
+            profile.monitoring_users.add(*users)
+        for profile in DebitCardSenderDetails.objects.all():
+            profile.monitoring_users.add(*users)
+        call_command('update_security_profiles')
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('send_notification_emails', concurrency=2)
+        # each sent email is recorded separately as soon as it is sent
+        self.assertLessEqual(len(queries), 10 + 5 * len(users))
+
+        self.assertEqual(len(mock_send_email.call_args_list), len(users))
+        self.assertSetEqual(
+            {call.kwargs['to'] for call in mock_send_email.call_args_list},
+            {user.email for user in users},
+        )
+        for call in mock_send_email.call_args_list:
+            self.assertEqual(call.kwargs['template_name'], 'api-intel-notification-first')
+        for user in users:
+            self.assertTrue(user.flags.filter(name=EMAILS_STARTED_FLAG).exists())
+            self.assertIsNotNone(EmailNotificationPreferences.objects.get(user=user).last_sent_at)
+
+    def test_records_emails_sent_when_others_fail(self, mock_send_email):
+        failing_user, user = self.security_staff[:2]
+        for preference_user in (failing_user, user):
+            EmailNotificationPreferences(user=preference_user, frequency=EmailFrequency.daily).save()
+
+        def send_email(to, **kwargs):
+            if to == failing_user.email:
+                raise ConnectionError('Notify unavailable')
+
+        mock_send_email.side_effect = send_email
+        with silence_logger(), self.assertRaises(CommandError):
+            call_command('send_notification_emails')
+
+        self.assertEqual(len(mock_send_email.call_args_list), 2)
+        self.assertFalse(failing_user.flags.filter(name=EMAILS_STARTED_FLAG).exists())
+        self.assertIsNone(EmailNotificationPreferences.objects.get(user=failing_user).last_sent_at)
+        self.assertTrue(user.flags.filter(name=EMAILS_STARTED_FLAG).exists())
+        self.assertIsNotNone(EmailNotificationPreferences.objects.get(user=user).last_sent_at)
+
+    def test_records_each_sent_email_in_main_thread(self, mock_send_email):
+        users = self.security_staff[:2]
+        for user in users:
+            EmailNotificationPreferences(user=user, frequency=EmailFrequency.daily).save()
+
+        recorded_in_threads = []
+
+        def record_sent_email(email, today):
+            recorded_in_threads.append(threading.current_thread())
+            return original_record_sent_email(email, today)
+
+        original_record_sent_email = send_notification_emails.record_sent_email
+        with mock.patch.object(send_notification_emails, 'record_sent_email', side_effect=record_sent_email):
+            call_command('send_notification_emails', concurrency=2)
+
+        self.assertListEqual(recorded_in_threads, [threading.main_thread()] * len(users))
+        for user in users:
+            self.assertTrue(user.flags.filter(name=EMAILS_STARTED_FLAG).exists())
+            self.assertIsNotNone(EmailNotificationPreferences.objects.get(user=user).last_sent_at)
+
     def test_profile_grouping(self, mock_send_email):
         user = self.security_staff[0]
         call_command('update_security_profiles')
@@ -384,6 +457,22 @@ class SendNotificationReportTestCase(NotificationBaseTestCase):
                 else:
                     self.assertEqual(monitored_by, 1, FLAKY_TEST_WARNING)
 
+    def test_report_evaluates_rules_without_queries_per_record(self, mock_send_email):
+        security_staff = self.make_2days_of_random_models()
+        call_command('update_security_profiles')
+        for profile in PrisonerProfile.objects.all():
+            profile.monitoring_users.add(security_staff[0])
+
+        period_start = timezone.make_aware(datetime.datetime.combine(
+            Credit.objects.order_by('received_at').first().received_at.date(), datetime.time.min,
+        ))
+        period_end = period_start + datetime.timedelta(days=7)
+        with CaptureQueriesContext(connection) as queries:
+            generate_report(openpyxl.Workbook(write_only=True), period_start, period_end, RULES.values())
+        # reading each type of record and at most a few queries for each rule evaluated per batch
+        self.assertLessEqual(len(queries), 2 + 4 * 2 * len(RULES))
+        mock_send_email.assert_not_called()
+
     def test_reports_generated_for_counting_rules(self, mock_send_email):
         # make just enough credits to trigger CSFREQ rule with latest credit
         rule = RULES['CSFREQ']
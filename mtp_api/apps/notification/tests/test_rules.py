@@ -3,7 +3,9 @@ import random
 
 from django.contrib.auth.models import Group
 from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from core.tests.utils import make_test_users
@@ -13,7 +15,7 @@ from disbursement.tests.utils import generate_disbursements
 from notification.models import (
     SenderProfileEvent, RecipientProfileEvent, PrisonerProfileEvent
 )
-from notification.rules import Event, RULES
+from notification.rules import Event, RULES, Triggered, save_events
 from notification.tests.utils import (
     make_sender, make_recipient, make_prisoner,
     make_csfreq_credits, make_drfreq_disbursements,
@@ -317,6 +319,77 @@ class RuleTestCase(TestCase):
         self.assertEqual(Event.objects.count(), prisoner_profile.credits.count())
 
 
+    def test_monitored_rules_for_records_match_individual_evaluation(self):
+        call_command('update_security_profiles')
+
+        fiu_group = Group.objects.get(name='FIU')
+        self.user.groups.add(fiu_group)
+        other_user = Group.objects.get(name='Security').user_set.exclude(pk=self.user.pk).first()
+        debit_card_sender_profile = SenderProfile.objects.filter(debit_card_details__isnull=False).first()
+        debit_card_sender_profile.debit_card_details.first().monitoring_users.add(self.user, other_user)
+        bank_transfer_sender_profile = SenderProfile.objects.filter(bank_transfer_details__isnull=False).first()
+        bank_transfer_sender_profile.bank_transfer_details.first().sender_bank_account.monitoring_users.add(
+            other_user
+        )
+        recipient_profile = RecipientProfile.objects.filter(bank_transfer_details__isnull=False).first()
+        recipient_profile.bank_transfer_details.first().recipient_bank_account.monitoring_users.add(self.user)
+        PrisonerProfile.objects.filter(credits__isnull=False).first().monitoring_users.add(self.user)
+        PrisonerProfile.objects.filter(disbursements__isnull=False).last().monitoring_users.add(other_user)
+
+        records = list(Credit.objects.all()) + list(Disbursement.objects.all())
+        for code in ('MONP', 'MONS', 'MONR', 'FIUMONP', 'FIUMONS', 'FIUMONR'):
+            rule = RULES[code]
+            with CaptureQueriesContext(connection) as queries:
+                triggers = rule.triggered_for_records(records)
+            self.assertLessEqual(len(queries), 4)
+            self.assertTrue(any(triggers), msg=code)
+            for record, triggered in zip(records, triggers):
+                if rule.applies_to(record):
+                    expected = rule.triggered(record)
+                    self.assertEqual(bool(triggered), bool(expected), msg=code)
+                    self.assertEqual(
+                        triggered.kwargs['monitoring_user_count'], expected.kwargs['monitoring_user_count'], msg=code,
+                    )
+                else:
+                    self.assertFalse(triggered, msg=code)
+
+    def test_events_built_for_records_match_individually_created_events(self):
+        call_command('update_security_profiles')
+
+        PrisonerProfile.objects.filter(credits__isnull=False).first().monitoring_users.add(self.user)
+        sender_profile = SenderProfile.objects.filter(debit_card_details__isnull=False).first()
+        sender_profile.debit_card_details.first().monitoring_users.add(self.user)
+
+        def get_events():
+            return sorted(
+                Event.objects.values_list(
+                    'rule', 'user', 'triggered_at', 'credit_event__credit', 'disbursement_event__disbursement',
+                    'sender_profile_event__sender_profile', 'prisoner_profile_event__prisoner_profile',
+                ),
+                key=str,
+            )
+
+        records = list(Credit.objects.all()) + list(Disbursement.objects.all())
+        for code in ('MONP', 'MONS', 'NWN', 'HA'):
+            rule = RULES[code]
+            with CaptureQueriesContext(connection) as queries:
+                save_events([
+                    built_event
+                    for record_events in rule.build_events_for_records(records)
+                    for built_event in record_events
+                ])
+            self.assertLessEqual(len(queries), 7)
+            built_events = get_events()
+            self.assertTrue(built_events, msg=code)
+            Event.objects.all().delete()
+
+            for record in records:
+                if rule.applies_to(record) and rule.triggered(record):
+                    rule.create_events(record)
+            self.assertListEqual(built_events, get_events(), msg=code)
+            Event.objects.all().delete()
+
+
 class CountingRuleTestCase(TestCase):
     fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
 
@@ -556,6 +629,24 @@ class CountingRuleTestCase(TestCase):
         latest_disbursement = disbursement_list[0]
         self.assertFalse(rule.triggered(latest_disbursement))
 
+    def test_counting_rules_for_records_match_individual_evaluation(self):
+        records = (
+            make_csfreq_credits(self.today, make_sender(), RULES['CSFREQ'].kwargs['limit'] + 1) +
+            make_csnum_credits(self.today, make_prisoner(), RULES['CSNUM'].kwargs['limit'] + 1) +
+            make_cpnum_credits(self.today, self.anonymous_sender, RULES['CPNUM'].kwargs['limit'] + 1) +
+            make_drfreq_disbursements(self.today, make_recipient(), RULES['DRFREQ'].kwargs['limit'] + 1) +
+            make_dpnum_disbursements(self.today, make_recipient(), RULES['DPNUM'].kwargs['limit'] + 1)
+        )
+        for code in ('CSFREQ', 'DRFREQ', 'CSNUM', 'DRNUM', 'CPNUM', 'DPNUM'):
+            rule = RULES[code]
+            with CaptureQueriesContext(connection) as queries:
+                triggers = rule.triggered_for_records(records)
+            self.assertLessEqual(len(queries), 3)
+            for record, triggered in zip(records, triggers):
+                expected = rule.triggered(record) if rule.applies_to(record) else Triggered(False)
+                self.assertEqual(bool(triggered), bool(expected), msg=code)
+                self.assertEqual(triggered.kwargs.get('count'), expected.kwargs.get('count'), msg=code)
+
 
 class ContainsSymbolsTestCase(TestCase):
     fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
@@ -1,6 +1,8 @@
 import itertools
 from datetime import timedelta
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from faker import Faker
@@ -145,6 +147,25 @@ class ListEventPagesTestCase(AuthTestCaseMixin, APITestCase):
             'oldest': yesterday - timedelta(days=29),
         })
 
+    def test_page_list_read_with_one_query(self):
+        """
+        Page boundaries and the number of dates come from one query, even past the last page
+        """
+        yesterday = timezone.now() - timedelta(days=1)
+        for days in range(0, 30):
+            baker.make(Event, user=self.user, triggered_at=yesterday - timedelta(days=days))
+        yesterday = yesterday.date()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertApiResponse({'limit': 10, 'offset': 10}, {
+                'count': 30,
+                'newest': yesterday - timedelta(days=10),
+                'oldest': yesterday - timedelta(days=19),
+            })
+        self.assertEqual(len([query for query in queries if 'notification_event' in query['sql']]), 1)
+
+        self.assertApiResponse({'limit': 10, 'offset': 30}, {'count': 30, 'newest': None, 'oldest': None})
+
     def test_filtered_long_date_page_list(self):
         """
         Events over a larger range of dates than requested, get the appropriate page filtered by rule
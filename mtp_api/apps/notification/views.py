@@ -1,4 +1,4 @@
-from django.db.models import Q
+from django.db.models import Count, Q, Window
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, views, viewsets
 from rest_framework.permissions import IsAuthenticated
@@ -31,14 +31,23 @@ class EventPagesView(views.APIView):
         offset = int(request.query_params.get('offset', 0))
         limit = int(request.query_params.get('limit', 25))
 
-        queryset = Event.objects \
-            .annotate(triggered_at_date=TruncLocalDate('triggered_at')) \
+        event_dates = Event.objects \
             .filter(filters) \
-            .values('triggered_at_date') \
-            .order_by('-triggered_at_date') \
-            .distinct()
-        count = queryset.count()
-        results = list(queryset[offset:offset + limit])
+            .annotate(triggered_at_date=TruncLocalDate('triggered_at')) \
+            .values('triggered_at_date')
+        # grouping by date makes the window count dates before the page is sliced off, all in one query
+        results = list(
+            event_dates
+            .annotate(event_count=Count('*'), date_count=Window(Count('*')))
+            .order_by('-triggered_at_date')[offset:offset + limit]
+        )
+        if results:
+            count = results[0]['date_count']
+        elif offset:
+            # past the last page so there was no row to carry the count
+            count = event_dates.distinct().count()
+        else:
+            count = 0
         return Response({
             'newest': results[0]['triggered_at_date'] if results else None,
             'oldest': results[-1]['triggered_at_date'] if results else None,
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('payment', '0020_auto_20201007_1448'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='billingaddress',
+            name='normalised_postcode',
+            field=models.CharField(blank=True, max_length=250, null=True),
+        ),
+        # mirrors core.utils.normalise_postcode; subsequent changes are kept in step by the application
+        migrations.RunSQL(
+            r"""
+            UPDATE payment_billingaddress SET
+                normalised_postcode = UPPER(REGEXP_REPLACE(postcode, '[\s-]+', '', 'g'))
+            WHERE postcode IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
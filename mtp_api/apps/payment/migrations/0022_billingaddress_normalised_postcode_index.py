@@ -0,0 +1,20 @@
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('payment', '0021_billingaddress_normalised_postcode'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='billingaddress',
+            index=models.Index(
+                fields=['normalised_postcode'], name='billingaddress_postcode_pattern',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ),
+    ]
@@ -1,4 +1,3 @@
-import re
 import uuid
 
 from django.db import models
@@ -8,6 +7,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from model_utils.models import TimeStampedModel
 
+from core.utils import normalise_postcode
 from credit.constants import CreditResolution
 from credit.models import Credit
 from credit.signals import credit_failed
@@ -42,14 +42,20 @@ class BillingAddress(models.Model):
     city = models.CharField(max_length=250, blank=True, null=True)
     country = models.CharField(max_length=250, blank=True, null=True)
     postcode = models.CharField(max_length=250, blank=True, null=True)
+    # kept in step with postcode so that postcode searches can use an index
+    normalised_postcode = models.CharField(max_length=250, blank=True, null=True)
     debit_card_sender_details = models.ForeignKey(
         'security.DebitCardSenderDetails', related_name='billing_addresses',
         blank=True, null=True, on_delete=models.SET_NULL
     )
 
-    @property
-    def normalised_postcode(self):
-        return re.sub(r'[\s-]+', '', self.postcode).upper() if self.postcode else self.postcode
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['normalised_postcode'], name='billingaddress_postcode_pattern',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return ', '.join(filter(None, (self.line1, self.line2, self.city, self.postcode, self.country)))
@@ -120,6 +126,11 @@ class Payment(TimeStampedModel):
         return self.credit.received_at
 
 
+@receiver(pre_save, sender=BillingAddress, dispatch_uid='update_normalised_postcode_for_billing_address')
+def update_normalised_postcode_for_billing_address(instance, **kwargs):
+    instance.normalised_postcode = normalise_postcode(instance.postcode)
+
+
 @receiver(pre_save, sender=Payment, dispatch_uid='update_credit_for_payment')
 def update_credit_for_payment(instance, **kwargs):
     if (
@@ -1,6 +1,7 @@
 from django.db.transaction import atomic
 from rest_framework import serializers
 
+from core.utils import normalise_postcode
 from credit.constants import CreditResolution
 from credit.models import Credit
 from payment.models import Batch, BillingAddress, Payment
@@ -93,6 +94,9 @@ class PaymentSerializer(serializers.ModelSerializer):
         billing_address = validated_data.pop('billing_address', None)
         if billing_address:
             if instance.billing_address:
+                if 'postcode' in billing_address:
+                    # a queryset update does not send pre_save so the normalised postcode is set here
+                    billing_address['normalised_postcode'] = normalise_postcode(billing_address['postcode'])
                 BillingAddress.objects.filter(
                     pk=instance.billing_address.pk
                 ).update(**billing_address)
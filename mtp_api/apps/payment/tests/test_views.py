@@ -375,6 +375,7 @@ class UpdatePaymentViewTestCase(AuthTestCaseMixin, APITestCase):
         self.assertIsNotNone(payment.billing_address)
         self.assertEqual(payment.billing_address.line1, billing_address['line1'])
         self.assertEqual(payment.billing_address.postcode, billing_address['postcode'])
+        self.assertEqual(payment.billing_address.normalised_postcode, 'SW1H9EU')
 
     def test_update_fails_with_bad_billing_address(self):
         bad_billing_address = 45
@@ -417,7 +418,7 @@ class UpdatePaymentViewTestCase(AuthTestCaseMixin, APITestCase):
             'line2': '',
             'city': 'London',
             'country': 'UK',
-            'postcode': 'SW1H 9EU'
+            'postcode': 'sw1a-1aa'
         }
         response = self.client.patch(
             reverse('payment-detail', args=[response.data['uuid']]),
@@ -437,6 +438,8 @@ class UpdatePaymentViewTestCase(AuthTestCaseMixin, APITestCase):
             BillingAddress.objects.all()[0].line1,
             billing_address_2['line1']
         )
+        # check normalised postcode follows the updated postcode
+        self.assertEqual(BillingAddress.objects.all()[0].normalised_postcode, 'SW1A1AA')
 
 
 class GetPaymentViewTestCase(AuthTestCaseMixin, APITestCase):
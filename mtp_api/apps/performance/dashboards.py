@@ -9,8 +9,8 @@ from mtp_common.utils import format_currency
 
 from core.dashboards import DashboardModule
 from core.views import DashboardView
-from credit.constants import CreditStatus
-from credit.models import Credit
+from credit.constants import CreditSource, CreditStatus
+from credit.models import Credit, DailyCreditAggregate
 from disbursement.models import Disbursement, DisbursementResolution
 from performance.models import DigitalTakeup
 from transaction.utils import format_currency_truncated, format_number, format_percentage
@@ -22,13 +22,7 @@ CREDITABLE_FILTERS = (
 
 
 def valid_credit_stats(since, until=None):
-    queryset = Credit.objects.filter(CREDITABLE_FILTERS)
-    if until:
-        queryset = queryset.filter(received_at__range=(since, until))
-    else:
-        queryset = queryset.filter(received_at__gte=since)
-    stat = queryset.aggregate(count=models.Count('*'), amount=models.Sum('amount'))
-    stat['amount'] = stat['amount'] or 0
+    stat = DailyCreditAggregate.objects.filter(CREDITABLE_FILTERS).received_between(since, until).totals()
     stat['number'] = format_number(stat['count'], truncate_after=1000000)
     return {
         'title': ngettext('%(number)s credit received', '%(number)s credits received', stat['count']) % stat,
@@ -37,12 +31,9 @@ def valid_credit_stats(since, until=None):
 
 
 def pending_credits_stats(since, until=None):
-    queryset = Credit.objects.credit_pending()
-    if until:
-        queryset = queryset.filter(received_at__range=(since, until))
-    else:
-        queryset = queryset.filter(received_at__gte=since)
-    count = queryset.aggregate(count=models.Count('*'))['count']
+    count = DailyCreditAggregate.objects.filter(Credit.STATUS_LOOKUP[CreditStatus.credit_pending.value]) \
+        .received_between(since, until) \
+        .totals()['count']
     return {
         'title': ngettext('Credit pending', 'Credits pending', count),
         'value': format_number(count, truncate_after=1000000),
@@ -129,13 +120,12 @@ class PerformanceOverview(DashboardModule):
 def get_simple_stats():
     today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    credited_stats = Credit.objects.credited() \
-        .aggregate(count=models.Count('*'), amount=models.Sum('amount'))
-    credited_stats['amount'] = credited_stats['amount'] or 0
+    credited_stats = DailyCreditAggregate.objects.filter(Credit.STATUS_LOOKUP[CreditStatus.credited.value]) \
+        .totals()
 
-    pending_credits = Credit.objects.credit_pending() \
-        .filter(received_at__lt=today) \
-        .count()
+    pending_credits = DailyCreditAggregate.objects.filter(Credit.STATUS_LOOKUP[CreditStatus.credit_pending.value]) \
+        .filter(date__lt=timezone.localdate(today)) \
+        .totals()['count']
 
     digital_takeup = DigitalTakeup.objects.mean_digital_takeup()
 
@@ -276,7 +266,7 @@ def get_credit_chart_data():
     one_day = datetime.timedelta(days=1)
     one_week = datetime.timedelta(days=7)
 
-    credit_queryset = Credit.objects.filter(CREDITABLE_FILTERS)
+    aggregate_queryset = DailyCreditAggregate.objects.filter(CREDITABLE_FILTERS)
     column_labels = [
         {'type': 'date', 'label': gettext('Week commencing')},
         {'type': 'number', 'label': gettext('Bank transfer')},
@@ -288,8 +278,11 @@ def get_credit_chart_data():
 
     since, until = monday_midnight, now
     for __ in range(week_count):
-        aggregates = credit_queryset.filter(received_at__range=(since, until)) \
-            .aggregate(transactions=models.Count('transaction'), payments=models.Count('payment'))
+        aggregates = aggregate_queryset.received_between(since, since + one_week) \
+            .aggregate(
+                transactions=models.Sum('count', filter=models.Q(source=CreditSource.bank_transfer)),
+                payments=models.Sum('count', filter=models.Q(source=CreditSource.online)),
+            )
         transaction_count = aggregates.get('transactions') or 0
         payment_count = aggregates.get('payments') or 0
         postal_count = DigitalTakeup.objects.filter(date__range=(since.date(), until.date() - one_day)) \
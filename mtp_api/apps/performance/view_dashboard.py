@@ -5,8 +5,8 @@ from django.utils import timezone
 from django.views.generic import TemplateView
 import requests
 
-from credit.constants import CreditResolution
-from credit.models import Credit
+from credit.constants import CreditResolution, CreditSource
+from credit.models import DailyCreditAggregate
 from core.views import AdminViewMixin
 from disbursement.constants import DisbursementResolution, DisbursementMethod
 from disbursement.models import Disbursement
@@ -40,10 +40,20 @@ def get_user_satisfaction():
         return 'No rating'
 
 
+def get_digital_credit_aggregates(start_date, end_date):
+    # excludes credits which are not yet complete or failed, as Credit.objects does
+    return DailyCreditAggregate.objects \
+        .exclude(resolution__in=(CreditResolution.initial, CreditResolution.failed)) \
+        .received_between(start_date, end_date)
+
+
 def get_overall_stats(start_date, end_date):
-    queryset_digital_credits = Credit.objects.filter(received_at__range=(start_date, end_date))
+    credit_stats = get_digital_credit_aggregates(start_date, end_date).totals()
     queryset_disbursement = Disbursement.objects.filter(created__range=(start_date, end_date))
-    stats = queryset_digital_credits.aggregate(credit_count=models.Count('id'), credit_amount=models.Sum('amount'))
+    stats = {
+        'credit_count': credit_stats['count'],
+        'credit_amount': credit_stats['amount'],
+    }
     stats.update(
         queryset_disbursement.aggregate(disbursement_count=models.Count('id'),
                                         disbursement_amount=models.Sum('amount'))
@@ -52,10 +62,14 @@ def get_overall_stats(start_date, end_date):
 
 
 def get_stats_by_method(start_date, end_date):
-    credit_queryset = Credit.objects.filter(received_at__range=(start_date, end_date),
-                                            resolution=CreditResolution.credited)
-    credit_bank_transfer_count = credit_queryset.filter(transaction__isnull=False).count()
-    credit_debit_card_count = credit_queryset.filter(payment__isnull=False).count()
+    credit_counts = get_digital_credit_aggregates(start_date, end_date) \
+        .filter(resolution=CreditResolution.credited) \
+        .aggregate(
+            bank_transfer=models.Sum('count', filter=models.Q(source=CreditSource.bank_transfer)),
+            debit_card=models.Sum('count', filter=models.Q(source=CreditSource.online)),
+        )
+    credit_bank_transfer_count = credit_counts['bank_transfer'] or 0
+    credit_debit_card_count = credit_counts['debit_card'] or 0
 
     disbursement_queryset = Disbursement.objects.filter(created__range=(start_date, end_date),
                                                         resolution=DisbursementResolution.sent)
@@ -80,8 +94,7 @@ def post_count(digital_take_up, digital_count):
 
 
 def estimate_postal_credits(start_of_month, end_of_month):
-    queryset_digital_month = Credit.objects.filter(received_at__range=(start_of_month, end_of_month))
-    digital_month_count = queryset_digital_month.count()
+    digital_month_count = get_digital_credit_aggregates(start_of_month, end_of_month).totals()['count']
     queryset_digital_take_up = DigitalTakeup.objects.filter(
         date__range=(start_of_month, end_of_month)).mean_digital_takeup()
     post_month = post_count(queryset_digital_take_up, digital_month_count)
@@ -97,14 +110,14 @@ def savings_for_financial_year(today):
         start_financial_year = today.replace(month=4, year=today.year-1, day=1)
         end_financial_year = today.replace(month=4, day=30)
 
-    queryset_digital = Credit.objects.filter(received_at__range=(start_financial_year, end_financial_year))
-    digital_count = queryset_digital.count()
+    queryset_digital = get_digital_credit_aggregates(start_financial_year, end_financial_year)
+    digital_count = queryset_digital.totals()['count']
 
     queryset_digital_takeup = DigitalTakeup.objects.filter(date__range=(start_financial_year, end_financial_year))
     digital_takeup = queryset_digital_takeup.mean_digital_takeup()
 
     post = post_count(digital_takeup, digital_count)
-    digital = queryset_digital.filter(resolution=CreditResolution.credited).count()
+    digital = queryset_digital.filter(resolution=CreditResolution.credited).totals()['count']
 
     total_cost_post = post * COST_PER_TRANSACTION_BY_POST
     total_cost_digital = digital * COST_PER_TRANSACTION_BY_DIGITAL
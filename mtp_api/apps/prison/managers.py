@@ -0,0 +1,38 @@
+from django.db import connection, models
+
+
+class PrisonerLocationChangeManager(models.Manager):
+    def record_upload(self):
+        """
+        Records prisoners whose active location will change when the uploaded (inactive) locations replace
+        the active ones; i.e. prisoners who have moved, been renamed, appeared or disappeared.
+        Must be called before the new locations are activated. Returns the number of prisoners recorded.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO prison_prisonerlocationchange (prisoner_number, prisoner_dob, created)
+                SELECT DISTINCT
+                    COALESCE(new.prisoner_number, old.prisoner_number),
+                    COALESCE(new.prisoner_dob, old.prisoner_dob),
+                    NOW()
+                FROM (
+                    SELECT prisoner_number, prisoner_dob, prisoner_name, prison_id
+                    FROM prison_prisonerlocation WHERE active IS True
+                ) AS old
+                FULL OUTER JOIN (
+                    SELECT prisoner_number, prisoner_dob, prisoner_name, prison_id
+                    FROM prison_prisonerlocation WHERE active IS False
+                ) AS new
+                ON old.prisoner_number = new.prisoner_number AND old.prisoner_dob = new.prisoner_dob
+                AND old.prison_id = new.prison_id AND old.prisoner_name = new.prisoner_name
+                WHERE old.prisoner_number IS NULL OR new.prisoner_number IS NULL
+                """
+            )
+            return cursor.rowcount
+
+    def delete_applied(self):
+        """
+        Deletes changes that have been applied to both credits and prisoner profiles
+        """
+        return self.filter(credits_updated=True, prisoner_profiles_updated=True).delete()
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('prison', '0024_rename_prisonerbalance_prisoner_number_prison_prison_pris_prisone_e452a0_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrisonerLocationChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prisoner_number', models.CharField(max_length=250)),
+                ('prisoner_dob', models.DateField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('prison', '0025_prisonerlocationchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prisonerlocationchange',
+            name='credits_updated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='prisonerlocationchange',
+            name='prisoner_profiles_updated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -7,6 +7,8 @@ from django.utils.translation import gettext_lazy as _
 
 from model_utils.models import TimeStampedModel
 
+from prison.managers import PrisonerLocationChangeManager
+
 validate_prisoner_number = RegexValidator(r'^[A-Z]\d{4}[A-Z]{2}$', message=_('Invalid prisoner number'))
 
 
@@ -119,6 +121,26 @@ class PrisonerLocation(TimeStampedModel):
         return '%s (%s)' % (self.prisoner_name, self.prisoner_number)
 
 
+class PrisonerLocationChange(models.Model):
+    """
+    Prisoners whose active location changed in an upload, waiting to be applied to their credits
+    and prisoner profiles; deleted once applied to both
+    """
+    prisoner_number = models.CharField(max_length=250)
+    prisoner_dob = models.DateField()
+    created = models.DateTimeField(auto_now_add=True)
+    credits_updated = models.BooleanField(default=False)
+    prisoner_profiles_updated = models.BooleanField(default=False)
+
+    objects = PrisonerLocationChangeManager()
+
+    class Meta:
+        ordering = ('id',)
+
+    def __str__(self):
+        return '%s (%s)' % (self.prisoner_number, self.prisoner_dob)
+
+
 class PrisonerCreditNoticeEmail(models.Model):
     prison = models.OneToOneField(Prison, on_delete=models.CASCADE)
     email = models.EmailField()
@@ -22,7 +22,9 @@ from core.tests.utils import make_test_users, make_test_user_admins
 from mtp_auth.tests.utils import AuthTestCaseMixin
 from mtp_auth.constants import CASHBOOK_OAUTH_CLIENT_ID
 from mtp_auth.models import PrisonUserMapping
-from prison.models import Prison, PrisonerLocation, Population, Category, PrisonerBalance, PrisonerCreditNoticeEmail
+from prison.models import (
+    Prison, PrisonerLocation, PrisonerLocationChange, Population, Category, PrisonerBalance, PrisonerCreditNoticeEmail,
+)
 from prison.serializers import TOLERATED_NOMIS_ERROR_CODES
 from prison.tests.utils import (
     random_prisoner_name, random_prisoner_number, random_prisoner_dob,
@@ -175,6 +177,8 @@ class PrisonerLocationViewTestCase(AuthTestCaseMixin, APITestCase):
                 PrisonerLocation.objects.filter(active=True).filter(**item).count(),
                 1
             )
+        # 2 prisoners were removed and 3 added
+        self.assertEqual(PrisonerLocationChange.objects.count(), 5)
 
     def test_create_and_delete_inactive(self):
         data = self.test_create()
@@ -364,19 +368,17 @@ class DeleteOldPrisonerLocationsViewTestCase(AuthTestCaseMixin, APITestCase):
 
         self.assertEqual(PrisonerLocation.objects.all().count(), 0)
 
-    @mock.patch('prison.views.prisoner_profile_current_prisons_need_updating')
-    @mock.patch('prison.views.credit_prisons_need_updating')
-    def test_delete_old_sends_prisons_need_updating_signals(
-        self, mocked_credit_prisons_need_updating, mocked_prisoner_profiles_need_updating
-    ):
+    def test_delete_old_records_prisoner_location_changes(self):
         response = self.client.post(
             self.url, format='json',
             HTTP_AUTHORIZATION=self.get_http_authorization_for_user(self.prisoner_location_admins[0])
         )
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
-        mocked_credit_prisons_need_updating.send.assert_called_with(sender=PrisonerLocation)
-        mocked_prisoner_profiles_need_updating.send.assert_called_with(sender=PrisonerLocation)
+        # changes are applied by the `update_credit_prisons` and `update_current_prisons` jobs
+        self.assertEqual(PrisonerLocationChange.objects.filter(
+            credits_updated=False, prisoner_profiles_updated=False,
+        ).count(), 50)
 
 
 class PrisonerValidityViewTestCase(AuthTestCaseMixin, APITestCase):
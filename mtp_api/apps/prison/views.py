@@ -15,7 +15,6 @@ from rest_framework.response import Response
 from core.permissions import ActionsBasedPermissions, ActionsBasedViewPermissions
 from core.serializers import NullSerializer
 from core.views import AdminViewMixin
-from credit.signals import credit_prisons_need_updating
 from mtp_auth.models import PrisonUserMapping
 from mtp_auth.permissions import (
     CashbookClientIDPermissions, NomsOpsClientIDPermissions, SendMoneyClientIDPermissions,
@@ -24,7 +23,9 @@ from mtp_auth.permissions import (
     get_client_permissions_class,
 )
 from prison.forms import PrisonerBalanceUploadForm
-from prison.models import PrisonerLocation, Category, Population, Prison, PrisonerBalance, PrisonerCreditNoticeEmail
+from prison.models import (
+    PrisonerLocation, PrisonerLocationChange, Category, Population, Prison, PrisonerBalance, PrisonerCreditNoticeEmail,
+)
 from prison.serializers import (
     PrisonerLocationSerializer,
     PrisonerValiditySerializer,
@@ -32,7 +33,6 @@ from prison.serializers import (
     PrisonerCreditNoticeEmailSerializer,
     PrisonSerializer, PopulationSerializer, CategorySerializer,
 )
-from security.signals import prisoner_profile_current_prisons_need_updating
 
 logger = logging.getLogger('mtp')
 
@@ -110,10 +110,10 @@ class DeleteOldPrisonerLocationsView(generics.GenericAPIView):
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
+        # changes are applied by the `update_credit_prisons` and `update_current_prisons` jobs
+        PrisonerLocationChange.objects.record_upload()
         self.get_queryset().filter(active=True).delete()
         self.get_queryset().filter(active=False).update(active=True)
-        credit_prisons_need_updating.send(sender=PrisonerLocation)
-        prisoner_profile_current_prisons_need_updating.send(sender=PrisonerLocation)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -1,8 +1,77 @@
-from django.core.management import BaseCommand
+import textwrap
 
-from security.models import PrisonerProfile
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from prison.models import PrisonerLocationChange
+from security.models import PrisonerProfile, RecipientProfile, SenderProfile
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        PrisonerProfile.objects.update_current_prisons()
+    """
+    Update the current prison of prisoner profiles whose location changed in recent uploads.
+    Scheduled to run every 10 minutes; it does nothing if no changes are waiting.
+    Changes are processed in batches, each in its own database transaction
+    unless the command is run in one, as the scheduler does.
+    With --all, every prisoner profile is checked and drifted profile relation counts are corrected.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--all', action='store_true',
+                            help='Check all prisoner profiles instead of only those with changed locations')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of changed prisoners to process at a time')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive')
+
+        if options['all']:
+            self.handle_all(verbosity)
+        else:
+            self.handle_changes(batch_size, verbosity)
+        PrisonerLocationChange.objects.delete_applied()
+
+    def handle_all(self, verbosity):
+        with transaction.atomic():
+            # changes recorded before the full update are covered by it
+            pending_changes = PrisonerLocationChange.objects.filter(prisoner_profiles_updated=False)
+            last_change_id = pending_changes.order_by('-pk').values_list('pk', flat=True).first()
+            profile_count = PrisonerProfile.objects.update_current_prisons()
+            if last_change_id is not None:
+                pending_changes.filter(pk__lte=last_change_id).update(prisoner_profiles_updated=True)
+        if verbosity:
+            self.stdout.write('Updated current prison of %d prisoner profiles' % profile_count)
+
+        for model in (SenderProfile, PrisonerProfile, RecipientProfile):
+            corrected = model.objects.all().correct_relation_counts()
+            if verbosity:
+                self.stdout.write('Corrected relation counts of %d %s' % (corrected, model._meta.verbose_name_plural))
+
+    def handle_changes(self, batch_size, verbosity):
+        change_count = 0
+        profile_count = 0
+        while True:
+            with transaction.atomic():
+                change_ids = list(
+                    PrisonerLocationChange.objects
+                    .filter(prisoner_profiles_updated=False)
+                    .select_for_update(skip_locked=True)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not change_ids:
+                    break
+                profile_count += PrisonerProfile.objects.update_current_prisons(prisoner_location_change_ids=change_ids)
+                PrisonerLocationChange.objects.filter(pk__in=change_ids).update(prisoner_profiles_updated=True)
+                change_count += len(change_ids)
+
+        if verbosity:
+            self.stdout.write(
+                'Updated current prison of %d prisoner profiles for %d changed locations'
+                % (profile_count, change_count)
+            )
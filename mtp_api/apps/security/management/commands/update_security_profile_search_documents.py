@@ -0,0 +1,39 @@
+import textwrap
+
+from django.core.management import BaseCommand, CommandError
+
+from security.models import PrisonerProfile, SenderProfile
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the search documents of sender and prisoner profiles from their linked details.
+    Only needed if these details were changed without going through the application.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of profiles to update at a time')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Batch size must be positive')
+
+        for model, name in ((SenderProfile, 'sender'), (PrisonerProfile, 'prisoner')):
+            profiles = model.objects.all()
+            changed = 0
+            last_pk = 0
+            while True:
+                batch_pks = list(
+                    profiles.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+                )
+                if not batch_pks:
+                    break
+                last_pk = batch_pks[-1]
+                changed += profiles.filter(pk__gte=batch_pks[0], pk__lte=last_pk).update_search_documents()
+            if verbosity:
+                self.stdout.write(f'Updated search documents of {changed} {name} profiles')
@@ -1,11 +1,19 @@
+import concurrent.futures
+import multiprocessing
+
+from django.db import connections
+from django.db.models import F, Func, IntegerField, Value
+from django.db.models.functions import Abs, Coalesce, Mod
 from django.db.transaction import atomic
 from django.core.management import BaseCommand, CommandError
 
+from core.utils import advisory_lock_key, advisory_xact_lock, try_advisory_lock
 from credit.constants import CreditResolution
 from credit.models import Credit
 from disbursement.constants import DisbursementResolution
 from disbursement.models import Disbursement
 from notification.tasks import create_notification_events
+from security.managers import SenderProfileKeyCache
 from security.models import PrisonerProfile, SenderProfile, RecipientProfile
 
 
@@ -16,6 +24,11 @@ class Command(BaseCommand):
                             help='Number of objects to process in one atomic transaction')
         parser.add_argument('--recalculate-totals', action='store_true', help='Recalculates the counts and totals only')
         parser.add_argument('--recreate', action='store_true', help='Deletes existing profiles')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Number of worker processes for sharded processing; '
+                                 '0 processes everything sequentially, 1 processes shards in this process')
+        parser.add_argument('--shards', type=int, default=16,
+                            help='Number of shards to partition prisoners and profiles into when using workers')
 
     def handle(self, **options):
         if options['recalculate_totals'] and options['recreate']:
@@ -25,8 +38,18 @@ class Command(BaseCommand):
         if batch_size < 1:
             raise CommandError('Batch size must be at least 1')
 
+        workers = options['workers']
+        shards = options['shards']
+        if workers < 0:
+            raise CommandError('Number of workers cannot be negative')
+        if shards < 1:
+            raise CommandError('Number of shards must be at least 1')
+
         if options['recalculate_totals']:
             self.handle_totals(batch_size=batch_size)
+        elif workers:
+            self.handle_sharded_update(batch_size=batch_size, recreate=options['recreate'],
+                                       workers=workers, shards=shards)
         else:
             self.handle_update(batch_size=batch_size, recreate=options['recreate'])
 
@@ -34,6 +57,7 @@ class Command(BaseCommand):
         if recreate:
             self.delete_profiles()
 
+        self.sender_profile_key_cache = SenderProfileKeyCache()
         try:
             self.handle_credit_update(batch_size)
             self.handle_disbursement_update(batch_size)
@@ -41,6 +65,52 @@ class Command(BaseCommand):
             self.stdout.write('Updating prisoner profiles for current locations')
             PrisonerProfile.objects.update_current_prisons()
 
+    def handle_sharded_update(self, batch_size, recreate, workers, shards):
+        """
+        Partitions pending credits and disbursements into shards by prisoner number hash so that each shard
+        only touches its own prisoner profiles; sender and recipient profiles are shared between shards
+        so their creation is serialised with advisory locks on their identifying details.
+        New disbursements are counted and notified in the transaction that attaches their profiles,
+        whereas sender profile totals and credit notifications are deferred to a second pass sharded by profile id
+        which finds uncounted credits again if it is interrupted
+        """
+        if recreate:
+            self.delete_profiles()
+
+        try:
+            self.stdout.write(f'Attaching profiles in {shards} prisoner shards using {workers} worker(s)')
+            results = self.run_shards(process_prisoner_shard, workers, shards, batch_size)
+            new_credit_count = sum(result['credits'] for result in results)
+            new_disbursement_count = sum(result['disbursements'] for result in results)
+            self.stdout.write(
+                f'Processed {new_credit_count} new credits and {new_disbursement_count} new disbursements'
+            )
+
+            self.stdout.write(f'Updating sender profiles in {shards} shards')
+            results = self.run_shards(process_profile_shard, workers, shards, batch_size)
+            new_credit_count = sum(result['credits'] for result in results)
+            self.stdout.write(self.style.SUCCESS(f'Updated sender profiles for {new_credit_count} new credits'))
+        finally:
+            self.stdout.write('Updating prisoner profiles for current locations')
+            PrisonerProfile.objects.update_current_prisons()
+
+    def run_shards(self, process_shard, workers, shards, *args):
+        if workers == 1:
+            results = [process_shard(shard, shards, *args) for shard in range(shards)]
+        else:
+            # connections must not be shared with forked worker processes
+            connections.close_all()
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+            ) as executor:
+                results = list(executor.map(
+                    process_shard, range(shards), *([value] * shards for value in (shards, *args))
+                ))
+        skipped_shards = results.count(None)
+        if skipped_shards:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped_shards} shards locked by another run'))
+        return [result for result in results if result is not None]
+
     def handle_credit_update(self, batch_size):
         # TODO Remove below function once the logs show that it consistently
         # does not operate on any credits, and once bank transfers have been deprecated
@@ -118,24 +188,24 @@ class Command(BaseCommand):
             new_disbursements, 'disbursements', self.process_disbursement_batch, batch_size
         )
 
-    @atomic()
     def attach_profiles_for_legacy_credits(self, new_credits):
-        for credit in new_credits:
-            credit.attach_profiles()
+        Credit.objects.filter(pk__in=[credit.pk for credit in new_credits]).attach_profiles(
+            sender_profile_key_cache=self.sender_profile_key_cache,
+        )
         return len(new_credits)
 
     @atomic()
     def calculate_credit_totals_for_prisoner_profiles(self, prisoner_profiles):
         new_credits = PrisonerProfile.objects.filter(
             pk__in=prisoner_profiles
-        ).recalculate_credit_totals()
+        ).add_new_credit_totals()
         return len(new_credits)
 
     @atomic()
     def calculate_credit_totals_for_sender_profiles(self, sender_profiles):
         new_credits = SenderProfile.objects.filter(
             pk__in=sender_profiles
-        ).recalculate_credit_totals()
+        ).add_new_credit_totals()
 
         # The reason why we dispatched notifications on calculation of sender total and not prisoner is because we
         # don't want to duplicate notifications and because we know that a credit will always
@@ -165,9 +235,7 @@ class Command(BaseCommand):
         return len(new_disbursements)
 
     def create_or_update_profiles_for_disbursement(self, disbursement):
-        recipient_profile = RecipientProfile.objects.create_or_update_for_disbursement(disbursement)
-        prisoner_profile = PrisonerProfile.objects.create_or_update_for_disbursement(disbursement)
-        prisoner_profile.recipients.add(recipient_profile)
+        create_or_update_profiles_for_disbursement(disbursement)
 
     def handle_totals(self, batch_size):
         profiles = (
@@ -207,3 +275,126 @@ class Command(BaseCommand):
         with connection.cursor() as cursor:
             for reset_sql in connection.ops.sequence_reset_sql(no_style(), security_app.get_models()):
                 cursor.execute(reset_sql)
+
+
+def create_or_update_profiles_for_disbursement(disbursement):
+    recipient_profile = RecipientProfile.objects.create_or_update_for_disbursement(disbursement)
+    prisoner_profile = PrisonerProfile.objects.create_or_update_for_disbursement(disbursement)
+    prisoner_profile.add_recipient(recipient_profile)
+
+
+def in_prisoner_shard(queryset, shard, shards, field='prisoner_number'):
+    return queryset.annotate(
+        prisoner_shard=Abs(Mod(
+            Func(Coalesce(field, Value('')), function='hashtext', output_field=IntegerField()),
+            shards,
+        )),
+    ).filter(prisoner_shard=shard)
+
+
+def in_profile_shard(queryset, shard, shards, field='pk'):
+    return queryset.annotate(profile_shard=Mod(F(field), shards)).filter(profile_shard=shard)
+
+
+def chunks(ids, batch_size):
+    for i in range(0, len(ids), batch_size):
+        yield ids[i:i + batch_size]
+
+
+def process_prisoner_shard(shard, shards, batch_size):
+    """
+    Attaches profiles to new credits and disbursements of prisoners in one shard,
+    returning None if another run is already processing it
+    """
+    with try_advisory_lock(advisory_lock_key('update_security_profiles', 'prisoners', shard, shards)) as acquired:
+        if not acquired:
+            return None
+
+        credit_ids = list(in_prisoner_shard(
+            Credit.objects.filter(sender_profile__isnull=True), shard, shards,
+        ).order_by('pk').values_list('pk', flat=True))
+        sender_profile_key_cache = SenderProfileKeyCache()
+        for credit_ids_batch in chunks(credit_ids, batch_size):
+            attach_profiles_for_credit_batch(credit_ids_batch, sender_profile_key_cache)
+
+        disbursement_ids = list(in_prisoner_shard(
+            Disbursement.objects.filter(recipient_profile__isnull=True, resolution=DisbursementResolution.sent),
+            shard, shards,
+        ).order_by('pk').values_list('pk', flat=True))
+        for disbursement_ids_batch in chunks(disbursement_ids, batch_size):
+            attach_profiles_for_disbursement_batch(disbursement_ids_batch)
+
+        prisoner_profile_ids = list(in_prisoner_shard(
+            PrisonerProfile.objects.filter(
+                credits__is_counted_in_prisoner_profile_total=False,
+                credits__resolution=CreditResolution.credited,
+            ), shard, shards,
+        ).order_by('pk').values_list('pk', flat=True).distinct())
+        for prisoner_profile_ids_batch in chunks(prisoner_profile_ids, batch_size):
+            with atomic():
+                PrisonerProfile.objects.filter(pk__in=prisoner_profile_ids_batch).add_new_credit_totals()
+
+    return {'credits': len(credit_ids), 'disbursements': len(disbursement_ids)}
+
+
+def attach_profiles_for_credit_batch(credit_ids, sender_profile_key_cache=None):
+    # re-filtered in case another run attached them in the meantime;
+    # locks on sender and prisoner details are taken when attaching
+    Credit.objects.filter(pk__in=credit_ids, sender_profile__isnull=True).attach_profiles(
+        sender_profile_key_cache=sender_profile_key_cache,
+    )
+
+
+@atomic()
+def attach_profiles_for_disbursement_batch(disbursement_ids):
+    new_disbursements = list(
+        Disbursement.objects.filter(pk__in=disbursement_ids, recipient_profile__isnull=True).order_by('pk')
+    )
+    # recipient profiles stay locked until commit so recalculating their totals here cannot lose an update
+    advisory_xact_lock(
+        RecipientProfile.objects.lock_key_for_disbursement(disbursement) for disbursement in new_disbursements
+    )
+    recipient_profiles = []
+    prisoner_profiles = []
+    for disbursement in new_disbursements:
+        create_or_update_profiles_for_disbursement(disbursement)
+        if disbursement.recipient_profile:
+            recipient_profiles.append(disbursement.recipient_profile.pk)
+        if disbursement.prisoner_profile:
+            prisoner_profiles.append(disbursement.prisoner_profile.pk)
+    RecipientProfile.objects.filter(
+        pk__in=recipient_profiles,
+    ).recalculate_disbursement_totals()
+    PrisonerProfile.objects.filter(
+        pk__in=prisoner_profiles,
+    ).recalculate_disbursement_totals()
+
+    # notified in the same transaction because attached disbursements are not picked up by later runs
+    create_notification_events(records=new_disbursements)
+
+
+def process_profile_shard(shard, shards, batch_size):
+    """
+    Updates totals of sender profiles in one shard and creates notification events for their new credits,
+    returning None if another run is already processing it
+    """
+    with try_advisory_lock(advisory_lock_key('update_security_profiles', 'profiles', shard, shards)) as acquired:
+        if not acquired:
+            return None
+
+        new_credit_count = 0
+        sender_profile_ids = list(in_profile_shard(
+            SenderProfile.objects.filter(
+                credits__is_counted_in_sender_profile_total=False,
+                credits__resolution=CreditResolution.credited,
+            ), shard, shards,
+        ).order_by('pk').values_list('pk', flat=True).distinct())
+        for sender_profile_ids_batch in chunks(sender_profile_ids, batch_size):
+            with atomic():
+                new_credits = SenderProfile.objects.filter(
+                    pk__in=sender_profile_ids_batch,
+                ).add_new_credit_totals()
+                create_notification_events(records=new_credits)
+                new_credit_count += len(new_credits)
+
+    return {'credits': new_credit_count}
@@ -0,0 +1,54 @@
+import logging
+import textwrap
+
+from django.core.management import BaseCommand, CommandError
+
+from security.models import PrisonerProfile, SenderProfile
+
+logger = logging.getLogger('mtp')
+
+
+class Command(BaseCommand):
+    """
+    Verify the credit totals of sender and prisoner profiles which `update_security_profiles` maintains
+    incrementally, resetting any that have drifted from their counted credits.
+    With --check, only reports profiles whose totals have drifted and fails if any are found.
+    """
+    help = textwrap.dedent(__doc__).strip()
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--check', action='store_true',
+                            help='Report profiles with drifted totals without changing them')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        profiles = (
+            (SenderProfile, 'sender'),
+            (PrisonerProfile, 'prisoner'),
+        )
+
+        if options['check']:
+            mismatched_count = 0
+            for model, name in profiles:
+                mismatched_ids = list(
+                    model.objects.all().credit_total_mismatches().order_by('pk').values_list('pk', flat=True)
+                )
+                if mismatched_ids and verbosity > 1:
+                    self.stdout.write(f'Inconsistent {name} profiles: %s' % ', '.join(map(str, mismatched_ids)))
+                mismatched_count += len(mismatched_ids)
+            if mismatched_count:
+                raise CommandError('%d profiles have inconsistent credit totals' % mismatched_count)
+            if verbosity:
+                self.stdout.write('All profile credit totals are consistent')
+            return
+
+        for model, name in profiles:
+            corrected = model.objects.all().correct_credit_totals()
+            if corrected:
+                logger.warning(
+                    'Corrected drifted credit totals of %(count)d %(name)s profiles',
+                    {'count': corrected, 'name': name},
+                )
+            if verbosity:
+                self.stdout.write(f'Corrected credit totals of {corrected} {name} profiles')
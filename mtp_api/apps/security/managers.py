@@ -1,21 +1,106 @@
+import collections
+import datetime
+import functools
 import logging
+import operator
+import time
+import weakref
 
 from django.db import connection, models, transaction
-from django.db.models import Count, Sum, Subquery, OuterRef, Q
-from django.db.models.functions import Coalesce
+from django.contrib.postgres.aggregates import ArrayAgg, StringAgg
+from django.db.models import Count, F, Func, Max, Sum, Subquery, OuterRef, Q, Value
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
 
+from core.models import TruncLocalDate
+from core.utils import KeywordMatcher, advisory_lock_key, advisory_xact_lock, beginning_of_day
 from credit.constants import CreditResolution
 from credit.models import Credit
 
 logger = logging.getLogger('mtp')
 
 
+def any_of(lookups):
+    return functools.reduce(operator.or_, (Q(**lookup) for lookup in lookups))
+
+
+def first_related_values(queryset, profile_field, value_field):
+    """
+    Maps each profile to a value of its earliest related row, i.e. the row that `.first()` would return
+    """
+    first_values = {}
+    for profile_id, value in queryset.order_by('created', 'pk').values_list(profile_field, value_field):
+        first_values.setdefault(profile_id, value)
+    return first_values
+
+
+class SenderProfileKeyCache:
+    """
+    Bounded map of the bank transfer and debit card details of credits to the sender profiles they resolved to,
+    kept for the length of a run so that repeat senders are attached without looking up their details again;
+    entries are only added once the transaction that resolved them commits
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def add_on_commit(self, entries):
+        if entries:
+            transaction.on_commit(functools.partial(self.add, entries))
+
+    def add(self, entries):
+        self.entries.update(entries)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+def monitoring_user_ids(queryset, user_filters):
+    """
+    Maps the primary key of each row to the ids of its monitoring users matching user_filters,
+    omitting unmonitored rows
+    """
+    user_filters = Q(**{f'monitoring_users__{lookup}': value for lookup, value in user_filters.items()})
+    return {
+        pk: sorted(user_ids)
+        for pk, user_ids in queryset.order_by().annotate(
+            monitoring_user_ids=ArrayAgg('monitoring_users', filter=user_filters, distinct=True),
+            monitoring_user_count=Count('monitoring_users', filter=user_filters, distinct=True),
+        ).filter(monitoring_user_count__gt=0).values_list('pk', 'monitoring_user_ids')
+    }
+
+
 class PrisonerProfileManager(models.Manager):
     def get_queryset(self):
         return PrisonerProfileQuerySet(model=self.model, using=self._db, hints=self._hints)
 
     @transaction.atomic
-    def update_current_prisons(self):
+    def update_current_prisons(self, prisoner_location_change_ids=None):
+        """
+        Sets the current prison of prisoner profiles to that of their active location,
+        only writing profiles that change.
+        If PrisonerLocationChange ids are provided, only profiles of those prisoners are considered;
+        returns the number of profiles changed
+        """
+        if prisoner_location_change_ids is None:
+            changed_prisoners_clause = ''
+            params = ()
+        else:
+            changed_prisoners_clause = (
+                'AND pp.prisoner_number IN ('
+                'SELECT prisoner_number FROM prison_prisonerlocationchange WHERE id = ANY(%s)'
+                ') '
+            )
+            params = (list(prisoner_location_change_ids),)
         with connection.cursor() as cursor:
             cursor.execute(
                 'UPDATE security_prisonerprofile '
@@ -25,7 +110,11 @@ class PrisonerProfileManager(models.Manager):
                 'ON pp.prisoner_number = pl.prisoner_number '
                 'AND pl.active is True '
                 'WHERE security_prisonerprofile.id = pp.id '
+                'AND security_prisonerprofile.current_prison_id IS DISTINCT FROM pl.prison_id '
+                + changed_prisoners_clause,
+                params
             )
+            return cursor.rowcount
 
     def get_for_credit(self, credit):
         if credit.prisoner_profile:
@@ -54,11 +143,81 @@ class PrisonerProfileManager(models.Manager):
 
         if credit.prison not in prisoner_profile.prisons.all():
             prisoner_profile.add_prison(credit.prison)
+        self.filter(pk=prisoner_profile.pk).update_search_documents()
         credit.prisoner_profile = prisoner_profile
         credit.save()
         logger.info('Attached prisoner profile %s to credit %s', prisoner_profile, credit)
         return prisoner_profile
 
+    def lock_key_for_credit(self, credit):
+        return advisory_lock_key('prisoner', credit.prisoner_number)
+
+    def create_or_update_for_credits(self, credits):
+        """
+        Bulk equivalent of create_or_update_for_credit that does not save the credits
+        :return: prisoner profile ids keyed by credit id
+        """
+        from security.models import ProvidedPrisonerName
+
+        credits_by_prisoner_number = {}
+        for credit in credits:
+            assert credit.prison_id, 'Credit does not have a known prisoner'
+            credits_by_prisoner_number.setdefault(credit.prisoner_number, []).append(credit)
+        if not credits_by_prisoner_number:
+            return {}
+
+        prisoner_profiles = {
+            # the earliest profile wins if prisoner numbers were ever duplicated
+            prisoner_profile.prisoner_number: prisoner_profile
+            for prisoner_profile in self.filter(prisoner_number__in=credits_by_prisoner_number).order_by('-pk')
+        }
+        existing_prisoner_profiles = list(prisoner_profiles.values())
+        new_prisoner_profiles = []
+        now = timezone.now()
+        for prisoner_number, prisoner_credits in credits_by_prisoner_number.items():
+            prisoner_profile = prisoner_profiles.get(prisoner_number)
+            if prisoner_profile is None:
+                prisoner_profile = self.model(prisoner_number=prisoner_number)
+                prisoner_profiles[prisoner_number] = prisoner_profile
+                new_prisoner_profiles.append(prisoner_profile)
+            prisoner_profile.prisoner_name = prisoner_credits[-1].prisoner_name
+            prisoner_profile.prisoner_dob = prisoner_credits[-1].prisoner_dob
+            prisoner_profile.modified = now
+        self.bulk_update(existing_prisoner_profiles, ['prisoner_name', 'prisoner_dob', 'modified'])
+        self.bulk_create(new_prisoner_profiles)
+
+        prisoner_profile_ids = {
+            credit.pk: prisoner_profiles[credit.prisoner_number].pk
+            for credit in credits
+        }
+
+        provided_names = {
+            (prisoner_profile_ids[credit.pk], credit.payment.recipient_name)
+            for credit in credits
+            if hasattr(credit, 'payment') and credit.payment.recipient_name
+        }
+        if provided_names:
+            provided_names -= set(ProvidedPrisonerName.objects.filter(
+                prisoner__in={prisoner_profile_id for prisoner_profile_id, _ in provided_names},
+            ).values_list('prisoner_id', 'name'))
+            ProvidedPrisonerName.objects.bulk_create(
+                ProvidedPrisonerName(prisoner_id=prisoner_profile_id, name=name)
+                for prisoner_profile_id, name in sorted(provided_names)
+            )
+
+        self.model.prisons.through.objects.bulk_create(
+            (
+                self.model.prisons.through(prisonerprofile_id=prisoner_profile_id, prison_id=prison_id)
+                for prisoner_profile_id, prison_id in sorted({
+                    (prisoner_profile_ids[credit.pk], credit.prison_id)
+                    for credit in credits
+                })
+            ),
+            ignore_conflicts=True,
+        )
+        self.filter(pk__in=set(prisoner_profile_ids.values())).update_search_documents()
+        return prisoner_profile_ids
+
     def create_or_update_for_disbursement(self, disbursement):
         from prison.models import PrisonerLocation
 
@@ -80,10 +239,18 @@ class PrisonerProfileManager(models.Manager):
             defaults=prisoner_profile_defaults,
         )
         prisoner_profile.add_prison(disbursement.prison)
+        self.filter(pk=prisoner_profile.pk).update_search_documents()
         disbursement.prisoner_profile = prisoner_profile
         disbursement.save()
         return prisoner_profile
 
+    def get_monitoring_user_ids(self, profile_ids, **user_filters):
+        """
+        Maps each of the given profiles which is monitored to the ids of its monitoring users,
+        matching `PrisonerProfile.get_monitoring_users` but in one query for any number of profiles
+        """
+        return monitoring_user_ids(self.filter(pk__in=profile_ids), user_filters)
+
 
 class SenderProfileManager(models.Manager):
     def get_queryset(self):
@@ -104,6 +271,38 @@ class SenderProfileManager(models.Manager):
         except self.model.DoesNotExist:
             return self.create()
 
+    def get_monitoring_user_ids(self, profile_ids, **user_filters):
+        """
+        Maps each of the given profiles which is monitored to the ids of its monitoring users,
+        matching `SenderProfile.get_monitoring_users` but in a constant number of queries for any number of profiles
+        """
+        from security.models import BankAccount, BankTransferSenderDetails, DebitCardSenderDetails
+
+        debit_card_details = first_related_values(
+            DebitCardSenderDetails.objects.filter(sender_id__in=profile_ids), 'sender_id', 'pk',
+        )
+        bank_accounts = first_related_values(
+            BankTransferSenderDetails.objects.filter(sender_id__in=set(profile_ids) - set(debit_card_details)),
+            'sender_id', 'sender_bank_account_id',
+        )
+        debit_card_details_user_ids = monitoring_user_ids(
+            DebitCardSenderDetails.objects.filter(pk__in=debit_card_details.values()), user_filters,
+        )
+        bank_account_user_ids = monitoring_user_ids(
+            BankAccount.objects.filter(pk__in=bank_accounts.values()), user_filters,
+        )
+        user_ids = {
+            profile_id: debit_card_details_user_ids[details_id]
+            for profile_id, details_id in debit_card_details.items()
+            if details_id in debit_card_details_user_ids
+        }
+        user_ids.update(
+            (profile_id, bank_account_user_ids[bank_account_id])
+            for profile_id, bank_account_id in bank_accounts.items()
+            if bank_account_id in bank_account_user_ids
+        )
+        return user_ids
+
     def get_for_credit(self, credit):
         if credit.sender_profile:
             return credit.sender_profile
@@ -130,6 +329,23 @@ class SenderProfileManager(models.Manager):
             debit_card_details__postcode=normalised_postcode,
         )
 
+    def lock_key_for_credit(self, credit):
+        """
+        Advisory lock key covering the sender profile and bank account that a credit would be attached to;
+        used to serialise concurrent profile updates that may share them
+        """
+        if hasattr(credit, 'transaction'):
+            return advisory_lock_key(
+                'bank_account', credit.sender_sort_code, credit.sender_account_number, credit.sender_roll_number or '',
+            )
+        if hasattr(credit, 'payment'):
+            billing_address = credit.payment.billing_address
+            return advisory_lock_key(
+                'debit_card', credit.card_number_last_digits, credit.card_expiry_date,
+                billing_address.normalised_postcode if billing_address else None,
+            )
+        return advisory_lock_key('anonymous_sender')
+
     def create_or_update_for_credit(self, credit):
         if hasattr(credit, 'transaction'):
             sender_profile = self._create_or_update_for_bank_transfer(credit)
@@ -147,11 +363,210 @@ class SenderProfileManager(models.Manager):
             and credit.prison not in sender_profile.prisons.all()
         ):
             sender_profile.add_prison(credit.prison)
+        self.filter(pk=sender_profile.pk).update_search_documents()
         credit.sender_profile = sender_profile
         credit.save()
         logger.info('Attached sender profile %s to credit %s', sender_profile, credit)
         return sender_profile
 
+    def create_or_update_for_credits(self, credits, key_cache=None):
+        """
+        Bulk equivalent of create_or_update_for_credit that does not save the credits
+        :param key_cache: optional SenderProfileKeyCache shared between batches of a run
+        :return: sender profile ids keyed by credit id
+        """
+        bank_transfer_credits = []
+        debit_card_credits = []
+        sender_profile_ids = {}
+        for credit in credits:
+            if hasattr(credit, 'transaction'):
+                bank_transfer_credits.append(credit)
+            elif hasattr(credit, 'payment'):
+                debit_card_credits.append(credit)
+            else:
+                logger.error('Credit %(credit_id)s does not have a payment nor transaction', {'credit_id': credit.pk})
+                sender_profile_ids[credit.pk] = self.get_or_create_anonymous_sender().pk
+        sender_profile_ids.update(self._create_or_update_for_bank_transfers(bank_transfer_credits, key_cache))
+        sender_profile_ids.update(self._create_or_update_for_debit_cards(debit_card_credits, key_cache))
+
+        self.model.prisons.through.objects.bulk_create(
+            (
+                self.model.prisons.through(senderprofile_id=sender_profile_id, prison_id=prison_id)
+                for sender_profile_id, prison_id in sorted({
+                    (sender_profile_ids[credit.pk], credit.prison_id)
+                    for credit in credits
+                    if credit.prison_id and credit.resolution != CreditResolution.failed.value
+                })
+            ),
+            ignore_conflicts=True,
+        )
+        sender_profiles = self.filter(pk__in=set(sender_profile_ids.values()))
+        sender_profiles.recalculate_relation_counts()
+        sender_profiles.update_search_documents()
+        return sender_profile_ids
+
+    def _create_or_update_for_bank_transfers(self, credits, key_cache=None):
+        from security.models import BankAccount, BankTransferSenderDetails
+
+        def bank_account_key(credit):
+            return credit.sender_sort_code, credit.sender_account_number, credit.sender_roll_number or ''
+
+        def cache_key(credit):
+            return ('bank_transfer', credit.sender_name, *bank_account_key(credit))
+
+        cached_sender_profile_ids = {}
+        if key_cache is not None:
+            for credit in credits:
+                sender_profile_id = key_cache.get(cache_key(credit))
+                if sender_profile_id:
+                    cached_sender_profile_ids[credit.pk] = sender_profile_id
+            credits = [credit for credit in credits if credit.pk not in cached_sender_profile_ids]
+        if not credits:
+            return cached_sender_profile_ids
+
+        bank_account_keys = sorted({bank_account_key(credit) for credit in credits})
+        BankAccount.objects.bulk_create(
+            (
+                BankAccount(sort_code=sort_code, account_number=account_number, roll_number=roll_number)
+                for sort_code, account_number, roll_number in bank_account_keys
+            ),
+            ignore_conflicts=True,
+        )
+        bank_account_ids = {
+            (sort_code, account_number, roll_number): pk
+            for pk, sort_code, account_number, roll_number in BankAccount.objects.filter(any_of(
+                dict(sort_code=sort_code, account_number=account_number, roll_number=roll_number)
+                for sort_code, account_number, roll_number in bank_account_keys
+            )).values_list('pk', 'sort_code', 'account_number', 'roll_number')
+        }
+
+        def sender_key(credit):
+            return credit.sender_name, bank_account_ids[bank_account_key(credit)]
+
+        sender_keys = {sender_key(credit) for credit in credits}
+        sender_profile_ids = {
+            # the earliest profile wins if sender details were ever duplicated
+            (sender_name, bank_account_id): sender_profile_id
+            for sender_name, bank_account_id, sender_profile_id in BankTransferSenderDetails.objects.filter(
+                sender_name__in={sender_name for sender_name, _ in sender_keys},
+                sender_bank_account__in={bank_account_id for _, bank_account_id in sender_keys},
+            ).order_by('-pk').values_list('sender_name', 'sender_bank_account', 'sender')
+        }
+        new_sender_keys = sorted(sender_keys - set(sender_profile_ids))
+        new_sender_profiles = self.bulk_create(self.model() for _ in new_sender_keys)
+        BankTransferSenderDetails.objects.bulk_create(
+            BankTransferSenderDetails(sender_name=sender_name, sender_bank_account_id=bank_account_id, sender=sender)
+            for (sender_name, bank_account_id), sender in zip(new_sender_keys, new_sender_profiles)
+        )
+        sender_profile_ids.update(
+            (new_sender_key, sender.pk)
+            for new_sender_key, sender in zip(new_sender_keys, new_sender_profiles)
+        )
+
+        credit_sender_profile_ids = {
+            credit.pk: sender_profile_ids[sender_key(credit)]
+            for credit in credits
+        }
+        if key_cache is not None:
+            key_cache.add_on_commit({
+                cache_key(credit): credit_sender_profile_ids[credit.pk]
+                for credit in credits
+            })
+        credit_sender_profile_ids.update(cached_sender_profile_ids)
+        return credit_sender_profile_ids
+
+    def _create_or_update_for_debit_cards(self, credits, key_cache=None):
+        from payment.models import BillingAddress
+        from security.models import CardholderName, DebitCardSenderDetails, SenderEmail
+
+        if not credits:
+            return {}
+
+        def debit_card_key(credit):
+            billing_address = credit.payment.billing_address
+            normalised_postcode = billing_address.normalised_postcode if billing_address else None
+            return credit.card_number_last_digits, credit.card_expiry_date, normalised_postcode
+
+        debit_card_keys = {debit_card_key(credit) for credit in credits}
+        # (debit card details id, sender profile id) keyed by debit card key
+        debit_card_details = {}
+        if key_cache is not None:
+            for key in debit_card_keys:
+                cached = key_cache.get(('debit_card', *key))
+                if cached:
+                    debit_card_details[key] = cached
+        uncached_debit_card_keys = debit_card_keys - set(debit_card_details)
+        if uncached_debit_card_keys:
+            debit_card_details.update(
+                # the earliest details win if null postcodes allowed duplicates
+                ((card_number_last_digits, card_expiry_date, postcode), (pk, sender_id))
+                for pk, card_number_last_digits, card_expiry_date, postcode, sender_id
+                in DebitCardSenderDetails.objects.filter(any_of(
+                    dict(card_number_last_digits=card_number_last_digits, card_expiry_date=card_expiry_date,
+                         postcode=postcode)
+                    for card_number_last_digits, card_expiry_date, postcode in uncached_debit_card_keys
+                )).order_by('-pk').values_list(
+                    'pk', 'card_number_last_digits', 'card_expiry_date', 'postcode', 'sender_id',
+                )
+            )
+        new_debit_card_keys = sorted(debit_card_keys - set(debit_card_details), key=str)
+        new_sender_profiles = self.bulk_create(self.model() for _ in new_debit_card_keys)
+        new_debit_card_details = DebitCardSenderDetails.objects.bulk_create(
+            DebitCardSenderDetails(
+                card_number_last_digits=card_number_last_digits, card_expiry_date=card_expiry_date,
+                postcode=postcode, sender=sender,
+            )
+            for (card_number_last_digits, card_expiry_date, postcode), sender
+            in zip(new_debit_card_keys, new_sender_profiles)
+        )
+        debit_card_details.update(
+            (key, (details.pk, details.sender_id))
+            for key, details in zip(new_debit_card_keys, new_debit_card_details)
+        )
+        if key_cache is not None:
+            key_cache.add_on_commit({
+                ('debit_card', *key): debit_card_details[key]
+                for key in uncached_debit_card_keys
+            })
+
+        debit_card_details_ids = {
+            credit.pk: debit_card_details[debit_card_key(credit)][0]
+            for credit in credits
+        }
+        for model, field, payment_field in (
+            (CardholderName, 'name', 'cardholder_name'),  # NB: was credit.sender_name
+            (SenderEmail, 'email', 'email'),
+        ):
+            values = {
+                (debit_card_details_ids[credit.pk], getattr(credit.payment, payment_field))
+                for credit in credits
+                if getattr(credit.payment, payment_field)
+            }
+            if not values:
+                continue
+            values -= set(model.objects.filter(
+                debit_card_sender_details__in={details_id for details_id, _ in values},
+            ).values_list('debit_card_sender_details', field))
+            model.objects.bulk_create(
+                model(debit_card_sender_details_id=details_id, **{field: value})
+                for details_id, value in sorted(values)
+            )
+
+        billing_addresses = [
+            BillingAddress(
+                pk=credit.payment.billing_address_id,
+                debit_card_sender_details_id=debit_card_details_ids[credit.pk],
+            )
+            for credit in credits
+            if credit.payment.billing_address_id
+        ]
+        BillingAddress.objects.bulk_update(billing_addresses, ['debit_card_sender_details'])
+
+        return {
+            credit.pk: debit_card_details[debit_card_key(credit)][1]
+            for credit in credits
+        }
+
     def _create_or_update_for_bank_transfer(self, credit):
         from security.models import BankAccount
 
@@ -226,6 +641,19 @@ class RecipientProfileManager(models.Manager):
             bank_transfer_details__recipient_bank_account__roll_number=disbursement.roll_number or '',
         )
 
+    def lock_key_for_disbursement(self, disbursement):
+        """
+        Advisory lock key covering the recipient profile and bank account that a disbursement would be attached to;
+        used to serialise concurrent profile updates that may share them
+        """
+        from disbursement.constants import DisbursementMethod
+
+        if disbursement.method == DisbursementMethod.cheque.value:
+            return advisory_lock_key('cheque_recipient')
+        return advisory_lock_key(
+            'bank_account', disbursement.sort_code, disbursement.account_number, disbursement.roll_number or '',
+        )
+
     def create_or_update_for_disbursement(self, disbursement):
         from disbursement.constants import DisbursementMethod
         from security.models import BankAccount
@@ -248,13 +676,217 @@ class RecipientProfileManager(models.Manager):
                     recipient_bank_account=bank_account,
                 )
 
-        recipient_profile.prisons.add(disbursement.prison)
+        recipient_profile.add_prison(disbursement.prison)
         disbursement.recipient_profile = recipient_profile
         disbursement.save()
         return recipient_profile
 
+    def get_monitoring_user_ids(self, profile_ids, **user_filters):
+        """
+        Maps each of the given profiles which is monitored to the ids of its monitoring users,
+        matching `RecipientProfile.get_monitoring_users` but in a constant number of queries for any number of profiles
+        """
+        from security.models import BankAccount, BankTransferRecipientDetails
+
+        bank_accounts = first_related_values(
+            BankTransferRecipientDetails.objects.filter(recipient_id__in=profile_ids),
+            'recipient_id', 'recipient_bank_account_id',
+        )
+        bank_account_user_ids = monitoring_user_ids(
+            BankAccount.objects.filter(pk__in=bank_accounts.values()), user_filters,
+        )
+        return {
+            profile_id: bank_account_user_ids[bank_account_id]
+            for profile_id, bank_account_id in bank_accounts.items()
+            if bank_account_id in bank_account_user_ids
+        }
+
+
+class SearchDocumentQuerySetMixin:
+    """
+    Profiles keep a lower-cased, newline-separated document of the text that profile text filters search in,
+    including that of related details, so that searches can be narrowed with a trigram index instead of joins
+    """
+
+    def update_search_documents(self):
+        """
+        Rebuilds the search document used to narrow text searches,
+        only writing rows whose document changes; returns the number of rows changed
+        """
+        search_document = self.search_document_expression()
+        return self.exclude(search_document=search_document).update(search_document=search_document)
+
+    @classmethod
+    def search_document_expression(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def search_document_text(cls, queryset, profile_field, text_field):
+        return Subquery(
+            queryset.filter(**{profile_field: OuterRef('pk')}).order_by().values(profile_field).annotate(
+                text=StringAgg(text_field, '\n'),
+            ).values('text')
+        )
+
+    @classmethod
+    def concatenate_search_document(cls, *texts):
+        return Lower(Func(
+            Value('\n'),
+            Value(''),
+            *texts,
+            Value(''),
+            function='CONCAT_WS',
+            output_field=models.TextField(),
+        ))
+
+
+class RelationCountsQuerySetMixin:
+    """
+    Numbers of linked profiles and prisons are kept in columns so that profile lists can be filtered and ordered
+    by them using an index; they are adjusted when single links are added or removed, recalculated once
+    for batches of links and drift is corrected by the `update_current_prisons` job
+    """
+    relation_count_fields = NotImplemented
+
+    def relation_counts(self):
+        return {
+            count_field: Coalesce(Subquery(
+                self.model.objects.filter(
+                    id=OuterRef('id'),
+                ).annotate(
+                    calculated=Count(relation, distinct=True),
+                ).values('calculated')[:1]
+            ), 0)
+            for count_field, relation in self.relation_count_fields.items()
+        }
+
+    def recalculate_relation_counts(self):
+        return self.update(**self.relation_counts())
+
+    def increment_relation_count(self, count_field, increment=1):
+        """
+        Adjusts a relation count after a single link was added or removed without recalculating it
+        """
+        return self.update(**{count_field: F(count_field) + increment})
+
+    def relation_count_mismatches(self):
+        relation_counts = self.relation_counts()
+        mismatched = Q()
+        for count_field in relation_counts:
+            mismatched |= ~Q(**{count_field: F(f'calculated_{count_field}')})
+        return self.annotate(**{
+            f'calculated_{count_field}': relation_count
+            for count_field, relation_count in relation_counts.items()
+        }).filter(mismatched)
+
+    def correct_relation_counts(self):
+        """
+        Recalculates relation counts that have drifted, e.g. because linked profiles were deleted
+        :return: number of profiles corrected
+        """
+        mismatched_ids = list(self.relation_count_mismatches().values_list('pk', flat=True))
+        return self.model.objects.filter(pk__in=mismatched_ids).recalculate_relation_counts()
+
+
+class CreditTotalsQuerySetMixin:
+    """
+    Credit totals of profiles can be maintained incrementally by adding uncounted credited credits as deltas;
+    the full recalculation is only needed to correct drift, e.g. when counted credits are reassigned
+    """
+    credit_profile_field = NotImplemented
+    credit_counted_field = NotImplemented
+
+    def add_new_credit_totals(self):
+        """
+        Adds credited credits that are not yet counted to these profiles' totals without recounting
+        their other credits, marking them counted in the same statement
+        :return: the newly-counted credits
+        """
+        profile_ids = list(self.values_list('pk', flat=True))
+        if not profile_ids:
+            return Credit.objects.none()
+        profile_table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH counted AS (
+                    UPDATE credit_credit
+                    SET {self.credit_counted_field} = TRUE
+                    WHERE {self.credit_profile_field}_id = ANY(%s) AND resolution = %s
+                    AND {self.credit_counted_field} IS FALSE
+                    RETURNING id, {self.credit_profile_field}_id AS profile_id, amount
+                ), deltas AS (
+                    SELECT profile_id, COUNT(*) AS credit_count, SUM(amount) AS credit_total
+                    FROM counted GROUP BY profile_id
+                ), updated AS (
+                    UPDATE {profile_table}
+                    SET credit_count = {profile_table}.credit_count + deltas.credit_count,
+                    credit_total = {profile_table}.credit_total + deltas.credit_total,
+                    modified = %s
+                    FROM deltas WHERE {profile_table}.id = deltas.profile_id
+                )
+                SELECT id FROM counted
+                """,
+                [profile_ids, CreditResolution.credited.value, timezone.now()]
+            )
+            new_credits_ids = [row[0] for row in cursor.fetchall()]
+        return Credit.objects.filter(id__in=new_credits_ids)
+
+    def counted_credit_totals(self):
+        """
+        Totals of credited credits that are counted, i.e. what incrementally-maintained totals should be
+        """
+        counted_credits = Credit.objects.filter(
+            **{self.credit_profile_field: OuterRef('pk'), self.credit_counted_field: True},
+            resolution=CreditResolution.credited,
+        ).order_by().values(self.credit_profile_field)
+        return {
+            'credit_count': Coalesce(Subquery(
+                counted_credits.annotate(calculated=Count('pk')).values('calculated')
+            ), 0),
+            'credit_total': Coalesce(Subquery(
+                counted_credits.annotate(calculated=Sum('amount')).values('calculated')
+            ), 0),
+        }
+
+    def credit_total_mismatches(self):
+        """
+        Profiles whose incrementally-maintained credit totals have drifted from their counted credits
+        """
+        counted_credit_totals = self.counted_credit_totals()
+        return self.annotate(
+            counted_credit_count=counted_credit_totals['credit_count'],
+            counted_credit_total=counted_credit_totals['credit_total'],
+        ).filter(
+            ~Q(credit_count=F('counted_credit_count')) | ~Q(credit_total=F('counted_credit_total'))
+        )
+
+    def correct_credit_totals(self):
+        """
+        Resets drifted credit totals to those of counted credits, leaving uncounted ones to be added as deltas
+        :return: number of profiles corrected
+        """
+        mismatched_ids = list(self.credit_total_mismatches().values_list('pk', flat=True))
+        return self.model.objects.filter(pk__in=mismatched_ids).update(**self.counted_credit_totals())
+
+
+class PrisonerProfileQuerySet(
+    CreditTotalsQuerySetMixin, RelationCountsQuerySetMixin, SearchDocumentQuerySetMixin, models.QuerySet,
+):
+    credit_profile_field = 'prisoner_profile'
+    credit_counted_field = 'is_counted_in_prisoner_profile_total'
+    relation_count_fields = {'sender_count': 'senders', 'recipient_count': 'recipients'}
+
+    @classmethod
+    def search_document_expression(cls):
+        from security.models import ProvidedPrisonerName
+
+        return cls.concatenate_search_document(
+            F('prisoner_name'),
+            F('prisoner_number'),
+            cls.search_document_text(ProvidedPrisonerName.objects.all(), 'prisoner', 'name'),
+        )
 
-class PrisonerProfileQuerySet(models.QuerySet):
     def recalculate_totals(self):
         self.recalculate_credit_totals()
         self.recalculate_disbursement_totals()
@@ -317,7 +949,24 @@ class PrisonerProfileQuerySet(models.QuerySet):
         )
 
 
-class SenderProfileQuerySet(models.QuerySet):
+class SenderProfileQuerySet(
+    CreditTotalsQuerySetMixin, RelationCountsQuerySetMixin, SearchDocumentQuerySetMixin, models.QuerySet,
+):
+    credit_profile_field = 'sender_profile'
+    credit_counted_field = 'is_counted_in_sender_profile_total'
+    relation_count_fields = {'prisoner_count': 'prisoners', 'prison_count': 'prisons'}
+
+    @classmethod
+    def search_document_expression(cls):
+        from security.models import BankTransferSenderDetails, CardholderName, DebitCardSenderDetails, SenderEmail
+
+        return cls.concatenate_search_document(
+            cls.search_document_text(BankTransferSenderDetails.objects.all(), 'sender', 'sender_name'),
+            cls.search_document_text(CardholderName.objects.all(), 'debit_card_sender_details__sender', 'name'),
+            cls.search_document_text(SenderEmail.objects.all(), 'debit_card_sender_details__sender', 'email'),
+            cls.search_document_text(DebitCardSenderDetails.objects.all(), 'sender', 'postcode'),
+        )
+
     def recalculate_totals(self):
         self.recalculate_credit_totals()
 
@@ -359,7 +1008,9 @@ class SenderProfileQuerySet(models.QuerySet):
         return Credit.objects.filter(id__in=new_credits_ids)
 
 
-class RecipientProfileQuerySet(models.QuerySet):
+class RecipientProfileQuerySet(RelationCountsQuerySetMixin, models.QuerySet):
+    relation_count_fields = {'prisoner_count': 'prisoners', 'prison_count': 'prisons'}
+
     def recalculate_totals(self):
         self.recalculate_disbursement_totals()
 
@@ -384,22 +1035,272 @@ class RecipientProfileQuerySet(models.QuerySet):
         )
 
 
+class DailyProfileCountManager(models.Manager):
+    """
+    Maintains the number of counted records on each local date for each pair of related profiles
+    so that counting rules can read a window of daily rows instead of rescanning the records
+    """
+    date_field = None
+    profile_fields = ()
+    # fields that `is_counted` depends on
+    counted_fields = ()
+
+    def get_counted_records(self):
+        raise NotImplementedError
+
+    def is_counted(self, record):
+        raise NotImplementedError
+
+    def record_key(self, record):
+        """
+        Returns the (local date, *profile ids) bucket that a record is counted in, if any
+        """
+        value = getattr(record, self.date_field)
+        if value is None or not self.is_counted(record):
+            return None
+        profile_ids = tuple(getattr(record, f'{field}_id') for field in self.profile_fields)
+        if not any(profile_ids):
+            return None
+        return (timezone.localdate(value), *profile_ids)
+
+    def get_key_field_names(self):
+        return (self.date_field, *(f'{field}_id' for field in self.profile_fields), *self.counted_fields)
+
+    def refresh_for_saved_record(self, record, created):
+        """
+        Recounts the buckets a saved record moved out of and into, if its key fields changed
+        """
+        key_field_names = self.get_key_field_names()
+        if not created and not record.has_changed(*key_field_names):
+            return
+        keys = {self.record_key(record)}
+        previous = None if created else record.get_saved_instance(*key_field_names)
+        if previous:
+            keys.add(self.record_key(previous))
+        self.refresh(key for key in keys if key)
+
+    def refresh_for_deleted_record(self, record):
+        key = self.record_key(record)
+        if key:
+            self.refresh([key])
+
+    def lock_dates(self, dates):
+        advisory_xact_lock(
+            advisory_lock_key(self.model._meta.db_table, date.isoformat())
+            for date in dates
+        )
+
+    def get_record_date_range(self, date):
+        return {
+            f'{self.date_field}__gte': beginning_of_day(date),
+            f'{self.date_field}__lt': beginning_of_day(date + datetime.timedelta(days=1)),
+        }
+
+    @transaction.atomic
+    def refresh(self, keys):
+        """
+        Recounts the buckets of the given dates involving any of the given profiles
+        """
+        profile_ids_by_date = collections.defaultdict(lambda: [set() for _ in self.profile_fields])
+        for date, *profile_ids in keys:
+            for profile_id_set, profile_id in zip(profile_ids_by_date[date], profile_ids):
+                if profile_id:
+                    profile_id_set.add(profile_id)
+        if not profile_ids_by_date:
+            return
+
+        self.lock_dates(profile_ids_by_date)
+        for date, profile_id_sets in sorted(profile_ids_by_date.items()):
+            profile_filter = any_of(
+                {f'{field}__in': profile_id_set}
+                for field, profile_id_set in zip(self.profile_fields, profile_id_sets)
+                if profile_id_set
+            )
+            self.filter(profile_filter, date=date).delete()
+            counts = self.get_counted_records().filter(
+                profile_filter, **self.get_record_date_range(date),
+            ).order_by().values(*self.profile_fields).annotate(record_count=Count('pk'))
+            self.bulk_create(
+                self.model(
+                    date=date,
+                    count=row['record_count'],
+                    **{f'{field}_id': row[field] for field in self.profile_fields},
+                )
+                for row in counts
+            )
+
+    @transaction.atomic
+    def rebuild(self, dates):
+        """
+        Recounts all buckets of the given local dates; returns the number of buckets created
+        """
+        dates = sorted(set(dates))
+        if not dates:
+            return 0
+
+        self.lock_dates(dates)
+        self.filter(date__in=dates).delete()
+        counts = self.get_counted_records().filter(
+            # bounds the scan using the date field index
+            **{
+                f'{self.date_field}__gte': beginning_of_day(dates[0]),
+                f'{self.date_field}__lt': beginning_of_day(dates[-1] + datetime.timedelta(days=1)),
+            }
+        ).exclude(
+            **{f'{field}__isnull': True for field in self.profile_fields}
+        ).annotate(
+            record_date=TruncLocalDate(self.date_field),
+        ).filter(
+            record_date__in=dates,
+        ).order_by().values('record_date', *self.profile_fields).annotate(record_count=Count('pk'))
+        return len(self.bulk_create(
+            self.model(
+                date=row['record_date'],
+                count=row['record_count'],
+                **{f'{field}_id': row[field] for field in self.profile_fields},
+            )
+            for row in counts
+        ))
+
+    def count_in_window(self, profile_field, profile_id, count_field, last_date, days):
+        """
+        Equivalent to counting distinct values of `count_field` on the records of a profile
+        received on the `days` local dates ending with `last_date`; missing values count as one
+        """
+        return self.count_in_windows(profile_field, count_field, [(profile_id, last_date)], days)[0]
+
+    def count_in_windows(self, profile_field, count_field, windows, days):
+        """
+        Bulk equivalent of `count_in_window` for a list of (profile id, last date) windows
+        reading the buckets of all of them with one query
+        """
+        windows = list(windows)
+        if not windows:
+            return []
+        period = datetime.timedelta(days=days)
+        buckets = self.filter(**{
+            f'{profile_field}__in': {profile_id for profile_id, _ in windows},
+            'date__gt': min(last_date for _, last_date in windows) - period,
+            'date__lte': max(last_date for _, last_date in windows),
+        }).order_by().values_list(profile_field, 'date', 'pk' if count_field == 'pk' else count_field, 'count')
+        buckets_by_profile = collections.defaultdict(list)
+        for profile_id, *bucket in buckets:
+            buckets_by_profile[profile_id].append(bucket)
+
+        counts = []
+        for profile_id, last_date in windows:
+            buckets = [
+                (counted_value, count)
+                for date, counted_value, count in buckets_by_profile[profile_id]
+                if last_date - period < date <= last_date
+            ]
+            if count_field == 'pk':
+                counts.append(sum(count for _, count in buckets))
+            else:
+                counts.append(len({counted_value for counted_value, _ in buckets}))
+        return counts
+
+
+class DailyCreditProfileCountManager(DailyProfileCountManager):
+    date_field = 'received_at'
+    profile_fields = ('sender_profile', 'prisoner_profile')
+
+    counted_fields = ('resolution',)
+
+    def get_counted_records(self):
+        # same as the credits related to profiles
+        return Credit.objects.all()
+
+    def is_counted(self, record):
+        return record.resolution not in (CreditResolution.initial.value, CreditResolution.failed.value)
+
+
+class DailyDisbursementProfileCountManager(DailyProfileCountManager):
+    date_field = 'created'
+    profile_fields = ('recipient_profile', 'prisoner_profile')
+
+    def get_counted_records(self):
+        from disbursement.models import Disbursement
+
+        return Disbursement.objects.all()
+
+    def is_counted(self, record):
+        return True
+
+
 class MonitoredPartialEmailAddressManager(models.Manager):
+    """
+    Keywords are matched against email addresses using an automaton compiled once per process
+    and rebuilt when the keyword version is bumped by writes in this process;
+    writes by other processes are noticed within `matcher_max_age` seconds
+    """
+    matcher_max_age = 10
+
+    keyword_version = 0
+    # outermost atomic block of each connection's transaction that changed keywords, until committed
+    _uncommitted_keyword_changes = weakref.WeakKeyDictionary()
+    _matcher_cache = None
+
     @classmethod
     def is_email_address_monitored(cls, email_address: str) -> bool:
-        sql = """
-        SELECT EXISTS(
-            SELECT 1
-            FROM security_monitoredpartialemailaddress
-            WHERE %(email_address)s
-                LIKE '%%' || replace(replace("keyword", '%%', E'\\\\%%'), '_', E'\\\\_') || '%%'
-                ESCAPE E'\\\\'
-        );
-        """
-        # NB: escaping of % and _ in the keyword is necessary to have LIKE operator ignore them
-        with connection.cursor() as cursor:
-            cursor.execute(sql, params=dict(email_address=email_address.lower()))
-            return cursor.fetchone()[0]
+        return cls.get_matcher().matches(email_address.lower())
+
+    @classmethod
+    def keywords_changed(cls, using=None):
+        cls.keyword_version += 1
+        db_connection = transaction.get_connection(using)
+        if db_connection.in_atomic_block:
+            # until committed, keywords may yet be rolled back so a matcher compiled from them cannot be kept
+            cls._uncommitted_keyword_changes[db_connection] = db_connection.atomic_blocks[0]
+            transaction.on_commit(functools.partial(cls._keyword_changes_committed, db_connection), using=using)
+
+    @classmethod
+    def _keyword_changes_committed(cls, db_connection):
+        cls._uncommitted_keyword_changes.pop(db_connection, None)
+        cls.keyword_version += 1
+
+    @classmethod
+    def has_uncommitted_keyword_changes(cls, using=None) -> bool:
+        """
+        Whether keywords were changed in the open transaction of this thread's database connection;
+        changes are forgotten once that transaction has ended, even if it was rolled back
+        """
+        db_connection = transaction.get_connection(using)
+        atomic_block = cls._uncommitted_keyword_changes.get(db_connection)
+        if atomic_block is None:
+            return False
+        if db_connection.atomic_blocks and db_connection.atomic_blocks[0] is atomic_block:
+            return True
+        del cls._uncommitted_keyword_changes[db_connection]
+        return False
+
+    @classmethod
+    def get_matcher(cls) -> KeywordMatcher:
+        from security.models import MonitoredPartialEmailAddress
+
+        keywords = MonitoredPartialEmailAddress.objects.all()
+        if cls.has_uncommitted_keyword_changes():
+            return KeywordMatcher(keywords.values_list('keyword', flat=True))
+
+        version = cls.keyword_version
+        cache = cls._matcher_cache
+        now = time.monotonic()
+        if cache and cache['version'] == version and now < cache['expires']:
+            return cache['matcher']
+
+        # cheaply check whether keywords were changed by another process before recompiling
+        fingerprint = keywords.order_by().aggregate(count=Count('pk'), modified=Max('modified'))
+        if cache and cache['version'] == version and cache['fingerprint'] == fingerprint:
+            matcher = cache['matcher']
+        else:
+            matcher = KeywordMatcher(keywords.values_list('keyword', flat=True))
+        cls._matcher_cache = {
+            'version': version,
+            'fingerprint': fingerprint,
+            'expires': now + cls.matcher_max_age,
+            'matcher': matcher,
+        }
+        return matcher
 
 
 class CheckManager(models.Manager):
@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def schedule_profile_total_verification(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.create(
+        name='verify_security_profile_totals',
+        arg_string='',
+        cron_entry='0 3 * * *',
+        next_execution=timezone.now(),
+    )
+
+
+def unschedule_profile_total_verification(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.filter(name='verify_security_profile_totals').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_delete_token'),
+        ('security', '0036_monitoredpartialemailaddress'),
+    ]
+    operations = [
+        migrations.RunPython(schedule_profile_total_verification, reverse_code=unschedule_profile_total_verification),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+populate_relation_counts_sql = [
+    f"""
+    UPDATE security_{profile} SET {count_field} = counts.count
+    FROM (
+        SELECT {profile}_id AS profile_id, COUNT(*) AS count FROM {through_table} GROUP BY {profile}_id
+    ) AS counts
+    WHERE security_{profile}.id = counts.profile_id
+    """
+    for profile, count_field, through_table in (
+        ('senderprofile', 'prisoner_count', 'security_prisonerprofile_senders'),
+        ('senderprofile', 'prison_count', 'security_senderprofile_prisons'),
+        ('recipientprofile', 'prisoner_count', 'security_prisonerprofile_recipients'),
+        ('recipientprofile', 'prison_count', 'security_recipientprofile_prisons'),
+        ('prisonerprofile', 'sender_count', 'security_prisonerprofile_senders'),
+        ('prisonerprofile', 'recipient_count', 'security_prisonerprofile_recipients'),
+    )
+]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('security', '0037_schedule_profile_total_verification'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='senderprofile',
+            name='prisoner_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='senderprofile',
+            name='prison_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipientprofile',
+            name='prisoner_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipientprofile',
+            name='prison_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prisonerprofile',
+            name='sender_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prisonerprofile',
+            name='recipient_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(populate_relation_counts_sql, reverse_sql=migrations.RunSQL.noop),
+    ]
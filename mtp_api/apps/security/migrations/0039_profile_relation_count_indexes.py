@@ -0,0 +1,37 @@
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('security', '0038_profile_relation_counts'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='senderprofile',
+            index=models.Index(fields=['prisoner_count'], name='security_se_prisone_bd3593_idx'),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='senderprofile',
+            index=models.Index(fields=['prison_count'], name='security_se_prison__efc6f4_idx'),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='recipientprofile',
+            index=models.Index(fields=['prisoner_count'], name='security_re_prisone_cfe268_idx'),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='recipientprofile',
+            index=models.Index(fields=['prison_count'], name='security_re_prison__0394de_idx'),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='prisonerprofile',
+            index=models.Index(fields=['sender_count'], name='security_pr_sender__2226ca_idx'),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='prisonerprofile',
+            index=models.Index(fields=['recipient_count'], name='security_pr_recipie_e6dc0e_idx'),
+        ),
+    ]
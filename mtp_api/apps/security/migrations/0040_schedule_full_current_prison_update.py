@@ -0,0 +1,27 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def schedule_full_current_prison_update(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.create(
+        name='update_current_prisons',
+        arg_string='--all',
+        cron_entry='0 4 * * *',
+        next_execution=timezone.now(),
+    )
+
+
+def unschedule_full_current_prison_update(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.filter(name='update_current_prisons', arg_string='--all').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_delete_token'),
+        ('security', '0039_profile_relation_count_indexes'),
+    ]
+    operations = [
+        migrations.RunPython(schedule_full_current_prison_update, reverse_code=unschedule_full_current_prison_update),
+    ]
@@ -0,0 +1,68 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('security', '0040_schedule_full_current_prison_update'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='senderprofile',
+            name='search_document',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='prisonerprofile',
+            name='search_document',
+            field=models.TextField(blank=True, default=''),
+        ),
+        # mirrors the search_document_expression of profile querysets;
+        # subsequent changes are kept in step by the application
+        migrations.RunSQL(
+            sql="""
+                UPDATE security_senderprofile SET search_document = LOWER(CONCAT_WS(
+                    E'\\n',
+                    '',
+                    (
+                        SELECT STRING_AGG(sender_name, E'\\n') FROM security_banktransfersenderdetails
+                        WHERE sender_id = security_senderprofile.id
+                    ),
+                    (
+                        SELECT STRING_AGG(name, E'\\n') FROM security_cardholdername
+                        JOIN security_debitcardsenderdetails AS details ON details.id = debit_card_sender_details_id
+                        WHERE details.sender_id = security_senderprofile.id
+                    ),
+                    (
+                        SELECT STRING_AGG(email, E'\\n') FROM security_senderemail
+                        JOIN security_debitcardsenderdetails AS details ON details.id = debit_card_sender_details_id
+                        WHERE details.sender_id = security_senderprofile.id
+                    ),
+                    (
+                        SELECT STRING_AGG(postcode, E'\\n') FROM security_debitcardsenderdetails
+                        WHERE sender_id = security_senderprofile.id
+                    ),
+                    ''
+                ))
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE security_prisonerprofile SET search_document = LOWER(CONCAT_WS(
+                    E'\\n',
+                    '',
+                    prisoner_name,
+                    prisoner_number,
+                    (
+                        SELECT STRING_AGG(name, E'\\n') FROM security_providedprisonername
+                        WHERE prisoner_id = security_prisonerprofile.id
+                    ),
+                    ''
+                ))
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.contrib.postgres import operations
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('security', '0041_profile_search_documents'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='senderprofile',
+            index=GinIndex(fields=['search_document'], name='sender_search_document_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='prisonerprofile',
+            index=GinIndex(
+                fields=['search_document'], name='prisoner_search_document_trgm', opclasses=['gin_trgm_ops'],
+            ),
+        ),
+    ]
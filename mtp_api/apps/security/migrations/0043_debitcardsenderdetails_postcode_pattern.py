@@ -0,0 +1,20 @@
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('security', '0042_profile_search_document_trgm'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='debitcardsenderdetails',
+            index=models.Index(
+                fields=['postcode'], name='debitcard_postcode_pattern',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def schedule_daily_profile_count_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    # build all counts once in the background rather than during deployment
+    cls.objects.create(
+        name='update_daily_profile_counts',
+        arg_string='--all',
+        cron_entry='* * * * *',
+        next_execution=timezone.now(),
+        delete_after_next=True,
+    )
+    cls.objects.create(
+        name='update_daily_profile_counts',
+        arg_string='',
+        cron_entry='45 2 * * *',
+        next_execution=timezone.now(),
+    )
+
+
+def unschedule_daily_profile_count_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.filter(name='update_daily_profile_counts').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_delete_token'),
+        ('security', '0043_debitcardsenderdetails_postcode_pattern'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCreditProfileCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.IntegerField()),
+                ('prisoner_profile', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='security.prisonerprofile')),
+                ('sender_profile', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='security.senderprofile')),
+            ],
+            options={
+                'ordering': ('date',),
+                'indexes': [
+                    models.Index(fields=['sender_profile', 'date'], name='security_da_sender__5936c9_idx'),
+                    models.Index(fields=['prisoner_profile', 'date'], name='security_da_prisone_537e6d_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyDisbursementProfileCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.IntegerField()),
+                ('prisoner_profile', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='security.prisonerprofile')),
+                ('recipient_profile', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='security.recipientprofile')),
+            ],
+            options={
+                'ordering': ('date',),
+                'indexes': [
+                    models.Index(fields=['recipient_profile', 'date'], name='security_da_recipie_745e33_idx'),
+                    models.Index(fields=['prisoner_profile', 'date'], name='security_da_prisone_fd6fcc_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(
+            schedule_daily_profile_count_updates,
+            reverse_code=unschedule_daily_profile_count_updates,
+        ),
+    ]
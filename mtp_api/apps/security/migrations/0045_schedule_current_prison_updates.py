@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def schedule_current_prison_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    # a permanent job cannot miss changes recorded while a one-off job is finishing
+    cls.objects.filter(name='update_current_prisons', arg_string='').delete()
+    cls.objects.create(
+        name='update_current_prisons',
+        arg_string='',
+        cron_entry='*/10 * * * *',
+        next_execution=timezone.now(),
+    )
+
+
+def unschedule_current_prison_updates(apps, schema_editor):
+    cls = apps.get_model('core', 'ScheduledCommand')
+    cls.objects.filter(name='update_current_prisons', arg_string='').delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0005_delete_token'),
+        ('security', '0044_daily_profile_counts'),
+    ]
+    operations = [
+        migrations.RunPython(schedule_current_prison_updates, reverse_code=unschedule_current_prison_updates),
+    ]
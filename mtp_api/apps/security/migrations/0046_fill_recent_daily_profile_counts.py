@@ -0,0 +1,54 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# covers the longest counting rule window so that rules are correct before the background rebuild completes
+RECENT_DAYS = 31
+
+
+def fill_counts(records, count_model, date_field, profile_fields):
+    end_date = timezone.localdate()
+    start_date = end_date - datetime.timedelta(days=RECENT_DAYS - 1)
+    tz = timezone.get_current_timezone()
+    count_model.objects.filter(date__gte=start_date).delete()
+    counts = records.filter(**{
+        f'{date_field}__gte': timezone.make_aware(datetime.datetime.combine(start_date, datetime.time.min), tz),
+    }).exclude(
+        **{f'{field}__isnull': True for field in profile_fields}
+    ).annotate(
+        record_date=TruncDate(date_field, tzinfo=tz),
+    ).order_by().values('record_date', *profile_fields).annotate(record_count=models.Count('pk'))
+    count_model.objects.bulk_create(
+        count_model(
+            date=row['record_date'],
+            count=row['record_count'],
+            **{f'{field}_id': row[field] for field in profile_fields},
+        )
+        for row in counts
+    )
+
+
+def fill_recent_daily_profile_counts(apps, schema_editor):
+    credits = apps.get_model('credit', 'Credit').objects.exclude(resolution__in=('initial', 'failed'))
+    fill_counts(
+        credits, apps.get_model('security', 'DailyCreditProfileCount'),
+        'received_at', ('sender_profile', 'prisoner_profile'),
+    )
+    disbursements = apps.get_model('disbursement', 'Disbursement').objects.all()
+    fill_counts(
+        disbursements, apps.get_model('security', 'DailyDisbursementProfileCount'),
+        'created', ('recipient_profile', 'prisoner_profile'),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('credit', '0046_schedule_credit_prison_updates'),
+        ('disbursement', '0022_disbursement_normalised_postcode_index'),
+        ('security', '0045_schedule_current_prison_updates'),
+    ]
+    operations = [
+        migrations.RunPython(fill_recent_daily_profile_counts, reverse_code=migrations.RunPython.noop),
+    ]
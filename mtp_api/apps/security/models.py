@@ -3,23 +3,24 @@ import logging
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
 from django.core.validators import MinLengthValidator
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 from model_utils.models import TimeStampedModel
 
-from core.models import ScheduledCommand
 from prison.models import Prison
 from security.constants import CheckStatus
 from security.managers import (
     PrisonerProfileManager, SenderProfileManager, RecipientProfileManager,
+    DailyCreditProfileCountManager, DailyDisbursementProfileCountManager,
     MonitoredPartialEmailAddressManager,
     CheckManager, CheckAutoAcceptRuleManager,
 )
-from security.signals import prisoner_profile_current_prisons_need_updating
 
 logger = logging.getLogger('mtp')
 
@@ -27,9 +28,14 @@ logger = logging.getLogger('mtp')
 class SenderProfile(TimeStampedModel):
     credit_count = models.BigIntegerField(default=0)
     credit_total = models.BigIntegerField(default=0)
+    prisoner_count = models.IntegerField(default=0)
+    prison_count = models.IntegerField(default=0)
 
     prisons = models.ManyToManyField(Prison, related_name='senders')
 
+    # lower-cased sender names, emails and postcodes used to narrow text searches with a trigram index
+    search_document = models.TextField(blank=True, default='')
+
     objects = SenderProfileManager()
 
     class Meta:
@@ -37,6 +43,9 @@ class SenderProfile(TimeStampedModel):
         indexes = [
             models.Index(fields=['credit_count']),
             models.Index(fields=['credit_total']),
+            models.Index(fields=['prisoner_count']),
+            models.Index(fields=['prison_count']),
+            GinIndex(fields=['search_document'], name='sender_search_document_trgm', opclasses=['gin_trgm_ops']),
         ]
 
     def __str__(self):
@@ -61,11 +70,15 @@ class SenderProfile(TimeStampedModel):
 
     def add_prison(self, prison):
         logger.info('Associating Sender Profile: %s with Prison %s', self, prison)
-        self.prisons.add(prison)
+        _, created = self.prisons.through.objects.get_or_create(senderprofile_id=self.pk, prison_id=prison.pk)
+        if created:
+            SenderProfile.objects.filter(pk=self.pk).increment_relation_count('prison_count')
 
     def remove_prison(self, prison):
         logger.info('Removing association between Sender Profile %s and Prison %s', self, prison)
-        self.prisons.remove(prison)
+        removed, _ = self.prisons.through.objects.filter(senderprofile_id=self.pk, prison_id=prison.pk).delete()
+        if removed:
+            SenderProfile.objects.filter(pk=self.pk).increment_relation_count('prison_count', -1)
 
 
 class BankAccount(models.Model):
@@ -109,6 +122,7 @@ class BankTransferSenderDetails(TimeStampedModel):
 class DebitCardSenderDetails(TimeStampedModel):
     card_number_last_digits = models.CharField(max_length=4, blank=True, null=True, db_index=True)
     card_expiry_date = models.CharField(max_length=5, blank=True, null=True)
+    # stored normalised, see BillingAddress.normalised_postcode
     postcode = models.CharField(max_length=250, blank=True, null=True, db_index=True)
     sender = models.ForeignKey(
         SenderProfile, on_delete=models.CASCADE, related_name='debit_card_details'
@@ -124,6 +138,9 @@ class DebitCardSenderDetails(TimeStampedModel):
         unique_together = (
             ('card_number_last_digits', 'card_expiry_date', 'postcode',),
         )
+        indexes = [
+            models.Index(fields=['postcode'], name='debitcard_postcode_pattern', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return '%s %s' % (self.card_number_last_digits, self.card_expiry_date)
@@ -160,6 +177,8 @@ class SenderEmail(models.Model):
 class RecipientProfile(TimeStampedModel):
     disbursement_count = models.BigIntegerField(default=0)
     disbursement_total = models.BigIntegerField(default=0)
+    prisoner_count = models.IntegerField(default=0)
+    prison_count = models.IntegerField(default=0)
 
     prisons = models.ManyToManyField(Prison, related_name='recipients')
 
@@ -170,6 +189,8 @@ class RecipientProfile(TimeStampedModel):
         indexes = [
             models.Index(fields=['disbursement_count']),
             models.Index(fields=['disbursement_total']),
+            models.Index(fields=['prisoner_count']),
+            models.Index(fields=['prison_count']),
         ]
 
     def __str__(self):
@@ -181,6 +202,11 @@ class RecipientProfile(TimeStampedModel):
             return details.recipient_bank_account.monitoring_users
         return User.objects.none()
 
+    def add_prison(self, prison):
+        _, created = self.prisons.through.objects.get_or_create(recipientprofile_id=self.pk, prison_id=prison.pk)
+        if created:
+            RecipientProfile.objects.filter(pk=self.pk).increment_relation_count('prison_count')
+
 
 class BankTransferRecipientDetails(TimeStampedModel):
     recipient_bank_account = models.ForeignKey(
@@ -200,6 +226,8 @@ class PrisonerProfile(TimeStampedModel):
     credit_total = models.BigIntegerField(default=0)
     disbursement_count = models.BigIntegerField(default=0)
     disbursement_total = models.BigIntegerField(default=0)
+    sender_count = models.IntegerField(default=0)
+    recipient_count = models.IntegerField(default=0)
 
     prisoner_name = models.CharField(max_length=250)
     prisoner_number = models.CharField(max_length=250, db_index=True)
@@ -216,6 +244,9 @@ class PrisonerProfile(TimeStampedModel):
         User, related_name='monitored_prisoners'
     )
 
+    # lower-cased prisoner and provided names used to narrow text searches with a trigram index
+    search_document = models.TextField(blank=True, default='')
+
     objects = PrisonerProfileManager()
 
     class Meta:
@@ -228,6 +259,9 @@ class PrisonerProfile(TimeStampedModel):
             models.Index(fields=['credit_total']),
             models.Index(fields=['disbursement_count']),
             models.Index(fields=['disbursement_total']),
+            models.Index(fields=['sender_count']),
+            models.Index(fields=['recipient_count']),
+            GinIndex(fields=['search_document'], name='prisoner_search_document_trgm', opclasses=['gin_trgm_ops']),
         ]
 
     def __str__(self):
@@ -238,11 +272,29 @@ class PrisonerProfile(TimeStampedModel):
 
     def add_sender(self, sender_profile):
         logger.info('Associating Prisoner Profile: %s with Sender Profile %s', self, sender_profile)
-        self.senders.add(sender_profile)
+        _, created = self.senders.through.objects.get_or_create(
+            prisonerprofile_id=self.pk, senderprofile_id=sender_profile.pk,
+        )
+        if created:
+            PrisonerProfile.objects.filter(pk=self.pk).increment_relation_count('sender_count')
+            SenderProfile.objects.filter(pk=sender_profile.pk).increment_relation_count('prisoner_count')
 
     def remove_sender(self, sender_profile):
         logger.info('Removing association between Prisoner Profile %s and Sender Profile %s', self, sender_profile)
-        self.senders.remove(sender_profile)
+        removed, _ = self.senders.through.objects.filter(
+            prisonerprofile_id=self.pk, senderprofile_id=sender_profile.pk,
+        ).delete()
+        if removed:
+            PrisonerProfile.objects.filter(pk=self.pk).increment_relation_count('sender_count', -1)
+            SenderProfile.objects.filter(pk=sender_profile.pk).increment_relation_count('prisoner_count', -1)
+
+    def add_recipient(self, recipient_profile):
+        _, created = self.recipients.through.objects.get_or_create(
+            prisonerprofile_id=self.pk, recipientprofile_id=recipient_profile.pk,
+        )
+        if created:
+            PrisonerProfile.objects.filter(pk=self.pk).increment_relation_count('recipient_count')
+            RecipientProfile.objects.filter(pk=recipient_profile.pk).increment_relation_count('prisoner_count')
 
     def add_prison(self, prison):
         logger.info('Associating Prisoner Profile: %s with Prison %s', self, prison)
@@ -263,6 +315,62 @@ class ProvidedPrisonerName(models.Model):
         return self.name
 
 
+class DailyCreditProfileCount(models.Model):
+    """
+    Number of counted credits received on a local date from a sender profile to a prisoner profile,
+    maintained as credits are saved and given profiles
+    """
+    date = models.DateField()
+    sender_profile = models.ForeignKey(
+        SenderProfile, on_delete=models.CASCADE, null=True, related_name='+', db_index=False,
+    )
+    prisoner_profile = models.ForeignKey(
+        PrisonerProfile, on_delete=models.CASCADE, null=True, related_name='+', db_index=False,
+    )
+    count = models.IntegerField()
+
+    objects = DailyCreditProfileCountManager()
+
+    class Meta:
+        ordering = ('date',)
+        indexes = [
+            models.Index(fields=['sender_profile', 'date']),
+            models.Index(fields=['prisoner_profile', 'date']),
+        ]
+
+    def __str__(self):
+        return '%s %s → %s: %d credits' % (self.date, self.sender_profile_id, self.prisoner_profile_id, self.count)
+
+
+class DailyDisbursementProfileCount(models.Model):
+    """
+    Number of disbursements created on a local date from a prisoner profile to a recipient profile,
+    maintained as disbursements are saved
+    """
+    date = models.DateField()
+    recipient_profile = models.ForeignKey(
+        RecipientProfile, on_delete=models.CASCADE, null=True, related_name='+', db_index=False,
+    )
+    prisoner_profile = models.ForeignKey(
+        PrisonerProfile, on_delete=models.CASCADE, null=True, related_name='+', db_index=False,
+    )
+    count = models.IntegerField()
+
+    objects = DailyDisbursementProfileCountManager()
+
+    class Meta:
+        ordering = ('date',)
+        indexes = [
+            models.Index(fields=['recipient_profile', 'date']),
+            models.Index(fields=['prisoner_profile', 'date']),
+        ]
+
+    def __str__(self):
+        return '%s %s → %s: %d disbursements' % (
+            self.date, self.prisoner_profile_id, self.recipient_profile_id, self.count,
+        )
+
+
 class SavedSearch(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     description = models.CharField(max_length=255)
@@ -307,6 +415,12 @@ class MonitoredPartialEmailAddress(TimeStampedModel):
         return self.keyword in email_address.lower()
 
 
+@receiver(post_save, sender=MonitoredPartialEmailAddress, dispatch_uid='monitored_partial_email_address_saved')
+@receiver(post_delete, sender=MonitoredPartialEmailAddress, dispatch_uid='monitored_partial_email_address_deleted')
+def monitored_partial_email_addresses_changed(**kwargs):
+    MonitoredPartialEmailAddress.objects.keywords_changed()
+
+
 class Check(TimeStampedModel):
     credit = models.OneToOneField(
         'credit.Credit',
@@ -453,12 +567,24 @@ class CheckAutoAcceptRuleState(TimeStampedModel):
         ordering = ('created',)
 
 
-@receiver(prisoner_profile_current_prisons_need_updating)
-def update_current_prisons(**kwargs):
-    job = ScheduledCommand(
-        name='update_current_prisons',
-        arg_string='',
-        cron_entry='*/10 * * * *',
-        delete_after_next=True
-    )
-    job.save()
+@receiver(post_save, sender='credit.Credit', dispatch_uid='update_daily_profile_counts_for_credit')
+def update_daily_profile_counts_for_credit(instance, created, **kwargs):
+    DailyCreditProfileCount.objects.refresh_for_saved_record(instance, created)
+
+
+@receiver(post_delete, sender='credit.Credit', dispatch_uid='update_daily_profile_counts_for_deleted_credit')
+def update_daily_profile_counts_for_deleted_credit(instance, **kwargs):
+    DailyCreditProfileCount.objects.refresh_for_deleted_record(instance)
+
+
+@receiver(post_save, sender='disbursement.Disbursement', dispatch_uid='update_daily_profile_counts_for_disbursement')
+def update_daily_profile_counts_for_disbursement(instance, created, **kwargs):
+    DailyDisbursementProfileCount.objects.refresh_for_saved_record(instance, created)
+
+
+@receiver(
+    post_delete, sender='disbursement.Disbursement',
+    dispatch_uid='update_daily_profile_counts_for_deleted_disbursement',
+)
+def update_daily_profile_counts_for_deleted_disbursement(instance, **kwargs):
+    DailyDisbursementProfileCount.objects.refresh_for_deleted_record(instance)
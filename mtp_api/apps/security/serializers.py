@@ -87,9 +87,7 @@ class SenderProfileSerializer(serializers.ModelSerializer):
     bank_transfer_details = BankTransferSenderDetailsSerializer(many=True)
     debit_card_details = DebitCardSenderDetailsSerializer(many=True)
 
-    # return None where this is a nested serializer
-    prisoner_count = serializers.IntegerField(required=False)
-    prison_count = serializers.IntegerField(required=False)
+    # annotated by the profile views so None where this is a nested serializer
     monitoring = serializers.BooleanField(required=False)
 
     class Meta:
@@ -114,9 +112,7 @@ class PrisonerProfileSerializer(serializers.ModelSerializer):
     current_prison = PrisonSerializer()
     provided_names = serializers.SerializerMethodField()
 
-    # return None where this is a nested serializer
-    sender_count = serializers.IntegerField(required=False)
-    recipient_count = serializers.IntegerField(required=False)
+    # annotated by the profile views so None where this is a nested serializer
     monitoring = serializers.BooleanField(required=False)
 
     class Meta:
@@ -167,9 +163,7 @@ class BankTransferRecipientDetailsSerializer(serializers.ModelSerializer):
 class RecipientProfileSerializer(serializers.ModelSerializer):
     bank_transfer_details = BankTransferRecipientDetailsSerializer(many=True)
 
-    # return None where this is a nested serializer
-    prisoner_count = serializers.IntegerField(required=False)
-    prison_count = serializers.IntegerField(required=False)
+    # annotated by the profile views so None where this is a nested serializer
     monitoring = serializers.BooleanField(required=False)
 
     class Meta:
@@ -1,3 +0,0 @@
-from django.dispatch import Signal
-
-prisoner_profile_current_prisons_need_updating = Signal()
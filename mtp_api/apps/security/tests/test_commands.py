@@ -1,34 +1,48 @@
-from django.core.management import call_command
-from django.test import TestCase
+import datetime
+import functools
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 from django.utils.crypto import get_random_string
-from django.test.utils import captured_stdout
+from django.test.utils import CaptureQueriesContext, captured_stdout
 from faker import Faker
 from model_bakery import baker
 
 from mtp_common.test_utils import silence_logger
 
+from core.models import ScheduledCommand
 from credit.constants import CreditResolution
 from credit.models import Credit
 from core.tests.utils import make_test_users, delete_non_related_nullable_fields
+from core.utils import beginning_of_day
 from disbursement.constants import DisbursementResolution, DisbursementMethod
 from disbursement.models import Disbursement
-from disbursement.tests.utils import generate_disbursements, generate_initial_disbursement_data, create_disbursements
+from disbursement.tests.utils import (
+    create_disbursements, fake_disbursement, generate_disbursements, generate_initial_disbursement_data,
+)
 
+from notification.models import DisbursementEvent
 from payment.models import Payment
 from payment.tests.utils import create_payments, generate_payments, generate_initial_payment_data
-from prison.models import PrisonerLocation, Prison
+from prison.models import PrisonerLocation, PrisonerLocationChange, Prison
 from prison.tests.utils import load_random_prisoner_locations
 from security.models import (
     SenderProfile, PrisonerProfile, RecipientProfile,
     BankAccount, BankTransferSenderDetails, DebitCardSenderDetails,
     SavedSearch, SearchFilter,
+    DailyCreditProfileCount, DailyDisbursementProfileCount,
 )
 from transaction.tests.utils import create_transactions, generate_initial_transactions_data, generate_transactions
 from transaction.models import Transaction
 
+User = get_user_model()
+
 
-class UpdateSecurityProfilesTestCase(TestCase):
+class UpdateSecurityProfilesTestMixin:
     fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
 
     def setUp(self):
@@ -101,6 +115,12 @@ class UpdateSecurityProfilesTestCase(TestCase):
             0
         )
 
+        for model in (SenderProfile, PrisonerProfile, RecipientProfile):
+            self.assertFalse(model.objects.all().relation_count_mismatches().exists())
+
+
+
+class UpdateSecurityProfilesTestCase(UpdateSecurityProfilesTestMixin, TestCase):
     @captured_stdout()
     @silence_logger()
     def test_update_security_profiles_initial(self):
@@ -110,6 +130,161 @@ class UpdateSecurityProfilesTestCase(TestCase):
         call_command('update_security_profiles', verbosity=0)
         self._assert_counts()
 
+    @captured_stdout()
+    @silence_logger()
+    def test_update_security_profiles_sharded(self):
+        generate_transactions(transaction_batch=100, days_of_history=5)
+        generate_payments(payment_batch=100, days_of_history=5)
+        generate_disbursements(disbursement_batch=100, days_of_history=5)
+        call_command('update_security_profiles', '--workers', '1', '--shards', '4', '--batch-size', '20', verbosity=0)
+        self._assert_counts()
+        self.assertFalse(Credit.objects.filter(sender_profile__isnull=True).exists())
+
+    @captured_stdout()
+    @silence_logger()
+    def test_sharded_disbursements_notified_when_profile_shards_are_skipped(self):
+        generate_disbursements(disbursement_batch=50, days_of_history=5)
+        call_command('update_security_profiles', '--workers', '1', '--shards', '4', verbosity=0)
+
+        prisoner_profile = PrisonerProfile.objects.filter(disbursements__isnull=False).first()
+        prisoner_profile.monitoring_users.add(User.objects.first())
+        disbursement = fake_disbursement(
+            prison=prisoner_profile.prisons.first(),
+            prisoner_number=prisoner_profile.prisoner_number,
+            prisoner_name=prisoner_profile.prisoner_name,
+            method=DisbursementMethod.cheque,
+            resolution=DisbursementResolution.sent,
+        )
+
+        # e.g. another run holds every profile shard lock
+        with mock.patch(
+            'security.management.commands.update_security_profiles.process_profile_shard', return_value=None,
+        ):
+            call_command('update_security_profiles', '--workers', '1', '--shards', '4', verbosity=0)
+        self.assertTrue(DisbursementEvent.objects.filter(disbursement=disbursement).exists())
+        self._assert_counts()
+
+    @captured_stdout()
+    @silence_logger()
+    def test_verify_security_profile_totals_corrects_drift(self):
+        generate_transactions(transaction_batch=100, days_of_history=5)
+        generate_payments(payment_batch=100, days_of_history=5)
+        call_command('update_security_profiles', verbosity=0)
+        call_command('verify_security_profile_totals', '--check', verbosity=0)
+
+        sender_profile = SenderProfile.objects.filter(credit_count__gt=0).first()
+        prisoner_profile = PrisonerProfile.objects.filter(credit_count__gt=0).first()
+        SenderProfile.objects.filter(pk=sender_profile.pk).update(credit_total=sender_profile.credit_total + 100)
+        PrisonerProfile.objects.filter(pk=prisoner_profile.pk).update(credit_count=0)
+        with self.assertRaises(CommandError):
+            call_command('verify_security_profile_totals', '--check', verbosity=0)
+
+        call_command('verify_security_profile_totals', verbosity=0)
+        call_command('verify_security_profile_totals', '--check', verbosity=0)
+        self._assert_counts()
+
+    @captured_stdout()
+    @silence_logger()
+    def test_update_daily_profile_counts_matches_records(self):
+        generate_transactions(transaction_batch=100, days_of_history=5)
+        generate_payments(payment_batch=100, days_of_history=5)
+        generate_disbursements(disbursement_batch=100, days_of_history=5)
+        call_command('update_security_profiles', verbosity=0)
+
+        def get_counts(model):
+            return sorted(model.objects.values_list(*(
+                ('date', 'sender_profile', 'prisoner_profile', 'count')
+                if model is DailyCreditProfileCount else
+                ('date', 'recipient_profile', 'prisoner_profile', 'count')
+            )))
+
+        # counts maintained as records are saved and given profiles match a rebuild
+        maintained_counts = get_counts(DailyCreditProfileCount), get_counts(DailyDisbursementProfileCount)
+        self.assertTrue(all(maintained_counts))
+        DailyCreditProfileCount.objects.filter(pk__in=DailyCreditProfileCount.objects.values('pk')[:5]).delete()
+        DailyDisbursementProfileCount.objects.update(count=0)
+        call_command('update_daily_profile_counts', '--all', verbosity=0)
+        self.assertEqual((get_counts(DailyCreditProfileCount), get_counts(DailyDisbursementProfileCount)),
+                         maintained_counts)
+
+        last_date = timezone.localdate()
+        for sender_profile in SenderProfile.objects.all():
+            credits = sender_profile.credits.filter(
+                received_at__gte=beginning_of_day(last_date - datetime.timedelta(days=7)),
+                received_at__lt=beginning_of_day(last_date + datetime.timedelta(days=1)),
+            )
+            count_in_window = functools.partial(
+                DailyCreditProfileCount.objects.count_in_window,
+                'sender_profile', sender_profile.pk, last_date=last_date, days=8,
+            )
+            self.assertEqual(
+                count_in_window(count_field='prisoner_profile'),
+                credits.values('prisoner_profile').distinct().count(),
+            )
+            self.assertEqual(count_in_window(count_field='pk'), credits.count())
+
+    @captured_stdout()
+    @silence_logger()
+    def test_daily_profile_counts_refreshed_only_when_keys_change(self):
+        generate_transactions(transaction_batch=50, days_of_history=5)
+        call_command('update_security_profiles', verbosity=0)
+
+        def get_counts():
+            return sorted(DailyCreditProfileCount.objects.values_list(
+                'date', 'sender_profile', 'prisoner_profile', 'count',
+            ))
+
+        credit = Credit.objects.filter(sender_profile__isnull=False, prisoner_profile__isnull=False).first()
+        credit.reviewed = not credit.reviewed
+        with CaptureQueriesContext(connection) as queries:
+            credit.save()
+        self.assertFalse(any('dailycreditprofilecount' in query['sql'] for query in queries))
+
+        # moved buckets match a rebuild
+        credit.received_at -= datetime.timedelta(days=10)
+        credit.save()
+        maintained_counts = get_counts()
+        call_command('update_daily_profile_counts', '--all', verbosity=0)
+        self.assertEqual(get_counts(), maintained_counts)
+
+    @captured_stdout()
+    @silence_logger()
+    def test_update_current_prisons_corrects_relation_counts(self):
+        generate_transactions(transaction_batch=100, days_of_history=5)
+        generate_payments(payment_batch=100, days_of_history=5)
+        generate_disbursements(disbursement_batch=100, days_of_history=5)
+        call_command('update_security_profiles', verbosity=0)
+        sender_profile = SenderProfile.objects.filter(prisoner_count__gt=0).first()
+        self.assertEqual(sender_profile.prisoner_count, sender_profile.prisoners.count())
+        self.assertEqual(sender_profile.prison_count, sender_profile.prisons.count())
+
+        SenderProfile.objects.update(prisoner_count=0, prison_count=0)
+        PrisonerProfile.objects.update(sender_count=0, recipient_count=0)
+        RecipientProfile.objects.update(prisoner_count=0, prison_count=0)
+        call_command('update_current_prisons', '--all', verbosity=0)
+        self._assert_counts()
+
+    @captured_stdout()
+    @silence_logger()
+    def test_linking_single_profiles_adjusts_relation_counts(self):
+        generate_transactions(transaction_batch=50, days_of_history=5)
+        call_command('update_security_profiles', verbosity=0)
+        sender_profile = SenderProfile.objects.first()
+        prisoner_profile = PrisonerProfile.objects.exclude(senders=sender_profile).first()
+        prison = Prison.objects.exclude(pk__in=sender_profile.prisons.values('pk')).first()
+
+        # linking or unlinking twice only changes counts once
+        for _ in range(2):
+            prisoner_profile.add_sender(sender_profile)
+            sender_profile.add_prison(prison)
+            self._assert_counts()
+        self.assertIn(prison, sender_profile.prisons.all())
+        for _ in range(2):
+            prisoner_profile.remove_sender(sender_profile)
+            sender_profile.remove_prison(prison)
+            self._assert_counts()
+        self.assertNotIn(sender_profile, prisoner_profile.senders.all())
+
     @captured_stdout()
     @silence_logger()
     def test_update_security_profiles_subsequent_bank_transfer(self):
@@ -376,6 +551,23 @@ class UpdateSecurityProfilesTestCase(TestCase):
         self._assert_counts()
 
 
+class ParallelUpdateSecurityProfilesTestCase(UpdateSecurityProfilesTestMixin, TransactionTestCase):
+    # worker processes use their own connections so cannot see data in an uncommitted test transaction
+
+    @captured_stdout()
+    @silence_logger()
+    def test_update_security_profiles_with_worker_processes(self):
+        generate_transactions(transaction_batch=50, days_of_history=5)
+        generate_payments(payment_batch=50, days_of_history=5)
+        generate_disbursements(disbursement_batch=50, days_of_history=5)
+        call_command('update_security_profiles', '--workers', '2', '--shards', '4', '--batch-size', '20', verbosity=0)
+        self._assert_counts()
+        self.assertFalse(Credit.objects.filter(sender_profile__isnull=True).exists())
+        self.assertFalse(Disbursement.objects.filter(
+            recipient_profile__isnull=True, resolution=DisbursementResolution.sent,
+        ).exists())
+
+
 class UpdateCurrentPrisonsTestCase(TestCase):
     fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
 
@@ -407,6 +599,47 @@ class UpdateCurrentPrisonsTestCase(TestCase):
         call_command('update_current_prisons')
         check_locations()
 
+    @captured_stdout()
+    @silence_logger()
+    def test_update_current_prisons_for_changed_locations(self):
+        generate_transactions(transaction_batch=100, days_of_history=5)
+        generate_payments(payment_batch=100, days_of_history=5)
+        call_command('update_security_profiles', verbosity=0)
+
+        prisoner_profile = PrisonerProfile.objects.filter(current_prison__isnull=False).first()
+        new_prison = Prison.objects.exclude(pk=prisoner_profile.current_prison_id).first()
+        PrisonerLocation.objects.bulk_create(
+            PrisonerLocation(
+                prisoner_name=location.prisoner_name,
+                prisoner_number=location.prisoner_number,
+                prisoner_dob=location.prisoner_dob,
+                prison=new_prison if location.prisoner_number == prisoner_profile.prisoner_number else location.prison,
+                active=False,
+            )
+            for location in PrisonerLocation.objects.filter(active=True)
+        )
+        PrisonerLocationChange.objects.record_upload()
+        PrisonerLocation.objects.filter(active=True).delete()
+        PrisonerLocation.objects.filter(active=False).update(active=True)
+        self.assertTrue(PrisonerLocationChange.objects.exists())
+
+        call_command('update_current_prisons', verbosity=0)
+        prisoner_profile.refresh_from_db()
+        self.assertEqual(prisoner_profile.current_prison, new_prison)
+        self.assertFalse(PrisonerLocationChange.objects.filter(prisoner_profiles_updated=False).exists())
+
+        # changes are kept until they are also applied to credits
+        self.assertTrue(PrisonerLocationChange.objects.exists())
+        call_command('update_credit_prisons', verbosity=0)
+        self.assertFalse(PrisonerLocationChange.objects.exists())
+
+    def test_changed_locations_are_applied_by_permanent_jobs(self):
+        jobs = ScheduledCommand.objects.filter(name='update_current_prisons').order_by('arg_string')
+        self.assertListEqual(
+            list(jobs.values_list('arg_string', 'cron_entry', 'delete_after_next')),
+            [('', '*/10 * * * *', False), ('--all', '0 4 * * *', False)],
+        )
+
 
 class BulkUnmonitorCommandTestCase(TestCase):
     fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
@@ -1,6 +1,6 @@
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from django.test import TestCase
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase
 
 from security.models import MonitoredPartialEmailAddress
 
@@ -50,3 +50,46 @@ class MonitoredPartialEmailAddressTestCase(TestCase):
         self.assertFalse(MonitoredPartialEmailAddress.objects.is_email_address_monitored('123456@mail.local'))
         self.assertFalse(model.matches('12356@mail.local'))
         self.assertFalse(model.matches('123456@mail.local'))
+
+    def test_compiled_matcher_reused_until_keywords_change(self):
+        manager = MonitoredPartialEmailAddress.objects
+        # leave no compiled matcher for other tests as their keywords are rolled back
+        self.addCleanup(manager.keywords_changed)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MonitoredPartialEmailAddress.objects.create(keyword='newer')
+        self.assertTrue(manager.is_email_address_monitored('newer@mail.local'))
+        with self.assertNumQueries(0):
+            self.assertTrue(manager.is_email_address_monitored('very-bad@mail.local'))
+            self.assertFalse(manager.is_email_address_monitored('super-good@mail.local'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sample_model.delete()
+        self.assertFalse(manager.is_email_address_monitored('very-bad@mail.local'))
+        self.assertTrue(manager.is_email_address_monitored('some-words@mail.local'))
+
+    def test_uncommitted_keywords_not_kept(self):
+        manager = MonitoredPartialEmailAddress.objects
+        MonitoredPartialEmailAddress.objects.create(keyword='newer')
+        self.assertTrue(manager.has_uncommitted_keyword_changes())
+        self.assertTrue(manager.is_email_address_monitored('newer@mail.local'))
+        with self.assertNumQueries(1):
+            self.assertFalse(manager.is_email_address_monitored('super-good@mail.local'))
+
+
+class MonitoredPartialEmailAddressTransactionTestCase(TransactionTestCase):
+    def test_rolled_back_keyword_changes_forgotten(self):
+        manager = MonitoredPartialEmailAddress.objects
+        MonitoredPartialEmailAddress.objects.create(keyword='bad')
+        self.assertFalse(manager.has_uncommitted_keyword_changes())
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MonitoredPartialEmailAddress.objects.create(keyword='newer')
+            self.assertTrue(manager.has_uncommitted_keyword_changes())
+            MonitoredPartialEmailAddress.objects.create(keyword='newer')
+        self.assertFalse(manager.has_uncommitted_keyword_changes())
+
+        self.assertFalse(manager.is_email_address_monitored('newer@mail.local'))
+        with self.assertNumQueries(0):
+            self.assertFalse(manager.is_email_address_monitored('newer@mail.local'))
+            self.assertTrue(manager.is_email_address_monitored('very-bad@mail.local'))
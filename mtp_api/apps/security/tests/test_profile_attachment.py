@@ -0,0 +1,91 @@
+from django.test import TestCase
+from mtp_common.test_utils import silence_logger
+
+from core.tests.utils import make_test_users
+from credit.constants import CreditResolution
+from credit.models import Credit
+from payment.tests.utils import generate_payments
+from prison.tests.utils import load_random_prisoner_locations
+from security.managers import SenderProfileKeyCache
+from security.models import (
+    BankAccount, BankTransferSenderDetails, CardholderName, DebitCardSenderDetails,
+    PrisonerProfile, SenderEmail, SenderProfile,
+)
+from transaction.tests.utils import generate_transactions
+
+
+class BulkProfileAttachmentTestCase(TestCase):
+    fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
+
+    def setUp(self):
+        super().setUp()
+        make_test_users()
+        load_random_prisoner_locations()
+
+    @silence_logger()
+    def test_attaches_same_profiles_as_individual_attachment(self):
+        generate_transactions(transaction_batch=100, days_of_history=5)
+        generate_payments(payment_batch=100, days_of_history=5, attach_profiles_to_individual_credits=False)
+        credits = Credit.objects.filter(sender_profile__isnull=True)
+        self.assertTrue(credits.exists())
+
+        credits.attach_profiles()
+
+        for credit in Credit.objects.exclude(resolution=CreditResolution.failed):
+            if credit.has_enough_detail_for_sender_profile():
+                self.assertEqual(credit.sender_profile, SenderProfile.objects.get_for_credit(credit))
+                if credit.prison:
+                    self.assertIn(credit.prison, credit.sender_profile.prisons.all())
+                if hasattr(credit, 'payment'):
+                    debit_card_details = credit.sender_profile.debit_card_details.get()
+                    self.assertEqual(credit.payment.billing_address.debit_card_sender_details, debit_card_details)
+                    self.assertTrue(debit_card_details.cardholder_names.filter(
+                        name=credit.payment.cardholder_name,
+                    ).exists())
+                    self.assertTrue(debit_card_details.sender_emails.filter(email=credit.payment.email).exists())
+            if credit.prison and credit.prisoner_name:
+                self.assertEqual(credit.prisoner_profile, PrisonerProfile.objects.get_for_credit(credit))
+                self.assertIn(credit.prison, credit.prisoner_profile.prisons.all())
+                if credit.sender_profile:
+                    self.assertIn(credit.sender_profile, credit.prisoner_profile.senders.all())
+
+    @silence_logger()
+    def test_attaching_again_creates_nothing(self):
+        generate_transactions(transaction_batch=50, days_of_history=5)
+        generate_payments(payment_batch=50, days_of_history=5, attach_profiles_to_individual_credits=False)
+        Credit.objects.all().attach_profiles()
+
+        models = (
+            SenderProfile, PrisonerProfile, BankAccount, BankTransferSenderDetails,
+            DebitCardSenderDetails, CardholderName, SenderEmail,
+        )
+        counts = [model.objects.count() for model in models]
+        Credit.objects.update(sender_profile=None, prisoner_profile=None)
+        Credit.objects.all().attach_profiles()
+        self.assertListEqual([model.objects.count() for model in models], counts)
+
+    @silence_logger()
+    def test_key_cache_resolves_same_profiles(self):
+        generate_transactions(transaction_batch=50, days_of_history=5)
+        generate_payments(payment_batch=50, days_of_history=5, attach_profiles_to_individual_credits=False)
+        credit_ids = list(
+            Credit.objects.filter(sender_profile__isnull=True).order_by('pk').values_list('pk', flat=True)
+        )
+        key_cache = SenderProfileKeyCache()
+
+        # entries are not kept until committed
+        Credit.objects.filter(pk__in=credit_ids[:10]).attach_profiles(sender_profile_key_cache=key_cache)
+        self.assertEqual(len(key_cache), 0)
+
+        for batch in (credit_ids[10:40], credit_ids[40:]):
+            with self.captureOnCommitCallbacks(execute=True):
+                Credit.objects.filter(pk__in=batch).attach_profiles(sender_profile_key_cache=key_cache)
+            self.assertTrue(len(key_cache))
+        credits = Credit.objects.filter(pk__in=credit_ids)
+        sender_profile_ids = dict(credits.values_list('pk', 'sender_profile'))
+        sender_profile_count = SenderProfile.objects.count()
+
+        credits.update(sender_profile=None)
+        credits.attach_profiles()
+        self.assertDictEqual(dict(credits.values_list('pk', 'sender_profile')), sender_profile_ids)
+        self.assertEqual(SenderProfile.objects.count(), sender_profile_count)
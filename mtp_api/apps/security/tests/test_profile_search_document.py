@@ -0,0 +1,83 @@
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from mtp_common.test_utils import silence_logger
+
+from core.tests.utils import make_test_users
+from payment.tests.utils import generate_payments
+from prison.tests.utils import load_random_prisoner_locations
+from security.models import PrisonerProfile, SenderProfile
+from security.views import PrisonerProfileListFilter, SenderProfileListFilter
+from transaction.tests.utils import generate_transactions
+
+
+class ProfileSearchDocumentTestCase(TestCase):
+    fixtures = ['initial_types.json', 'test_prisons.json', 'initial_groups.json']
+
+    @silence_logger()
+    def setUp(self):
+        super().setUp()
+        make_test_users()
+        load_random_prisoner_locations()
+        generate_transactions(transaction_batch=50, days_of_history=5)
+        generate_payments(payment_batch=50, days_of_history=5)
+
+    def test_documents_include_profile_details(self):
+        for prisoner_profile in PrisonerProfile.objects.all():
+            self.assertIn(prisoner_profile.prisoner_name.lower(), prisoner_profile.search_document)
+            self.assertIn(prisoner_profile.prisoner_number.lower(), prisoner_profile.search_document)
+        for sender_profile in SenderProfile.objects.all():
+            for details in sender_profile.bank_transfer_details.all():
+                self.assertIn(details.sender_name.lower(), sender_profile.search_document)
+            for details in sender_profile.debit_card_details.all():
+                for email in details.sender_emails.all():
+                    self.assertIn(email.email.lower(), sender_profile.search_document)
+
+    def test_rebuild_command(self):
+        documents = dict(SenderProfile.objects.values_list('pk', 'search_document'))
+        SenderProfile.objects.update(search_document='')
+        PrisonerProfile.objects.update(search_document='')
+        call_command('update_security_profile_search_documents', batch_size=1, verbosity=0)
+        self.assertDictEqual(dict(SenderProfile.objects.values_list('pk', 'search_document')), documents)
+        self.assertFalse(PrisonerProfile.objects.filter(search_document='').exists())
+
+    def test_filters_match_with_and_without_search_documents(self):
+        prisoner_profile = PrisonerProfile.objects.first()
+        sender_profile = SenderProfile.objects.filter(debit_card_details__isnull=False).first()
+        debit_card_details = sender_profile.debit_card_details.first()
+        cardholder_name = debit_card_details.cardholder_names.first().name
+        checks = [
+            (PrisonerProfileListFilter, PrisonerProfile, {'simple_search': prisoner_profile.prisoner_number[:4]}),
+            (PrisonerProfileListFilter, PrisonerProfile, {'prisoner_name': prisoner_profile.prisoner_name[:5]}),
+            (PrisonerProfileListFilter, PrisonerProfile, {'prisoner_name': 'no such prisoner'}),
+            (SenderProfileListFilter, SenderProfile, {'simple_search': cardholder_name}),
+            (SenderProfileListFilter, SenderProfile, {'sender_name': 'a'}),
+            (SenderProfileListFilter, SenderProfile, {'sender_email': debit_card_details.sender_emails.first().email}),
+            (SenderProfileListFilter, SenderProfile, {'sender_postcode': debit_card_details.postcode or 'SW1'}),
+        ]
+        for filter_class, model, data in checks:
+            with override_settings(USE_SEARCH_DOCUMENTS=True):
+                with_document = set(filter_class(data, queryset=model.objects.all()).qs)
+            with override_settings(USE_SEARCH_DOCUMENTS=False):
+                without_document = set(filter_class(data, queryset=model.objects.all()).qs)
+            self.assertSetEqual(with_document, without_document, msg=data)
+
+    def test_text_filters_narrow_by_search_document(self):
+        checks = [
+            (PrisonerProfileListFilter, PrisonerProfile, {'simple_search': 'smith'}),
+            (PrisonerProfileListFilter, PrisonerProfile, {'prisoner_name': 'smith'}),
+            (SenderProfileListFilter, SenderProfile, {'simple_search': 'mary smith'}),
+            (SenderProfileListFilter, SenderProfile, {'sender_name': 'mary'}),
+            (SenderProfileListFilter, SenderProfile, {'sender_email': 'mary@'}),
+        ]
+        for filter_class, model, data in checks:
+            with override_settings(USE_SEARCH_DOCUMENTS=True):
+                where_clause = get_where_clause(filter_class(data, queryset=model.objects.all()).qs)
+            self.assertIn('search_document', where_clause, msg=data)
+            with override_settings(USE_SEARCH_DOCUMENTS=False):
+                where_clause = get_where_clause(filter_class(data, queryset=model.objects.all()).qs)
+            self.assertNotIn('search_document', where_clause, msg=data)
+
+
+def get_where_clause(queryset):
+    # the search document column is always selected so only conditions are checked
+    return str(queryset.query).split(' WHERE ', 1)[1]
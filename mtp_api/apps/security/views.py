@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models import Exists, OuterRef, Q, Subquery
 from django.shortcuts import get_object_or_404
 import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
@@ -13,6 +13,8 @@ from core.filters import (
     IsoDateTimeFilter,
     MultipleFieldCharFilter,
     MultipleValueFilter,
+    PostcodeFilter,
+    SearchDocumentCharFilter,
     SplitTextInMultipleFieldsFilter,
 )
 from core.permissions import ActionsBasedPermissions
@@ -57,9 +59,9 @@ class SenderCreditSourceFilter(django_filters.ChoiceFilter):
 
     def filter(self, qs, value):
         if value == CreditSource.bank_transfer.value:
-            qs = qs.filter(bank_transfer_details__isnull=False)
+            qs = qs.filter(bank_transfer_details__isnull=False).distinct()
         elif value == CreditSource.online.value:
-            qs = qs.filter(debit_card_details__isnull=False)
+            qs = qs.filter(debit_card_details__isnull=False).distinct()
         elif value == CreditSource.unknown.value:
             qs = qs.filter(
                 debit_card_details__isnull=True,
@@ -101,6 +103,8 @@ class SenderProfileListFilter(BaseFilterSet):
             'debit_card_details__sender_email__email',
         ),
         lookup_expr='icontains',
+        distinct=True,
+        search_document_field='search_document',
     )
 
     sender_name = MultipleFieldCharFilter(
@@ -108,31 +112,31 @@ class SenderProfileListFilter(BaseFilterSet):
             'bank_transfer_details__sender_name',
             'debit_card_details__cardholder_name__name',
         ),
-        lookup_expr='icontains'
+        lookup_expr='icontains',
+        search_document_field='search_document',
     )
 
     source = SenderCreditSourceFilter()
     sender_sort_code = django_filters.CharFilter(
-        field_name='bank_transfer_details__sender_bank_account__sort_code'
+        field_name='bank_transfer_details__sender_bank_account__sort_code', distinct=True
     )
     sender_account_number = django_filters.CharFilter(
-        field_name='bank_transfer_details__sender_bank_account__account_number'
+        field_name='bank_transfer_details__sender_bank_account__account_number', distinct=True
     )
     sender_roll_number = django_filters.CharFilter(
-        field_name='bank_transfer_details__sender_bank_account__roll_number'
+        field_name='bank_transfer_details__sender_bank_account__roll_number', distinct=True
     )
     card_expiry_date = django_filters.CharFilter(
-        field_name='debit_card_details__card_expiry_date'
+        field_name='debit_card_details__card_expiry_date', distinct=True
     )
     card_number_last_digits = django_filters.CharFilter(
-        field_name='debit_card_details__card_number_last_digits'
-    )
-    sender_email = django_filters.CharFilter(
-        field_name='debit_card_details__sender_email__email', lookup_expr='icontains'
+        field_name='debit_card_details__card_number_last_digits', distinct=True
     )
-    sender_postcode = django_filters.CharFilter(
-        field_name='debit_card_details__postcode', lookup_expr='icontains'
+    sender_email = SearchDocumentCharFilter(
+        field_name='debit_card_details__sender_email__email', lookup_expr='icontains', distinct=True,
+        search_document_field='search_document',
     )
+    sender_postcode = PostcodeFilter(field_name='debit_card_details__postcode', distinct=True)
 
     prisoners = django_filters.ModelMultipleChoiceFilter(
         field_name='prisoners', queryset=PrisonerProfile.objects.all()
@@ -147,7 +151,7 @@ class SenderProfileListFilter(BaseFilterSet):
     prison = django_filters.ModelMultipleChoiceFilter(
         field_name='prisons', queryset=Prison.objects.all()
     )
-    prison_region = django_filters.CharFilter(field_name='prisons__region')
+    prison_region = django_filters.CharFilter(field_name='prisons__region', distinct=True)
     prison_population = MultipleValueFilter(field_name='prisons__populations__name')
     prison_category = MultipleValueFilter(field_name='prisons__categories__name')
     prison_count__gte = django_filters.NumberFilter(
@@ -172,10 +176,7 @@ class SenderProfileView(
     mixins.ListModelMixin, mixins.RetrieveModelMixin, MonitorProfileMixin,
     viewsets.GenericViewSet
 ):
-    queryset = SenderProfile.objects.all().annotate(
-        prisoner_count=Count('prisoners', distinct=True),
-        prison_count=Count('prisons', distinct=True),
-    ).prefetch_related(
+    queryset = SenderProfile.objects.all().prefetch_related(
         'bank_transfer_details', 'debit_card_details',
     )
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter,)
@@ -244,10 +245,11 @@ class PrisonerProfileListFilter(BaseFilterSet):
             'prisoner_number',
         ),
         lookup_expr='icontains',
+        search_document_field='search_document',
     )
 
-    prisoner_name = django_filters.CharFilter(
-        field_name='prisoner_name', lookup_expr='icontains'
+    prisoner_name = SearchDocumentCharFilter(
+        field_name='prisoner_name', lookup_expr='icontains', search_document_field='search_document',
     )
 
     current_prison = django_filters.ModelMultipleChoiceFilter(
@@ -256,7 +258,7 @@ class PrisonerProfileListFilter(BaseFilterSet):
     prison = django_filters.ModelMultipleChoiceFilter(
         field_name='prisons', queryset=Prison.objects.all()
     )
-    prison_region = django_filters.CharFilter(field_name='prisons__region')
+    prison_region = django_filters.CharFilter(field_name='prisons__region', distinct=True)
     prison_population = MultipleValueFilter(field_name='prisons__populations__name')
     prison_category = MultipleValueFilter(field_name='prisons__categories__name')
 
@@ -289,10 +291,7 @@ class PrisonerProfileView(
     mixins.ListModelMixin, mixins.RetrieveModelMixin, MonitorProfileMixin,
     viewsets.GenericViewSet
 ):
-    queryset = PrisonerProfile.objects.all().annotate(
-        sender_count=Count('senders', distinct=True),
-        recipient_count=Count('recipients', distinct=True),
-    ).prefetch_related(
+    queryset = PrisonerProfile.objects.all().prefetch_related(
         'prisons', 'provided_names'
     )
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter,)
@@ -366,13 +365,13 @@ class PrisonerProfileDisbursementsView(GetDisbursementsView):
 
 class RecipientProfileListFilter(BaseFilterSet):
     recipient_sort_code = django_filters.CharFilter(
-        field_name='bank_transfer_details__recipient_bank_account__sort_code'
+        field_name='bank_transfer_details__recipient_bank_account__sort_code', distinct=True
     )
     recipient_account_number = django_filters.CharFilter(
-        field_name='bank_transfer_details__recipient_bank_account__account_number'
+        field_name='bank_transfer_details__recipient_bank_account__account_number', distinct=True
     )
     recipient_roll_number = django_filters.CharFilter(
-        field_name='bank_transfer_details__recipient_bank_account__roll_number'
+        field_name='bank_transfer_details__recipient_bank_account__roll_number', distinct=True
     )
 
     prisoners = django_filters.ModelMultipleChoiceFilter(
@@ -388,7 +387,7 @@ class RecipientProfileListFilter(BaseFilterSet):
     prison = django_filters.ModelMultipleChoiceFilter(
         field_name='prisons', queryset=Prison.objects.all()
     )
-    prison_region = django_filters.CharFilter(field_name='prisons__region')
+    prison_region = django_filters.CharFilter(field_name='prisons__region', distinct=True)
     prison_population = MultipleValueFilter(field_name='prisons__populations__name')
     prison_category = MultipleValueFilter(field_name='prisons__categories__name')
     prison_count__gte = django_filters.NumberFilter(
@@ -415,9 +414,6 @@ class RecipientProfileView(
 ):
     queryset = RecipientProfile.objects.exclude(
         bank_transfer_details__isnull=True
-    ).annotate(
-        prisoner_count=Count('prisoners', distinct=True),
-        prison_count=Count('prisons', distinct=True),
     ).prefetch_related(
         'bank_transfer_details'
     )
@@ -0,0 +1,21 @@
+from django.contrib.postgres import operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('transaction', '0043_auto_20201007_1448'),
+    ]
+
+    operations = [
+        operations.AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['received_at', 'id'], name='transaction_receive_6d5ad9_idx'),
+        ),
+        operations.AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['-received_at', 'id'], name='transaction_receive_78c7ee_idx'),
+        ),
+    ]
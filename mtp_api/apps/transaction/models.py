@@ -80,6 +80,10 @@ class Transaction(TimeStampedModel):
     class Meta:
         ordering = ('received_at', 'id',)
         get_latest_by = 'received_at'
+        indexes = [
+            models.Index(fields=['received_at', 'id']),
+            models.Index(fields=['-received_at', 'id']),
+        ]
         permissions = (
             ('view_dashboard', 'Can view dashboard'),
             ('view_bank_details_transaction', 'Can view bank details of transaction'),
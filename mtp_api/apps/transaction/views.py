@@ -13,6 +13,7 @@ from core.filters import (
     StatusChoiceFilter, IsoDateTimeFilter, SafeOrderingFilter,
     MultipleValueFilter, BaseFilterSet
 )
+from core.pagination import KeysetPagination
 from credit import InvalidCreditStateException
 from credit.models import PrivateEstateBatch
 from mtp_auth.permissions import BankAdminClientIDPermissions
@@ -61,6 +62,7 @@ class TransactionView(
     filter_backends = (DjangoFilterBackendEmptyOnErrors, SafeOrderingFilter)
     filterset_class = TransactionListFilter
     ordering_fields = ('received_at',)
+    pagination_class = KeysetPagination
     permission_classes = (
         IsAuthenticated, BankAdminClientIDPermissions,
         TransactionPermissions
@@ -305,6 +305,9 @@ REST_FRAMEWORK = {
 }
 REQUEST_PAGE_DAYS = 5
 
+# text search filters are narrowed using trigram-indexed search documents where available
+USE_SEARCH_DOCUMENTS = os.environ.get('USE_SEARCH_DOCUMENTS', 'True') == 'True'
+
 # control the time a session exists for; client apps should use this value as well
 SESSION_COOKIE_AGE = 60 * 60  # 1 hour
 SESSION_SAVE_EVERY_REQUEST = True